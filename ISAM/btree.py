@@ -1,184 +1,700 @@
-import os
-import struct
-from .isam import Registro, Bucket
-
-class BTNode:
-    def __init__(self, leaf=False):
-        self.leaf = leaf
-        self.keys = []
-        self.children = []
-        self.offsets = []
-        self.next = None
-
-class BTree:
-    def __init__(self, file_idx='data/bptree_index.dat', file_data='data/bptree_data.dat', t=3):
-        self.file_idx = file_idx
-        self.file_data = file_data
-        self.t = t
-        self.root = BTNode(leaf=True)
-
-        os.makedirs(os.path.dirname(file_idx), exist_ok=True)
-        os.makedirs(os.path.dirname(file_data), exist_ok=True)
-        open(file_idx, 'ab').close()
-        open(file_data, 'ab').close()
-
-        self.load_tree() 
-        
-    def save_idx(self):
-        with open(self.file_idx, 'wb') as f:
-            leaves = []
-            self.get_leaves(self.root, leaves)
-            for node in leaves:
-                for k, offset in zip(node.keys, node.offsets):
-                    f.write(struct.pack('ii', k, offset))
-
-    def load_tree(self):
-        if not os.path.exists(self.file_idx):
-            return  # no hay indice guardado previamente
-
-        node = BTNode(leaf=True)
-        with open(self.file_idx, 'rb') as f:
-            while True:
-                data = f.read(struct.calcsize('ii'))
-                if not data:
-                    break
-                k, offset = struct.unpack('ii', data)
-                node.keys.append(k)
-                node.offsets.append(offset)
-        self.root = node
-
-
-    def _write_data(self, registro):
-        with open(self.file_data, 'ab') as f:
-            offset = f.tell()
-            f.write(registro.empaquetar())
-            return offset
-
-    def _read_data(self, offset):
-        with open(self.file_data, 'rb') as f:
-            f.seek(offset)
-            data = f.read(Registro.SIZE)
-            return Registro.desempaquetar(data)
-
-    def add(self, registro):
-        key = registro.id
-        root = self.root
-
-        if len(root.keys) == (2 * self.t) - 1:
-            new_root = BTNode()
-            new_root.children.append(self.root)
-            self._split_child(new_root, 0)
-            self.root = new_root
-            self._add_non_full(self.root, key, registro)
-        else:
-            self._add_non_full(root, key, registro)
-
-        self.save_idx()
-
-    def _add_non_full(self, node, key, registro):
-        if node.leaf:
-            offset = self._write_data(registro)
-            idx = 0
-            while idx < len(node.keys) and node.keys[idx] < key:
-                idx += 1
-            node.keys.insert(idx, key)
-            node.offsets.insert(idx, offset)
-        else:
-            i = len(node.keys) - 1
-            while i >= 0 and key < node.keys[i]:
-                i -= 1
-            i += 1
-            child = node.children[i]
-            if len(child.keys) == (2 * self.t) - 1:
-                self._split_child(node, i)
-                if key > node.keys[i]:
-                    i += 1
-            self._add_non_full(node.children[i], key, registro)
-
-    def _split_child(self, parent, i):
-        t = self.t
-        node = parent.children[i]
-        new_node = BTNode(leaf=node.leaf)
-
-        if node.leaf:
-            new_node.keys = node.keys[t-1:]
-            new_node.offsets = node.offsets[t-1:]
-            node.keys = node.keys[:t-1]
-            node.offsets = node.offsets[:t-1]
-
-            new_node.next = node.next
-            node.next = new_node
-
-            parent.keys.insert(i, new_node.keys[0])
-            parent.children.insert(i+1, new_node)
-        else:
-            parent.keys.insert(i, node.keys[t-1])
-            new_node.keys = node.keys[t:]
-            node.keys = node.keys[:t-1]
-            new_node.children = node.children[t:]
-            node.children = node.children[:t]
-            parent.children.insert(i+1, new_node)
-
-    def search(self, key, node=None):
-        if node is None:
-            node = self.root
-        if node.leaf:
-            for i, k in enumerate(node.keys):
-                if k == key:
-                    return self._read_data(node.offsets[i])
-            return None
-        else:
-            for i, k in enumerate(node.keys):
-                if key < k:
-                    return self.search(key, node.children[i])
-            return self.search(key, node.children[-1])
-
-    def range_search(self, start, end):
-        result = []
-        node = self.root
-        while not node.leaf:
-            i = 0
-            while i < len(node.keys) and start >= node.keys[i]:
-                i += 1
-            node = node.children[i]
-        while node:
-            for i, k in enumerate(node.keys):
-                if start <= k <= end:
-                    result.append(self._read_data(node.offsets[i]))
-                elif k > end:
-                    return result
-            node = node.next
-        return result
-
-    def save_idx(self):
-        with open(self.file_idx, 'wb') as f:
-            leaves = []
-            self.get_leaves(self.root, leaves)
-            for node in leaves:
-                for k, offset in zip(node.keys, node.offsets):
-                    f.write(struct.pack('ii', k, offset))
-
-    def get_leaves(self, node, leaves):
-        if node.leaf:
-            leaves.append(node)
-        else:
-            for child in node.children:
-                self.get_leaves(child, leaves)
-
-    def remove(self, key):
-        node = self.root
-
-        while not node.leaf:
-            i = 0
-            while i < len(node.keys) and key >= node.keys[i]:
-                i += 1
-            node = node.children[i]
-
-        for i, k in enumerate(node.keys):
-            if k == key:
-                node.keys.pop(i)
-                node.offsets.pop(i)
-                self.save_idx()
-                return True
-
-        return False
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from .isam import Registro, Bucket, fecha_epoch, pread
+
+PAGE_SIZE = 4096  # tamaño de página del que se deriva el orden por defecto
+CACHE_SIZE = 1024  # páginas de nodo en el buffer pool
+FILL_FACTOR = 0.7  # ocupación de los nodos en bulk_load; el resto queda para inserciones
+RANGE_BATCH = 1024  # offsets reunidos (por hojas completas) antes de leer el archivo de datos
+
+MAGIC = b'BPTI'
+HEADER = struct.Struct('4siiiiiii')  # magic, t, tamaño de página, tamaño de clave, página raíz, número de
+                                     # páginas, primera página libre, primer registro libre en los datos
+NODE_HEADER = struct.Struct('=?ii')  # hoja, número de claves, siguiente hoja o página libre (-1 si no hay)
+FREE_SLOT = struct.Struct('i')       # en un registro libre, offset del siguiente libre
+ITEM = 4                             # bytes por puntero (array 'i')
+KEY_TYPES = {4: 'i', 8: 'q'}         # tamaño de clave -> typecode del array de claves
+LEGACY_ENTRY = struct.Struct('ii')   # formato anterior: pares (clave, offset) de las hojas
+
+
+class BTNode:
+    def __init__(self, leaf=False, page=-1, key_type='i'):
+        self.leaf = leaf
+        self.page = page
+        self.keys = array(key_type)
+        self.children = array('i')  # páginas de los hijos (nodos internos)
+        self.offsets = array('i')   # offsets en el archivo de datos (hojas)
+        self.next = -1              # página de la hoja siguiente
+
+
+class BTree:
+    """B+ tree en disco: página 0 de cabecera y un nodo por página de tamaño fijo.
+
+    Sin file_data el árbol solo guarda pares (clave, puntero), como los índices secundarios.
+    Las lecturas también mueven los handles y el buffer pool, así que toda operación pública
+    pasa por _lock; `lock` permite compartirlo con otro árbol (el primario de un índice secundario).
+    """
+
+    def __init__(self, file_idx='data/bptree_index.dat', file_data='data/bptree_data.dat', t=None,
+                 page_size=PAGE_SIZE, cache_size=CACHE_SIZE, key_size=4, lock=None):
+        self._lock = lock or threading.RLock()
+        self.file_idx = file_idx
+        self.file_data = file_data
+        self.cache_size = cache_size
+        self.reads = 0
+        self.writes = 0
+        self.data_reads = 0
+
+        # buffer pool LRU con write-back: las páginas sucias se escriben en flush()
+        self.cache = OrderedDict()  # página -> BTNode
+        self.dirty = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.flushes = 0
+        self.batch_depth = 0
+
+        os.makedirs(os.path.dirname(file_idx) or '.', exist_ok=True)
+        self.data = None
+        if file_data is not None:
+            os.makedirs(os.path.dirname(file_data) or '.', exist_ok=True)
+            open(file_data, 'ab').close()
+            self.data = open(file_data, 'r+b')
+
+        self.file = None
+        if not self._load_header():
+            legacy = self._read_legacy()
+            self._create_empty(t, page_size, key_size)
+            for k, offset in legacy:
+                self._insert(k, offset)
+            self.flush()
+
+    # --- páginas ---
+
+    @staticmethod
+    def order_for(page_size, key_size=4):
+        # un nodo ocupa la cabecera más 2t-1 claves y 2t punteros
+        return max(2, (page_size - NODE_HEADER.size + key_size) // (2 * (key_size + ITEM)))
+
+    def _set_order(self, t, page_size=None, key_size=4):
+        """Con page_size los nodos se rellenan hasta la página; sin él quedan compactos."""
+        self.t = t
+        self.max_keys = 2 * t - 1
+        self.key_size = key_size
+        self.key_type = KEY_TYPES[key_size]
+        self.keys_at = NODE_HEADER.size
+        self.pointers_at = self.keys_at + self.max_keys * key_size
+        node_size = self.pointers_at + (self.max_keys + 1) * ITEM
+        self.page_size = max(page_size or 0, node_size, HEADER.size)
+
+    def _load_header(self):
+        if not os.path.exists(self.file_idx):
+            return False
+        with open(self.file_idx, 'rb') as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, t, page_size, key_size, root, num_pages, node_free, data_free = HEADER.unpack(header)
+        if magic != MAGIC:
+            return False
+        self._set_order(t, page_size, key_size)
+        self.root_page, self.num_pages = root, num_pages
+        self.node_free, self.data_free = node_free, data_free
+        self.saved_header = self._header()
+        self.file = open(self.file_idx, 'r+b')
+        return True
+
+    def _read_legacy(self):
+        entries = []
+        if os.path.exists(self.file_idx):
+            with open(self.file_idx, 'rb') as f:
+                while len(data := f.read(LEGACY_ENTRY.size)) == LEGACY_ENTRY.size:
+                    entries.append(LEGACY_ENTRY.unpack(data))
+        return entries
+
+    def _create_empty(self, t, page_size, key_size=4):
+        if t is None:
+            self._set_order(self.order_for(page_size, key_size), page_size, key_size)
+        else:
+            self._set_order(t, None, key_size)
+        self.file = open(self.file_idx, 'w+b')
+        self.num_pages = 1
+        self.node_free = self.data_free = -1
+        root = self._new_node(leaf=True)
+        self.root_page = root.page
+        self._write_page(root)
+        self._save_header()
+
+    def _header(self):
+        return self.root_page, self.num_pages, self.node_free, self.data_free
+
+    def _save_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.t, self.page_size, self.key_size, *self._header())
+                        .ljust(self.page_size, b'\x00'))
+        self.saved_header = self._header()
+
+    def _new_node(self, leaf=False):
+        # reutiliza primero una página liberada por un merge; en ellas `next` apunta a la siguiente
+        if self.node_free != -1:
+            page = self.node_free
+            self.node_free = self._read_page(page).next
+        else:
+            page = self.num_pages
+            self.num_pages += 1
+        return BTNode(leaf=leaf, page=page, key_type=self.key_type)
+
+    def _free_node(self, node):
+        self.cache.pop(node.page, None)
+        self.dirty.discard(node.page)
+        free = BTNode(page=node.page, key_type=self.key_type)
+        free.next = self.node_free
+        self._write_page(free)
+        self.node_free = node.page
+
+    def _read_node(self, page):
+        node = self.cache.get(page)
+        if node is not None:
+            self.cache_hits += 1
+            self.cache.move_to_end(page)
+            return node
+        self.cache_misses += 1
+        node = self._read_page(page)
+        self._cache_put(node)
+        return node
+
+    def _write_node(self, node):
+        self._cache_put(node)
+        self.dirty.add(node.page)
+
+    def _cache_put(self, node):
+        self.cache[node.page] = node
+        self.cache.move_to_end(node.page)
+        while len(self.cache) > self.cache_size:
+            old_page, old = self.cache.popitem(last=False)
+            if old_page in self.dirty:
+                self.dirty.discard(old_page)
+                self._write_page(old)
+
+    def _read_page(self, page):
+        self.file.seek(page * self.page_size)
+        data = self.file.read(self.page_size)
+        self.reads += 1
+        leaf, n, next = NODE_HEADER.unpack_from(data)
+        node = BTNode(leaf=leaf, page=page, key_type=self.key_type)
+        node.keys.frombytes(data[self.keys_at:self.keys_at + n * self.key_size])
+        node.next = next
+        if leaf:
+            node.offsets.frombytes(data[self.pointers_at:self.pointers_at + n * ITEM])
+        else:
+            node.children.frombytes(data[self.pointers_at:self.pointers_at + (n + 1) * ITEM])
+        return node
+
+    def _write_page(self, node):
+        page = bytearray(self.page_size)
+        NODE_HEADER.pack_into(page, 0, node.leaf, len(node.keys), node.next)
+        keys = node.keys.tobytes()
+        page[self.keys_at:self.keys_at + len(keys)] = keys
+        pointers = (node.offsets if node.leaf else node.children).tobytes()
+        page[self.pointers_at:self.pointers_at + len(pointers)] = pointers
+        self.file.seek(node.page * self.page_size)
+        self.file.write(page)
+        self.writes += 1
+
+    def _find_leaf(self, key):
+        node = self._read_node(self.root_page)
+        while not node.leaf:
+            node = self._read_node(node.children[bisect_right(node.keys, key)])
+        return node
+
+    def height(self):
+        with self._lock:
+            height, node = 1, self._read_node(self.root_page)
+            while not node.leaf:
+                height, node = height + 1, self._read_node(node.children[0])
+            return height
+
+    def stats(self):
+        return {
+            "page_reads": self.reads,
+            "page_writes": self.writes,
+            "data_reads": self.data_reads,
+            "pages": self.num_pages,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "flushes": self.flushes,
+        }
+
+    def flush(self):
+        with self._lock:
+            for page in sorted(self.dirty):
+                self._write_page(self.cache[page])
+            self.dirty.clear()
+            if self.saved_header != self._header():
+                self._save_header()
+            if self.data:
+                self.data.flush()
+            self.file.flush()
+            self.flushes += 1
+
+    def begin(self):
+        with self._lock:
+            self.batch_depth += 1
+
+    def commit(self):
+        with self._lock:
+            self.batch_depth = max(self.batch_depth - 1, 0)
+            if not self.batch_depth:
+                self.flush()
+
+    @contextmanager
+    def batch(self):
+        """Agrupa varias operaciones; las páginas sucias se escriben una sola vez al final."""
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def _autocommit(self):
+        if not self.batch_depth:
+            self.flush()
+
+    def reset(self, t=None, page_size=PAGE_SIZE):
+        """Vacía el árbol y cambia su orden; con t=None se deriva de page_size."""
+        with self._lock:
+            self.cache.clear()
+            self.dirty.clear()
+            self.file.close()
+            if self.data:
+                self.data.seek(0)
+                self.data.truncate()
+            self._create_empty(t, page_size, self.key_size)
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            if self.file:
+                self.flush()
+                self.file.close()
+                if self.data:
+                    self.data.close()
+                self.file = None
+
+    # --- datos ---
+
+    def _write_data(self, registro):
+        # reutiliza primero un registro liberado; sus primeros bytes apuntan al siguiente libre
+        if self.data_free != -1:
+            offset = self.data_free
+            self.data.seek(offset)
+            self.data_free = FREE_SLOT.unpack(self.data.read(FREE_SLOT.size))[0]
+            self.data.seek(offset)
+        else:
+            offset = self.data.seek(0, os.SEEK_END)
+        self.data.write(registro.empaquetar())
+        return offset
+
+    def _free_data(self, offset):
+        self.data.seek(offset)
+        self.data.write(FREE_SLOT.pack(self.data_free))
+        self.data_free = offset
+
+    def _read_data(self, offset):
+        self.data.seek(offset)
+        data = self.data.read(Registro.SIZE)
+        self.data_reads += 1
+        return Registro.desempaquetar(data)
+
+    def _read_batch(self, offsets):
+        # lee cada tramo contiguo del archivo de datos con un solo pread y devuelve en el orden pedido
+        self.data.flush()  # los registros aún en el buffer de escritura deben verse con pread
+        size = Registro.SIZE
+        ordered = sorted(offsets)
+        decoded = []
+        i, n = 0, len(ordered)
+        while i < n:
+            if ordered[-1] - ordered[i] == (n - 1 - i) * size:
+                j = n  # el resto del lote es un solo tramo
+            else:
+                j = i + 1
+                while j < n and ordered[j] == ordered[j - 1] + size:
+                    j += 1
+            data = pread(self.data, size * (j - i), ordered[i], self._lock)
+            self.data_reads += 1
+            decoded.extend(Registro.desempaquetar(data, pos) for pos in range(0, len(data), size))
+            i = j
+        if ordered == list(offsets):
+            return decoded
+        by_offset = dict(zip(ordered, decoded))
+        return [by_offset[offset] for offset in offsets]
+
+    # --- carga masiva ---
+
+    def bulk_load(self, records, presorted=False, fill=FILL_FACTOR):
+        """Reemplaza el contenido del árbol construyéndolo de abajo hacia arriba.
+
+        Los registros se escriben en orden en el archivo de datos; luego se arman las
+        hojas y cada nivel interno con una ocupación `fill`. Con presorted=True los
+        registros se consumen como stream (por ejemplo, la salida de un sort externo).
+        """
+        if not presorted:
+            records = sorted(records, key=lambda r: r.id)
+
+        # 1. registros secuenciales: el i-ésimo en orden de clave vive en i * Registro.SIZE.
+        # Se escriben en un archivo aparte, así un stream desordenado no toca el árbol actual
+        tmp = self.file_data + '.tmp'
+        ids = array(self.key_type)
+        try:
+            with open(tmp, 'wb') as data:
+                for r in records:
+                    if ids and r.id <= ids[-1]:
+                        if r.id == ids[-1]:
+                            continue  # id ya existe
+                        raise ValueError(f"bulk_load: registros no ordenados ({ids[-1]} antes de {r.id})")
+                    data.write(r.empaquetar())
+                    ids.append(r.id)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        with self._lock:
+            self.data.close()
+            os.replace(tmp, self.file_data)
+            self.data = open(self.file_data, 'r+b')
+            self._build(ids, array('i', range(0, len(ids) * Registro.SIZE, Registro.SIZE)), fill)
+
+    def _build(self, keys, pointers, fill=FILL_FACTOR):
+        """Reemplaza el índice por uno armado de abajo hacia arriba con claves ordenadas y únicas."""
+        with self._lock:
+            self._build_pages(keys, pointers, fill)
+
+    def _build_pages(self, keys, pointers, fill):
+        self.cache.clear()
+        self.dirty.clear()
+        self.file.seek(0)
+        self.file.truncate()
+        self.num_pages = 1
+        self.node_free = self.data_free = -1
+
+        # hojas en páginas consecutivas, enlazadas en orden
+        leaf_cap = max(1, min(self.max_keys, round(self.max_keys * fill)))
+        sizes = self._group_sizes(len(keys), leaf_cap, self.t - 1, self.max_keys) or [0]
+        first_keys, pages = array(self.key_type), array('i')
+        start = 0
+        for j, size in enumerate(sizes):
+            node = self._new_node(leaf=True)
+            node.keys = keys[start:start + size]
+            node.offsets = pointers[start:start + size]
+            node.next = node.page + 1 if j + 1 < len(sizes) else -1
+            self._write_page(node)
+            first_keys.append(node.keys[0] if size else 0)
+            pages.append(node.page)
+            start += size
+
+        # niveles internos hasta que quede una sola raíz
+        fanout = max(2, min(self.max_keys + 1, round((self.max_keys + 1) * fill)))
+        while len(pages) > 1:
+            upper_keys, upper_pages = array(self.key_type), array('i')
+            start = 0
+            for size in self._group_sizes(len(pages), fanout, self.t, self.max_keys + 1):
+                node = self._new_node()
+                node.children = pages[start:start + size]
+                node.keys = first_keys[start + 1:start + size]
+                self._write_page(node)
+                upper_keys.append(first_keys[start])
+                upper_pages.append(node.page)
+                start += size
+            first_keys, pages = upper_keys, upper_pages
+
+        self.root_page = pages[0]
+        self._save_header()
+        self.flush()
+
+    @staticmethod
+    def _group_sizes(n, cap, minimum, maximum):
+        # reparte n entradas en grupos de `cap`; el último no puede quedar por debajo del mínimo
+        sizes = [cap] * (n // cap)
+        if n % cap:
+            sizes.append(n % cap)
+        if len(sizes) > 1 and sizes[-1] < minimum:
+            total = sizes.pop() + sizes.pop()
+            sizes += [total] if total <= maximum else [total - total // 2, total // 2]
+        return sizes
+
+    # --- operaciones ---
+
+    def add(self, registro):
+        """Inserta el registro y devuelve su offset en el archivo de datos."""
+        with self._lock:
+            offset = self._write_data(registro)
+            self._insert(registro.id, offset)
+            self._autocommit()
+            return offset
+
+    def _insert(self, key, offset):
+        root = self._read_node(self.root_page)
+
+        if len(root.keys) == self.max_keys:
+            new_root = self._new_node()
+            new_root.children.append(root.page)
+            self.root_page = new_root.page
+            self._split_child(new_root, 0, root)
+            root = new_root
+        self._add_non_full(root, key, offset)
+
+    def _add_non_full(self, node, key, offset):
+        if node.leaf:
+            idx = bisect_left(node.keys, key)
+            node.keys.insert(idx, key)
+            node.offsets.insert(idx, offset)
+            self._write_node(node)
+        else:
+            i = bisect_right(node.keys, key)
+            child = self._read_node(node.children[i])
+            if len(child.keys) == self.max_keys:
+                new_child = self._split_child(node, i, child)
+                if key >= node.keys[i]:
+                    child = new_child
+            self._add_non_full(child, key, offset)
+
+    def _split_child(self, parent, i, node):
+        t = self.t
+        new_node = self._new_node(leaf=node.leaf)
+
+        if node.leaf:
+            new_node.keys = node.keys[t-1:]
+            new_node.offsets = node.offsets[t-1:]
+            node.keys = node.keys[:t-1]
+            node.offsets = node.offsets[:t-1]
+
+            new_node.next = node.next
+            node.next = new_node.page
+
+            parent.keys.insert(i, new_node.keys[0])
+            parent.children.insert(i+1, new_node.page)
+        else:
+            parent.keys.insert(i, node.keys[t-1])
+            new_node.keys = node.keys[t:]
+            node.keys = node.keys[:t-1]
+            new_node.children = node.children[t:]
+            node.children = node.children[:t]
+            parent.children.insert(i+1, new_node.page)
+
+        self._write_node(node)
+        self._write_node(new_node)
+        self._write_node(parent)
+        return new_node
+
+    def search(self, key):
+        with self._lock:
+            node = self._find_leaf(key)
+            i = bisect_left(node.keys, key)
+            if i < len(node.keys) and node.keys[i] == key:
+                return self._read_data(node.offsets[i])
+            return None
+
+    def range_search(self, start, end, batch_size=RANGE_BATCH):
+        """Genera en orden los registros con clave en [start, end].
+
+        Los offsets de hojas consecutivas se juntan hasta batch_size y se leen
+        ordenados, en tramos contiguos del archivo de datos.
+        """
+        for rows in self.range_batches(start, end, self._read_batch, batch_size):
+            yield from rows
+
+    def range_pointers(self, start, end, batch_size=RANGE_BATCH):
+        # lotes de punteros (por hojas completas) de las claves en [start, end]
+        return self.range_batches(start, end, lambda offsets: offsets, batch_size)
+
+    def range_batches(self, start, end, read, batch_size=RANGE_BATCH):
+        """Genera read(offsets) por cada lote de punteros de las claves en [start, end].
+
+        Cada lote se arma y se lee con el lock tomado y se entrega sin él, así que un
+        generador a medio consumir no bloquea a los demás hilos. El lote siguiente vuelve
+        a bajar desde la raíz tras la última clave entregada: las hojas pueden haber
+        cambiado entre lotes.
+        """
+        low, after = start, False
+        while True:
+            with self._lock:
+                batch = array('i')
+                node = self._find_leaf(low)
+                i = (bisect_right if after else bisect_left)(node.keys, low)
+                while True:
+                    j = bisect_right(node.keys, end)
+                    batch.extend(node.offsets[i:j])
+                    if j > i:
+                        low, after = node.keys[j - 1], True
+                    done = j < len(node.keys) or node.next == -1
+                    if done or len(batch) >= batch_size:
+                        break
+                    node = self._read_node(node.next)
+                    i = 0
+                rows = read(batch) if batch else None
+            if rows is not None:
+                yield rows
+            if done:
+                return
+
+    def remove(self, key):
+        with self._lock:
+            offset = self._remove_key(key)
+            if offset is None:
+                return False
+            self._free_data(offset)
+            self._autocommit()
+            return True
+
+    def _remove_key(self, key):
+        root = self._read_node(self.root_page)
+        offset = self._delete(root, key)
+        # la raíz interna que se quedó sin claves cede su lugar a su único hijo
+        if offset is not None and not root.leaf and not root.keys:
+            self.root_page = root.children[0]
+            self._free_node(root)
+        return offset
+
+    def _delete(self, node, key):
+        if node.leaf:
+            i = bisect_left(node.keys, key)
+            if i == len(node.keys) or node.keys[i] != key:
+                return None
+            node.keys.pop(i)
+            offset = node.offsets.pop(i)
+            self._write_node(node)
+            return offset
+
+        i = bisect_right(node.keys, key)
+        child = self._read_node(node.children[i])
+        offset = self._delete(child, key)
+        if offset is not None and len(child.keys) < self.t - 1:
+            self._fix_underflow(node, i, child)
+        return offset
+
+    def _fix_underflow(self, parent, i, child):
+        left = self._read_node(parent.children[i - 1]) if i > 0 else None
+        right = self._read_node(parent.children[i + 1]) if i + 1 < len(parent.children) else None
+
+        if left is not None and len(left.keys) >= self.t:
+            if child.leaf:
+                child.keys.insert(0, left.keys.pop())
+                child.offsets.insert(0, left.offsets.pop())
+                parent.keys[i - 1] = child.keys[0]
+            else:
+                child.keys.insert(0, parent.keys[i - 1])
+                parent.keys[i - 1] = left.keys.pop()
+                child.children.insert(0, left.children.pop())
+            self._write_node(left)
+            self._write_node(child)
+            self._write_node(parent)
+        elif right is not None and len(right.keys) >= self.t:
+            if child.leaf:
+                child.keys.append(right.keys.pop(0))
+                child.offsets.append(right.offsets.pop(0))
+                parent.keys[i] = right.keys[0]
+            else:
+                child.keys.append(parent.keys[i])
+                parent.keys[i] = right.keys.pop(0)
+                child.children.append(right.children.pop(0))
+            self._write_node(right)
+            self._write_node(child)
+            self._write_node(parent)
+        elif left is not None:
+            self._merge(parent, i - 1, left, child)
+        else:
+            self._merge(parent, i, child, right)
+
+    def _merge(self, parent, i, left, right):
+        # `right` se vacía dentro de `left` y su separador sale del padre
+        if left.leaf:
+            left.keys.extend(right.keys)
+            left.offsets.extend(right.offsets)
+            left.next = right.next
+        else:
+            left.keys.append(parent.keys[i])
+            left.keys.extend(right.keys)
+            left.children.extend(right.children)
+        parent.keys.pop(i)
+        parent.children.pop(i + 1)
+        self._write_node(left)
+        self._write_node(parent)
+        self._free_node(right)
+
+
+FLOAT32 = struct.Struct('f')
+
+
+def _centesimas(v):
+    # se escala el float32 que guarda el registro: un Registro recién armado trae float64 y el
+    # leído del disco float32, y ambos deben dar la misma clave
+    return round(FLOAT32.unpack(FLOAT32.pack(float(v)))[0] * 100)
+
+
+# columna -> clave entera ordenable; fecha se guarda en el registro solo como 'YYYY-MM-DD'
+SECONDARY_COLUMNS = {
+    "mag": _centesimas,
+    "prof": _centesimas,
+    "fecha": lambda v: fecha_epoch(str(v)[:10]),
+}
+
+
+class SecondaryIndex:
+    """B+ tree no único sobre mag, prof o fecha que apunta a los offsets del árbol primario.
+
+    La clave compuesta valor * 2**32 + id hace única cada entrada y mantiene el orden por valor.
+    """
+
+    def __init__(self, column, primary, file_idx=None, page_size=PAGE_SIZE):
+        self.column = column
+        self.primary = primary
+        self.scale = SECONDARY_COLUMNS[column]
+        # comparte el lock del primario: sus punteros solo valen contra ese archivo de datos
+        self.tree = BTree(file_idx or self.path_for(column), None, page_size=page_size, key_size=8,
+                          lock=primary._lock)
+
+    @staticmethod
+    def path_for(column):
+        return f'data/bptree_{column}.dat'
+
+    @staticmethod
+    def composite(value, id):
+        return (value << 32) + (id & 0xFFFFFFFF)
+
+    def key(self, registro):
+        return self.composite(self.scale(getattr(registro, self.column)), registro.id)
+
+    def build(self):
+        """Reconstruye el índice recorriendo las hojas del árbol primario."""
+        with self.tree._lock:
+            entries = []
+            for offsets in self.primary.range_pointers(-2**31, 2**31 - 1):
+                entries.extend(zip(map(self.key, self.primary._read_batch(offsets)), offsets))
+            entries.sort()
+            self.tree._build(array('q', (k for k, _ in entries)), array('i', (o for _, o in entries)))
+
+    def add(self, registro, offset, key=None):
+        # key: la clave ya calculada con self.key(registro), si se validó antes de escribir
+        with self.tree._lock:
+            self.tree._insert(self.key(registro) if key is None else key, offset)
+            self.tree._autocommit()
+
+    def remove(self, registro):
+        with self.tree._lock:
+            found = self.tree._remove_key(self.key(registro)) is not None
+            self.tree._autocommit()
+            return found
+
+    def range_search(self, low, high):
+        """Genera los registros con low <= columna <= high, ordenados por la columna."""
+        start = self.composite(self.scale(low), 0)
+        end = self.composite(self.scale(high), 0xFFFFFFFF)
+        for rows in self.tree.range_batches(start, end, self.primary._read_batch):
+            yield from rows
+
+    def close(self):
+        self.tree.close()
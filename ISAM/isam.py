@@ -1,252 +1,669 @@
-import os
-import struct
-import json
-
-class Registro:
-    FORMAT = 'i10s10sffff'  # id, fecha, tipo, lat, lon, mag, prof
-    SIZE = struct.calcsize(FORMAT)
-
-    def __init__(self, id, fecha, tipo, lat, lon, mag, prof):
-        self.id = id
-        self.fecha = fecha
-        self.tipo = tipo
-        self.lat = lat
-        self.lon = lon
-        self.mag = mag
-        self.prof = prof
-
-    def empaquetar(self):
-        return struct.pack(
-            self.FORMAT,
-            self.id,
-            self.fecha.encode('utf-8'),
-            self.tipo.encode('utf-8'),
-            self.lat,
-            self.lon,
-            self.mag,
-            self.prof
-        )
-
-    @staticmethod
-    def desempaquetar(data):
-        unpacked = struct.unpack(Registro.FORMAT, data)
-        return Registro(
-            unpacked[0],
-            unpacked[1].decode('utf-8').strip('\x00'),
-            unpacked[2].decode('utf-8').strip('\x00'),
-            unpacked[3],
-            unpacked[4],
-            unpacked[5],
-            unpacked[6]
-        )
-
-    def to_tuple(self):
-        return (
-            self.id,
-            self.fecha.encode('utf-8'),
-            self.tipo.encode('utf-8'),
-            self.lat,
-            self.lon,
-            self.mag,
-            self.prof
-        )
-
-
-class Bucket:
-    def __init__(self, fb):
-        self.registros = [None] * fb
-        self.size = 0
-        self.next = -1
-        self.fb = fb
-
-    def insert(self, registro):
-        if not self.isFull():
-            self.registros[self.size] = registro
-            self.size += 1
-        else:
-            raise Exception("Bucket is full")
-
-    def isFull(self):
-        return self.size >= self.fb
-
-    def empaquetar(self):
-        data = struct.pack('i', self.size)
-        data += struct.pack('i', self.next)
-        registro_vacio = struct.pack(
-            Registro.FORMAT,
-            -1, b'', b'', -1.0, -1.0, -1.0, -1.0
-        )
-        for i in range(self.fb):
-            if i < self.size and self.registros[i]:
-                data += self.registros[i].empaquetar()
-            else:
-                data += registro_vacio
-        return data
-
-    @staticmethod
-    def desempaquetar(data, fb):
-        size, next = struct.unpack('ii', data[:8])
-        bucket = Bucket(fb)
-        bucket.size = size
-        bucket.next = next
-        offset = 8
-        for i in range(fb):
-            registro_data = data[offset:offset + Registro.SIZE]
-            r = Registro.desempaquetar(registro_data)
-            if i < size:
-                bucket.registros[i] = r
-            offset += Registro.SIZE
-        return bucket
-
-class ISAM:
-    def __init__(self, path='data/registros_isam.dat', fb=3): # por default
-        self.path = path
-        self.fb = fb
-        self.index1 = []  # [(clave, offset)]
-        self.index2 = []  # [(clave, pos en index1)]
-        self.bucket_size = 8 + fb * Registro.SIZE
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        if not os.path.exists(path):
-            open(path, 'wb').close()
-        self.load_indexes()
-
-    def save_indexes(self):
-        with open("data/isam_index.json", "w") as f:
-            json.dump({
-                "index1": self.index1,
-                "index2": self.index2
-            }, f)
-
-    def load_indexes(self):
-        if os.path.exists("data/isam_index.json"):
-            with open("data/isam_index.json", "r") as f:
-                data = json.load(f)
-                self.index1 = [tuple(i) for i in data["index1"]]
-                self.index2 = [tuple(i) for i in data["index2"]]
-
-
-    def _read_bucket(self, offset):
-        with open(self.path, 'rb') as f:
-            f.seek(offset)
-            data = f.read(self.bucket_size)
-            return Bucket.desempaquetar(data, self.fb)
-
-    def _write_bucket(self, bucket, offset):
-        with open(self.path, 'r+b') as f:
-            f.seek(offset)
-            f.write(bucket.empaquetar())
-
-    def _append_bucket(self, bucket):
-        with open(self.path, 'ab') as f:
-            offset = f.tell()
-            f.write(bucket.empaquetar())
-            return offset
-
-    def build_index(self, registros):
-        registros.sort(key=lambda r: r.id)
-        self.index1.clear()
-        self.index2.clear()
-        open(self.path, 'wb').close()
-        for i in range(0, len(registros), self.fb):
-            bloque = Bucket(self.fb)
-            for r in registros[i:i + self.fb]:
-                bloque.insert(r)
-            offset = self._append_bucket(bloque)
-            self.index1.append((bloque.registros[0].id, offset))
-        for i in range(0, len(self.index1), 2):
-            self.index2.append((self.index1[i][0], i))
-
-    def _buscar_offset(self, key):
-        i1 = 0
-        for k2, idx in self.index2:
-            if key >= k2:
-                i1 = idx
-        offset = self.index1[i1][1]
-        for j in range(i1, len(self.index1)):
-            if key >= self.index1[j][0]:
-                offset = self.index1[j][1]
-            else:
-                break
-        return offset
-
-    def search(self, key):
-        offset = self._buscar_offset(key)
-        res = []
-        while offset != -1:
-            bucket = self._read_bucket(offset)
-            for r in bucket.registros:
-                if r and r.id == key:
-                    res.append(r)
-            offset = bucket.next
-        return res
-    
-    def rangeSearch(self, begin, end):
-        resultados = []
-
-        # Buscar el índice de nivel 1 desde el cual comenzar
-        start_idx = 0
-        for i, (k, _) in enumerate(self.index1):
-            if k <= begin:
-                start_idx = i
-            else:
-                break
-
-        # Recorrer los buckets desde ese índice hasta que se supere 'end'
-        for i in range(start_idx, len(self.index1)):
-            _, offset = self.index1[i]
-            while offset != -1:
-                bucket = self._read_bucket(offset)
-                for r in bucket.registros:
-                    if r and begin <= r.id <= end:
-                        resultados.append(r)
-                    elif r and r.id > end:
-                        return resultados  # Ya pasamos el rango
-                offset = bucket.next
-
-        return resultados
-
-    def add(self, registro):
-        if not self.index1:
-            # crea un bucket inicial con el registro
-            bucket = Bucket(self.fb)
-            bucket.insert(registro)
-            offset = self._append_bucket(bucket)
-            self.index1.append((registro.id, offset))
-            self.index2.append((registro.id, 0))
-            return
-        offset = self._buscar_offset(registro.id)
-        bucket = self._read_bucket(offset)
-        while bucket.isFull():
-            if bucket.next == -1:
-                new_bucket = Bucket(self.fb)
-                new_offset = self._append_bucket(new_bucket)
-                bucket.next = new_offset
-                self._write_bucket(bucket, offset)
-            offset = bucket.next
-            bucket = self._read_bucket(offset)
-        bucket.insert(registro)
-        self._write_bucket(bucket, offset)
-
-    def remove(self, key):
-        if not self.index1:
-            return False
-
-        offset = self._buscar_offset(key)
-        eliminado = False
-
-        while offset != -1:
-            bucket = self._read_bucket(offset)
-            modificado = False
-
-            for i in range(bucket.size):
-                if bucket.registros[i] and bucket.registros[i].id == key:
-                    bucket.registros[i] = None
-                    modificado = True
-                    eliminado = True
-
-            if modificado:
-                self._write_bucket(bucket, offset)
-
-            offset = bucket.next
-
-        return eliminado
+import os
+import csv
+import heapq
+import struct
+import json
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+PAGE_SIZE = 4096  # tamaño de página de datos por defecto
+BUCKET_HEADER = struct.Struct('=iq')  # registros usados, offset del siguiente bucket
+
+IDX_PAGE_SIZE = 4096
+IDX_MAGIC = b'ISMI'
+# magic, entradas nivel 1, entradas nivel 2, entradas por página, buckets de overflow, fb, tamaño de bucket
+IDX_HEADER = struct.Struct('4siiiiii')
+IDX_PAGE_HEADER = struct.Struct('i')  # entradas usadas en la página
+IDX_ENTRY = struct.Struct('=iq')  # (clave, offset del bucket | página del nivel 1)
+IDX_FB = (IDX_PAGE_SIZE - IDX_PAGE_HEADER.size) // IDX_ENTRY.size
+
+# buckets del formato anterior (sin .idx): cabecera (usados, siguiente) 'ii' y fb=3 fijo
+LEGACY_HEADER = struct.Struct('ii')
+LEGACY_FB = 3
+
+REORG_THRESHOLD = 2.0  # largo promedio de cadena (primario + overflow) que dispara la reorganización
+
+MEMORY_BUDGET = 64 * 1024 * 1024  # memoria para ordenar corridas en la carga masiva
+RUN_ROW_COST = 120  # bytes por fila en una corrida en memoria (registro empaquetado + objeto bytes + lista)
+
+def fecha_epoch(fecha):
+    """'YYYY-MM-DD' o ISO 8601 completo ('...T10:45:12.000Z') a segundos UTC desde 1970."""
+    dt = datetime.fromisoformat(fecha.strip().replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def pread(f, size, offset, lock):
+    """Lee size bytes de f desde offset sin mover su posición. Sin os.pread (Windows) se
+    posiciona y lee con `lock` tomado, el mismo que protege las escrituras del handle."""
+    if hasattr(os, 'pread'):
+        return os.pread(f.fileno(), size, offset)
+    with lock:
+        f.seek(offset)
+        return f.read(size)
+
+
+def pread_into(f, buf, offset, lock):
+    # como pread, pero llenando buf sin copias intermedias
+    if hasattr(os, 'preadv'):
+        return os.preadv(f.fileno(), [buf], offset)
+    with lock:
+        f.seek(offset)
+        return f.readinto(buf)
+
+
+class Registro:
+    __slots__ = ('id', 'fecha', 'tipo', 'lat', 'lon', 'mag', 'prof')
+    FORMAT = 'i10s10sffff'  # id, fecha, tipo, lat, lon, mag, prof
+    SIZE = struct.calcsize(FORMAT)
+    STRUCT = struct.Struct(FORMAT)
+
+    def __init__(self, id, fecha, tipo, lat, lon, mag, prof):
+        self.id = id
+        self.fecha = fecha
+        self.tipo = tipo
+        self.lat = lat
+        self.lon = lon
+        self.mag = mag
+        self.prof = prof
+
+    def empaquetar(self):
+        return self.STRUCT.pack(
+            self.id,
+            self.fecha.encode('utf-8'),
+            self.tipo.encode('utf-8'),
+            self.lat,
+            self.lon,
+            self.mag,
+            self.prof
+        )
+
+    @staticmethod
+    def desempaquetar(data, offset=0):
+        unpacked = Registro.STRUCT.unpack_from(data, offset)
+        return Registro(
+            unpacked[0],
+            unpacked[1].decode('utf-8').strip('\x00'),
+            unpacked[2].decode('utf-8').strip('\x00'),
+            unpacked[3],
+            unpacked[4],
+            unpacked[5],
+            unpacked[6]
+        )
+
+    def to_tuple(self):
+        return (
+            self.id,
+            self.fecha.encode('utf-8'),
+            self.tipo.encode('utf-8'),
+            self.lat,
+            self.lon,
+            self.mag,
+            self.prof
+        )
+
+    def to_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    @staticmethod
+    def from_csv_row(row):
+        return Registro(
+            int(row["id"]),
+            row["fecha"],
+            row["tipo"],
+            float(row["lat"]),
+            float(row["lon"]),
+            float(row["mag"]),
+            float(row["prof"])
+        )
+
+
+KEY = struct.Struct('i')  # el id va al inicio de cada registro empaquetado
+LEGACY_BUCKET_SIZE = LEGACY_HEADER.size + LEGACY_FB * Registro.SIZE
+
+
+class Bucket:
+    """Página de registros empaquetados; las claves se leen sin decodificar el registro."""
+
+    REGISTRO_VACIO = struct.pack(
+        Registro.FORMAT,
+        -1, b'', b'', -1.0, -1.0, -1.0, -1.0
+    )
+
+    def __init__(self, fb, data=None, page_size=None):
+        self.fb = fb
+        if data is None:
+            data = bytearray(page_size or BUCKET_HEADER.size + fb * Registro.SIZE)
+            BUCKET_HEADER.pack_into(data, 0, 0, -1)
+        self.data = memoryview(data)
+        self.size, self.next = BUCKET_HEADER.unpack_from(self.data, 0)
+
+    def _slot(self, i):
+        return BUCKET_HEADER.size + i * Registro.SIZE
+
+    def key(self, i):
+        return KEY.unpack_from(self.data, self._slot(i))[0]
+
+    def is_hole(self, i):
+        # huecos dejados por versiones anteriores de remove
+        pos = self._slot(i)
+        return self.key(i) == -1 and self.data[pos:pos + Registro.SIZE] == self.REGISTRO_VACIO
+
+    def registro(self, i):
+        return Registro.desempaquetar(self.data, self._slot(i))
+
+    def raw(self, i):
+        pos = self._slot(i)
+        return self.data[pos:pos + Registro.SIZE]
+
+    @property
+    def registros(self):
+        return [self.registro(i) for i in range(self.size) if not self.is_hole(i)]
+
+    def buscar(self, begin, end):
+        # solo se materializan los registros cuya clave cae en el rango
+        data, unpack, vacio = self.data, KEY.unpack_from, self.REGISTRO_VACIO
+        inicio = BUCKET_HEADER.size
+        for pos in range(inicio, inicio + self.size * Registro.SIZE, Registro.SIZE):
+            k = unpack(data, pos)[0]
+            if begin <= k <= end and (k != -1 or data[pos:pos + Registro.SIZE] != vacio):
+                yield Registro.desempaquetar(data, pos)
+
+    def insert(self, registro):
+        self.insert_raw(registro.empaquetar())
+
+    def insert_raw(self, packed):
+        if self.isFull():
+            raise Exception("Bucket is full")
+        pos = self._slot(self.size)
+        self.data[pos:pos + Registro.SIZE] = packed
+        self.size += 1
+
+    def delete(self, i):
+        # el último registro ocupa el hueco para mantener la página compacta
+        last = self.size - 1
+        if i != last:
+            self.data[self._slot(i):self._slot(i) + Registro.SIZE] = self.raw(last)
+        self.size -= 1
+
+    def isFull(self):
+        return self.size >= self.fb
+
+    def empaquetar(self):
+        BUCKET_HEADER.pack_into(self.data, 0, self.size, self.next)
+        return self.data
+
+    @staticmethod
+    def desempaquetar(data, fb):
+        return Bucket(fb, data)
+
+class IndexSnapshot:
+    """Handle de datos y los dos niveles del índice de una misma versión de la tabla.
+
+    Se reemplaza completo con una sola asignación; un lector que tomó uno nunca mezcla
+    posiciones de un índice con arreglos u offsets de otro.
+    """
+    __slots__ = ('file', 'keys1', 'offsets1', 'keys2', 'pages2')
+
+    def __init__(self, file, keys1, offsets1, keys2=None, pages2=None):
+        self.file = file
+        # nivel 1: primera clave y offset de cada bucket primario, ordenados por clave
+        self.keys1 = keys1
+        self.offsets1 = offsets1
+        # nivel 2: primera clave de cada página del nivel 1
+        if keys2 is None:
+            keys2, pages2 = ISAM._index2_for(keys1)
+        self.keys2 = keys2
+        self.pages2 = pages2
+
+
+class ISAM:
+    def __init__(self, path='data/registros_isam.dat', fb=None, index_path=None,
+                 reorg_threshold=REORG_THRESHOLD, page_size=PAGE_SIZE):
+        self.path = path
+        self.index_path = index_path or os.path.splitext(path)[0] + '.idx'
+        self._set_geometry(fb, page_size)
+        self.reorg_threshold = reorg_threshold  # None desactiva la reorganización automática
+        self.overflow_pages = 0
+        self._lock = threading.RLock()  # serializa escrituras y reorganización; las lecturas solo sin pread
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._recover_reorg()
+        if not os.path.exists(path):
+            open(path, 'wb').close()
+        # un solo handle para los datos; el tamaño guardado en el índice manda sobre el pedido
+        self._index = IndexSnapshot(self._open_data(), array('i'), array('q'))
+        self.load_indexes()
+
+    # vista de la versión actual; las escrituras la reemplazan entera con _index
+    @property
+    def file(self):
+        return self._index.file
+
+    @property
+    def index1_keys(self):
+        return self._index.keys1
+
+    @property
+    def index1_offsets(self):
+        return self._index.offsets1
+
+    @property
+    def index2_keys(self):
+        return self._index.keys2
+
+    @property
+    def index2_pages(self):
+        return self._index.pages2
+
+    def _set_geometry(self, fb, page_size):
+        # fb explícito: buckets compactos; si no, tantos registros como entren en la página
+        if fb is None:
+            fb = (page_size - BUCKET_HEADER.size) // Registro.SIZE
+            bucket_size = page_size
+        else:
+            bucket_size = BUCKET_HEADER.size + fb * Registro.SIZE
+        if fb < 1:
+            raise ValueError(f"page_size {page_size} no alcanza para un registro")
+        self.fb = fb
+        self.bucket_size = bucket_size
+
+    def reset(self, page_size=PAGE_SIZE, fb=None):
+        """Vacía la tabla y cambia el tamaño de página de sus buckets."""
+        with self._lock:
+            self._set_geometry(fb, page_size)
+            self._clear()
+
+    def _clear(self):
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.flush()
+        self._index = IndexSnapshot(self.file, array('i'), array('q'))
+        self.overflow_pages = 0
+        self.save_indexes()
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def _index2_for(keys1):
+        keys2 = keys1[::IDX_FB]
+        return keys2, array('i', range(len(keys2)))
+
+    @staticmethod
+    def _pack_index_pages(keys, values):
+        pages = []
+        for i in range(0, len(keys), IDX_FB):
+            n = min(IDX_FB, len(keys) - i)
+            page = IDX_PAGE_HEADER.pack(n) + b''.join(
+                IDX_ENTRY.pack(keys[j], values[j]) for j in range(i, i + n))
+            pages.append(page.ljust(IDX_PAGE_SIZE, b'\x00'))
+        return b''.join(pages)
+
+    @staticmethod
+    def _unpack_index_pages(data, n):
+        keys, values = array('i'), array('q')
+        for p in range(0, (n + IDX_FB - 1) // IDX_FB):
+            base = p * IDX_PAGE_SIZE
+            count = IDX_PAGE_HEADER.unpack_from(data, base)[0]
+            for k, v in IDX_ENTRY.iter_unpack(data[base + IDX_PAGE_HEADER.size:base + IDX_PAGE_HEADER.size + count * IDX_ENTRY.size]):
+                keys.append(k)
+                values.append(v)
+        return keys, values
+
+    def _write_index_file(self, path, keys1, offsets1, overflow_pages):
+        # cabecera, páginas del nivel 1 y páginas del nivel 2
+        keys2, pages2 = self._index2_for(keys1)
+        with open(path, 'wb') as f:
+            header = IDX_HEADER.pack(IDX_MAGIC, len(keys1), len(keys2), IDX_FB, overflow_pages,
+                                     self.fb, self.bucket_size)
+            f.write(header.ljust(IDX_PAGE_SIZE, b'\x00'))
+            f.write(self._pack_index_pages(keys1, offsets1))
+            f.write(self._pack_index_pages(keys2, pages2))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save_indexes(self):
+        # se escribe aparte y se reemplaza el archivo de golpe
+        tmp = self.index_path + '.tmp'
+        self._write_index_file(tmp, self.index1_keys, self.index1_offsets, self.overflow_pages)
+        os.replace(tmp, self.index_path)
+
+    def _save_header(self):
+        with open(self.index_path, 'r+b') as f:
+            f.write(IDX_HEADER.pack(IDX_MAGIC, len(self.index1_keys), len(self.index2_keys), IDX_FB,
+                                    self.overflow_pages, self.fb, self.bucket_size))
+
+    def load_indexes(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+            magic, n1, n2, idx_fb, self.overflow_pages, self.fb, self.bucket_size = IDX_HEADER.unpack_from(data, 0)
+            if magic != IDX_MAGIC or idx_fb != IDX_FB:
+                raise ValueError(f"Índice ISAM inválido: {self.index_path}")
+            level1 = data[IDX_PAGE_SIZE:]
+            keys1, offsets1 = self._unpack_index_pages(level1, n1)
+            level2 = level1[((n1 + IDX_FB - 1) // IDX_FB) * IDX_PAGE_SIZE:]
+            keys2, pages = self._unpack_index_pages(level2, n2)
+            self._index = IndexSnapshot(self.file, keys1, offsets1, keys2, array('i', pages))
+            return
+
+        # formato anterior: listas en data/isam_index.json y buckets de cabecera 'ii' con fb=3
+        legacy = os.path.join(os.path.dirname(self.path), "isam_index.json")
+        if os.path.exists(legacy):
+            with open(legacy, "r") as f:
+                data = json.load(f)
+            self._migrate_legacy([o for _, o in data["index1"]])
+            return
+
+        if os.path.getsize(self.path):
+            # datos sin índice: solo pudo escribirlos el formato anterior, se reconstruye
+            # recorriendo sus buckets en vez de vaciar la tabla
+            self._migrate_legacy()
+            return
+
+        self._clear()
+
+    def _legacy_bucket(self, offset, file_size):
+        if offset < 0 or offset >= file_size or offset % LEGACY_BUCKET_SIZE:
+            raise ValueError(f"Bucket inválido en {self.path}: offset {offset}")
+        data = pread(self.file, LEGACY_BUCKET_SIZE, offset, self._lock)
+        used, next_offset = LEGACY_HEADER.unpack_from(data, 0)
+        if not 0 <= used <= LEGACY_FB:
+            raise ValueError(f"Bucket inválido en {self.path}: offset {offset}")
+        registros = []
+        for pos in range(LEGACY_HEADER.size, LEGACY_HEADER.size + used * Registro.SIZE, Registro.SIZE):
+            packed = data[pos:pos + Registro.SIZE]
+            if packed != Bucket.REGISTRO_VACIO:  # el remove anterior dejaba huecos
+                registros.append(packed)
+        return registros, next_offset
+
+    def _legacy_registros(self, offsets=None):
+        # con offsets se siguen las cadenas del índice; sin él se recorre el archivo entero,
+        # que en ese formato no tiene buckets inalcanzables
+        file_size = os.path.getsize(self.path)
+        if file_size % LEGACY_BUCKET_SIZE:
+            raise ValueError(f"{self.path} no tiene índice ni el formato anterior de buckets")
+        if offsets is None:
+            for offset in range(0, file_size, LEGACY_BUCKET_SIZE):
+                yield from self._legacy_bucket(offset, file_size)[0]
+            return
+        visitados = set()
+        for offset in offsets:
+            while offset != -1:
+                if offset in visitados:
+                    raise ValueError(f"Cadena de buckets con ciclo en {self.path}: offset {offset}")
+                visitados.add(offset)
+                registros, offset = self._legacy_bucket(offset, file_size)
+                yield from registros
+
+    def _migrate_legacy(self, offsets=None):
+        # se leen completos antes de reescribir: _rebuild reemplaza el archivo de datos
+        registros = sorted(self._legacy_registros(offsets), key=lambda packed: KEY.unpack_from(packed)[0])
+        with self._lock:
+            self._rebuild(registros)
+
+    def _open_data(self):
+        # sin buffer de escritura: cada write es una página completa y los pread de los
+        # lectores ven lo escrito sin esperar un flush
+        return open(self.path, 'r+b', buffering=0)
+
+    def _read_bucket(self, offset, f=None, buf=None):
+        # pread directo al buffer de la página, sin copias intermedias; no mueve la posición
+        # del handle compartido, así que las lecturas concurrentes no se pisan entre sí
+        f = f or self.file
+        buf = buf if buf is not None else bytearray(self.bucket_size)
+        pread_into(f, buf, offset, self._lock)
+        return Bucket(self.fb, buf)
+
+    def _new_bucket(self):
+        return Bucket(self.fb, page_size=self.bucket_size)
+
+    def _pack(self, bucket):
+        return bucket.empaquetar()
+
+    def _write_bucket(self, bucket, offset):
+        self.file.seek(offset)
+        self.file.write(self._pack(bucket))
+
+    def _append_bucket(self, bucket):
+        offset = self.file.seek(0, os.SEEK_END)
+        self.file.write(self._pack(bucket))
+        return offset
+
+    def build_index(self, registros):
+        registros.sort(key=lambda r: r.id)
+        with self._lock:
+            self._rebuild(r.empaquetar() for r in registros)
+
+    def build_from_csv(self, csv_path, memory_budget=MEMORY_BUDGET):
+        """Carga masiva desde un CSV de cualquier tamaño con ordenamiento externo."""
+        def filas():
+            with open(csv_path, newline='') as f:
+                for row in csv.DictReader(f):
+                    try:
+                        yield Registro.from_csv_row(row).empaquetar()
+                    except (ValueError, TypeError, KeyError):
+                        print(f"[WARN] Fila inválida ignorada: {row}")
+        self.bulk_build(filas(), memory_budget)
+
+    def bulk_build(self, packed_rows, memory_budget=MEMORY_BUDGET):
+        """Construye la tabla a partir de registros empaquetados en cualquier orden.
+
+        Se ordenan corridas de a lo sumo memory_budget bytes, se vuelcan a archivos
+        temporales y se mezclan (k-way) directo a los buckets primarios.
+        """
+        run_rows = max(memory_budget // RUN_ROW_COST, 1)
+        key = lambda packed: KEY.unpack_from(packed)[0]
+        runs = []
+        try:
+            corrida = []
+            for packed in packed_rows:
+                corrida.append(packed)
+                if len(corrida) >= run_rows:
+                    runs.append(self._spill_run(corrida, key))
+                    corrida = []
+            corrida.sort(key=key)
+
+            if not runs:
+                merged = corrida  # todo entró en memoria
+            else:
+                if corrida:
+                    runs.append(self._spill_run(corrida, key))
+                buffer = max(memory_budget // (len(runs) + 1) // Registro.SIZE, 1) * Registro.SIZE
+                merged = heapq.merge(*(self._read_run(run, buffer) for run in runs), key=key)
+
+            with self._lock:
+                self._rebuild(merged)
+        finally:
+            for run in runs:
+                run.close()
+
+    def _spill_run(self, corrida, key):
+        corrida.sort(key=key)
+        run = tempfile.TemporaryFile(dir=os.path.dirname(self.path) or '.')
+        run.write(b''.join(corrida))
+        corrida.clear()
+        return run
+
+    @staticmethod
+    def _read_run(run, buffer):
+        run.seek(0)
+        while chunk := run.read(buffer):
+            for pos in range(0, len(chunk), Registro.SIZE):
+                yield chunk[pos:pos + Registro.SIZE]
+
+    def _write_sorted(self, registros, path):
+        # buckets primarios llenos y sin overflow a partir de registros empaquetados y ordenados
+        keys, offsets = array('i'), array('q')
+        with open(path, 'wb') as f:
+            bloque = self._new_bucket()
+            for packed in registros:
+                if bloque.isFull():
+                    keys.append(bloque.key(0))
+                    offsets.append(f.tell())
+                    f.write(self._pack(bloque))
+                    bloque = self._new_bucket()
+                bloque.insert_raw(packed)
+            if bloque.size:
+                keys.append(bloque.key(0))
+                offsets.append(f.tell())
+                f.write(self._pack(bloque))
+            f.flush()
+            os.fsync(f.fileno())
+        return keys, offsets
+
+    def _rebuild(self, registros):
+        """Escribe los registros ordenados en archivos nuevos y los intercambia.
+
+        Mientras se construyen, las lecturas siguen usando el archivo y el índice
+        anteriores; el handle nuevo y los dos niveles se publican juntos en un solo
+        IndexSnapshot. El intercambio en disco es un os.replace por archivo; si el proceso
+        cae a mitad, _recover_reorg completa o descarta la operación al abrir la tabla.
+        """
+        tmp_data = self.path + '.reorg'
+        tmp_index = self.index_path + '.reorg'
+        keys, offsets = self._write_sorted(registros, tmp_data)
+        self._write_index_file(tmp_index, keys, offsets, 0)
+
+        os.replace(tmp_data, self.path)
+        # el handle anterior no se cierra: un scan en curso puede seguir leyendo de él
+        self._index = IndexSnapshot(self._open_data(), keys, offsets)
+        self.overflow_pages = 0
+        os.replace(tmp_index, self.index_path)
+
+    def _recover_reorg(self):
+        tmp_data = self.path + '.reorg'
+        tmp_index = self.index_path + '.reorg'
+        if os.path.exists(tmp_index) and not os.path.exists(tmp_data):
+            os.replace(tmp_index, self.index_path)  # los datos ya se habían reemplazado
+        for tmp in (tmp_data, tmp_index):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _iter_sorted(self):
+        # las cadenas están ordenadas entre sí por el índice; basta ordenar cada una
+        for offset in self.index1_offsets:
+            cadena = []
+            while offset != -1:
+                bucket = self._read_bucket(offset)
+                cadena.extend(bytes(bucket.raw(i)) for i in range(bucket.size) if not bucket.is_hole(i))
+                offset = bucket.next
+            cadena.sort(key=lambda packed: KEY.unpack_from(packed)[0])
+            yield from cadena
+
+    def chain_length(self):
+        if not self.index1_keys:
+            return 0.0
+        return (len(self.index1_keys) + self.overflow_pages) / len(self.index1_keys)
+
+    def reorganize(self):
+        """Vuelve a empaquetar primarios y overflow en buckets primarios ordenados y llenos."""
+        with self._lock:
+            self._rebuild(self._iter_sorted())
+
+    @staticmethod
+    def _buscar_pos(key, index):
+        # nivel 2 -> página del nivel 1 -> primer bucket primario que puede contener key
+        p = max(bisect_left(index.keys2, key) - 1, 0)
+        lo = index.pages2[p] * IDX_FB
+        hi = min(lo + IDX_FB + 1, len(index.keys1))
+        return max(bisect_left(index.keys1, key, lo, hi) - 1, 0)
+
+    def _buscar_offset(self, key):
+        index = self._index
+        return index.offsets1[self._buscar_pos(key, index)]
+
+    def _scan(self, begin, end):
+        # cadenas de los buckets primarios cuya primera clave puede caer en [begin, end]
+        index = self._index  # una sola versión durante todo el recorrido
+        f, keys, offsets = index.file, index.keys1, index.offsets1
+        if not keys:
+            return
+        i = self._buscar_pos(begin, index)
+        n = len(keys)
+        buf = bytearray(self.bucket_size)  # un solo buffer reutilizado para todas las páginas
+        while True:
+            offset = offsets[i]
+            while offset != -1:
+                bucket = self._read_bucket(offset, f, buf)
+                yield from bucket.buscar(begin, end)
+                offset = bucket.next
+            i += 1
+            if i >= n or keys[i] > end:
+                return
+
+    def search(self, key):
+        return list(self._scan(key, key))
+    
+    def rangeSearch(self, begin, end):
+        return list(self._scan(begin, end))
+
+    def add(self, registro):
+        with self._lock:
+            self._add(registro)
+            self.file.flush()
+            if self.reorg_threshold is not None and self.chain_length() > self.reorg_threshold:
+                self.reorganize()
+
+    def _add(self, registro):
+        if not self.index1_keys:
+            # crea un bucket inicial con el registro
+            bucket = self._new_bucket()
+            bucket.insert(registro)
+            offset = self._append_bucket(bucket)
+            self._index = IndexSnapshot(self.file, array('i', [registro.id]), array('q', [offset]))
+            self.save_indexes()
+            return
+        offset = self._buscar_offset(registro.id)
+        bucket = self._read_bucket(offset)
+        while bucket.isFull():
+            if bucket.next == -1:
+                new_bucket = self._new_bucket()
+                new_offset = self._append_bucket(new_bucket)
+                bucket.next = new_offset
+                self._write_bucket(bucket, offset)
+                self.overflow_pages += 1
+                self._save_header()
+            offset = bucket.next
+            bucket = self._read_bucket(offset)
+        bucket.insert(registro)
+        self._write_bucket(bucket, offset)
+
+    def remove(self, key):
+        with self._lock:
+            eliminado = self._remove(key)
+            self.file.flush()
+            return eliminado
+
+    def _remove(self, key):
+        if not self.index1_keys:
+            return False
+
+        eliminado = False
+        i = self._buscar_pos(key, self._index)
+        while True:
+            offset = self.index1_offsets[i]
+            while offset != -1:
+                bucket = self._read_bucket(offset)
+                modificado = False
+
+                j = 0
+                while j < bucket.size:
+                    if bucket.key(j) == key and not bucket.is_hole(j):
+                        bucket.delete(j)
+                        modificado = True
+                        eliminado = True
+                    else:
+                        j += 1
+
+                if modificado:
+                    self._write_bucket(bucket, offset)
+
+                offset = bucket.next
+            i += 1
+            if i >= len(self.index1_keys) or self.index1_keys[i] > key:
+                return eliminado
@@ -1,7 +1,18 @@
 import struct
 import os
+import threading
+from array import array
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from itertools import islice
+from typing import Iterator, Optional
+
+CACHE_SIZE = 4096  # nodos decodificados que se mantienen en memoria
+RANGE_BATCH = 256  # payloads leídos juntos durante un range scan
+
+MAGIC = b'AVLI'
+INDEX_HEADER = struct.Struct("4siiii")  # magic, raíz, ranuras de nodos, libre de nodos, nodos vivos
+HEAP_HEADER = struct.Struct("ii")       # ranuras de payloads, libre de payloads
 
 @dataclass
 class AVLRecord:
@@ -12,20 +23,114 @@ class AVLRecord:
     offset: int
 
 class AVLFile:
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, data_filename: Optional[str] = None, cache_size: int = CACHE_SIZE):
         
-        self.filename = filename
+        self.filename = filename  # nodos de ancho fijo
+        self.data_filename = data_filename or os.path.splitext(filename)[0] + "_heap.dat"  # payloads
+        self.cache_size = cache_size
 
         self.record_struct = struct.Struct("iiiii")
         self.registro_struct = struct.Struct("i10s10sffff")  # para Registro real
-        self.pos_root_struct = struct.Struct("i")
+        self.next_free_struct = struct.Struct("i")
 
-        if not os.path.exists(self.filename):
-            with open(self.filename, "wb") as file:
-                file.write(self.pos_root_struct.pack(-1))  # raíz vacía
+        legacy = None
+        if os.path.exists(self.filename):
+            with open(self.filename, "rb") as file:
+                if file.read(4) != MAGIC:
+                    legacy = self._read_legacy()
 
+        if legacy is not None or not os.path.exists(self.filename):
+            with open(self.filename, "wb") as file:
+                file.write(INDEX_HEADER.pack(MAGIC, -1, 0, -1, 0))  # raíz vacía
+        if legacy is not None or not os.path.exists(self.data_filename):
+            with open(self.data_filename, "wb") as file:
+                file.write(HEAP_HEADER.pack(0, -1))
+
+        # un handle abierto por archivo para todo el ciclo de vida del árbol; como las lecturas
+        # también mueven su posición y actualizan el cache LRU, todo acceso pasa por _lock
+        self._lock = threading.RLock()
+        self.file = open(self.filename, "r+b")
+        self.heap = open(self.data_filename, "r+b")
+        _, self.pos_root, self.node_slots, self.node_free, self.count = INDEX_HEADER.unpack(self.file.read(INDEX_HEADER.size))
+        self.heap_slots, self.heap_free = HEAP_HEADER.unpack(self.heap.read(HEAP_HEADER.size))
+        self.saved_header = self._header()
+
+        # cache LRU de nodos con write-back: los nodos sucios se escriben en flush()
+        self.cache = OrderedDict()  # pos -> AVLRecord
+        self.dirty = set()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.flushes = 0
+        self.writes = 0
+
+        if legacy is not None:
+            self._bulk_write(iter(legacy))
+
+    def stats(self) -> dict:
+        return {
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "flushes": self.flushes,
+            "writes": self.writes,
+        }
+
+    def _header(self):
+        return (self.pos_root, self.node_slots, self.node_free, self.count, self.heap_slots, self.heap_free)
+
+    def _read_legacy(self) -> list:
+        # formato anterior: raíz + nodos y payloads mezclados en un único archivo
         with open(self.filename, "rb") as file:
-            self.pos_root = self.pos_root_struct.unpack(file.read(4))[0]
+            raw = file.read()
+        records = []
+        stack = []
+        pos = struct.unpack_from("i", raw, 0)[0] if len(raw) >= 4 else -1
+        while stack or pos != -1:
+            if pos != -1:
+                node = AVLRecord(*self.record_struct.unpack_from(raw, 4 + pos * self.record_struct.size))
+                stack.append(node)
+                pos = node.left
+            else:
+                node = stack.pop()
+                records.append((node.id, raw[node.offset:node.offset + self.registro_struct.size]))
+                pos = node.right
+        return records
+
+    def _write_node(self, pos: int, record: AVLRecord):
+        self.file.seek(INDEX_HEADER.size + pos * self.record_struct.size)
+        self.file.write(self.record_struct.pack(record.id, record.left, record.right, record.height, record.offset))
+        self.writes += 1
+
+    def _cache_put(self, pos: int, record: AVLRecord):
+        self.cache[pos] = record
+        self.cache.move_to_end(pos)
+        while len(self.cache) > self.cache_size:
+            old_pos, old = self.cache.popitem(last=False)
+            if old_pos in self.dirty:
+                self.dirty.discard(old_pos)
+                self._write_node(old_pos, old)
+
+    def flush(self):
+        with self._lock:
+            for pos in sorted(self.dirty):
+                self._write_node(pos, self.cache[pos])
+            self.dirty.clear()
+            header = self._header()
+            if header != self.saved_header:
+                self.file.seek(0)
+                self.file.write(INDEX_HEADER.pack(MAGIC, self.pos_root, self.node_slots, self.node_free, self.count))
+                self.heap.seek(0)
+                self.heap.write(HEAP_HEADER.pack(self.heap_slots, self.heap_free))
+                self.saved_header = header
+            self.file.flush()
+            self.heap.flush()
+            self.flushes += 1
+
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self.flush()
+                self.file.close()
+                self.heap.close()
 
     def update_height(self, record: AVLRecord):
         left_height = self.get_record(record.left).height if record.left != -1 else -1
@@ -38,27 +143,44 @@ class AVLFile:
         return left_height - right_height
 
     def set_record(self, pos: int, record: AVLRecord):
-        with open(self.filename, "r+b") as file:
-            file.seek(4 + pos * self.record_struct.size)
-            file.write(self.record_struct.pack(record.id, record.left, record.right, record.height, record.offset))
+        self._cache_put(pos, record)
+        self.dirty.add(pos)
 
     def get_record(self, pos: int) -> AVLRecord:
-        with open(self.filename, "rb") as file:
-            file.seek(4 + pos * self.record_struct.size)
-            data = file.read(self.record_struct.size)
-            return AVLRecord(*self.record_struct.unpack(data))
+        record = self.cache.get(pos)
+        if record is not None:
+            self.cache_hits += 1
+            self.cache.move_to_end(pos)
+            return record
+        self.cache_misses += 1
+        self.file.seek(INDEX_HEADER.size + pos * self.record_struct.size)
+        data = self.file.read(self.record_struct.size)
+        record = AVLRecord(*self.record_struct.unpack(data))
+        self._cache_put(pos, record)
+        return record
 
     def append_record(self, record: AVLRecord) -> int:
-        with open(self.filename, "ab") as file:
-            file.write(self.record_struct.pack(record.id, record.left, record.right, record.height, record.offset))
-        return self.get_num_records() - 1
+        # reutiliza primero una ranura liberada; en los nodos libres `left` apunta al siguiente
+        if self.node_free != -1:
+            pos = self.node_free
+            self.node_free = self.get_record(pos).left
+        else:
+            pos = self.node_slots
+            self.node_slots += 1
+        self.set_record(pos, record)
+        self.count += 1
+        return pos
+
+    def _free_record(self, pos: int):
+        self.set_record(pos, AVLRecord(-1, self.node_free, -1, -1, -1))
+        self.node_free = pos
+        self.count -= 1
 
     def get_num_records(self) -> int:
-        size = os.path.getsize(self.filename)
-        return (size - 4) // self.record_struct.size
+        return self.count
 
-    def _save_registro(self, registro) -> int:
-        packed = self.registro_struct.pack(
+    def _pack_registro(self, registro) -> bytes:
+        return self.registro_struct.pack(
             registro.id,
             registro.fecha.encode('utf-8').ljust(10, b'\x00'),
             registro.tipo.encode('utf-8').ljust(10, b'\x00'),
@@ -67,25 +189,126 @@ class AVLFile:
             registro.mag,
             registro.prof
         )
-        with open(self.filename, "ab") as f:
-            offset = f.tell()
-            f.write(packed)
+
+    def _save_registro(self, registro) -> int:
+        if self.heap_free != -1:
+            offset = self.heap_free
+            self.heap.seek(offset)
+            self.heap_free = self.next_free_struct.unpack(self.heap.read(self.next_free_struct.size))[0]
+        else:
+            offset = HEAP_HEADER.size + self.heap_slots * self.registro_struct.size
+            self.heap_slots += 1
+        self.heap.seek(offset)
+        self.heap.write(self._pack_registro(registro))
         return offset
 
+    def _free_registro(self, offset: int):
+        # la ranura liberada guarda el offset de la siguiente libre en sus primeros 4 bytes
+        self.heap.seek(offset)
+        self.heap.write(self.next_free_struct.pack(self.heap_free))
+        self.heap_free = offset
+
     def save_root(self):
-        with open(self.filename, "r+b") as file:
-            file.seek(0)
-            file.write(self.pos_root_struct.pack(self.pos_root))
+        self.flush()
+
+    @staticmethod
+    def _balanced_links(n: int):
+        # hijos de cada posición en orden para un árbol perfectamente balanceado sobre [0, n)
+        left = array('i', [-1]) * n
+        right = array('i', [-1]) * n
+        height = array('i', [0]) * n
+        if n == 0:
+            return -1, left, right, height
+        root = (n - 1) // 2
+        stack = [(0, n - 1, root)]
+        while stack:
+            lo, hi, mid = stack.pop()
+            height[mid] = (hi - lo + 1).bit_length() - 1
+            if lo < mid:
+                left[mid] = (lo + mid - 1) // 2
+                stack.append((lo, mid - 1, left[mid]))
+            if mid < hi:
+                right[mid] = (mid + 1 + hi) // 2
+                stack.append((mid + 1, hi, right[mid]))
+        return root, left, right, height
+
+    def bulk_load(self, records, presorted: bool = False):
+        """Reemplaza el contenido del árbol con `records` en una sola pasada secuencial.
+
+        Los payloads quedan contiguos en el heap y los nodos en el índice, ambos en
+        orden de clave. Con presorted=True los registros se consumen como stream.
+        """
+        if not presorted:
+            records = sorted(records, key=lambda r: r.id)
+        with self._lock:
+            self._bulk_write((r.id, self._pack_registro(r)) for r in records)
+
+    def _bulk_write(self, items):
+        # se arma en archivos aparte y se intercambian al final: si el stream falla
+        # (por ejemplo, no viene ordenado) el árbol anterior queda intacto
+        tmp_index, tmp_heap = self.filename + ".tmp", self.data_filename + ".tmp"
+        try:
+            with open(tmp_index, "wb") as file, open(tmp_heap, "wb") as heap:
+                root, n = self._write_sorted(file, heap, items)
+        except BaseException:
+            for tmp in (tmp_index, tmp_heap):
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            raise
+
+        self.file.close()
+        self.heap.close()
+        os.replace(tmp_heap, self.data_filename)
+        os.replace(tmp_index, self.filename)
+        self.file = open(self.filename, "r+b")
+        self.heap = open(self.data_filename, "r+b")
+
+        self.cache.clear()
+        self.dirty.clear()
+        self.pos_root = root
+        self.node_slots = self.heap_slots = self.count = n
+        self.node_free = self.heap_free = -1
+        self.saved_header = None
+        self.flush()
+
+    def _write_sorted(self, file, heap, items):
+        file.write(INDEX_HEADER.pack(MAGIC, -1, 0, -1, 0))
+        heap.write(HEAP_HEADER.pack(0, -1))
+
+        # 1. payloads secuenciales en el heap
+        ids = array('i')
+        for id, packed in items:
+            if ids and id <= ids[-1]:
+                if id == ids[-1]:
+                    continue  # id ya existe
+                raise ValueError(f"bulk_load: registros no ordenados ({ids[-1]} antes de {id})")
+            heap.write(packed)
+            ids.append(id)
+
+        # 2. nodos secuenciales: el nodo i (en orden de clave) vive en la posición i
+        n = len(ids)
+        root, left, right, height = self._balanced_links(n)
+        payload_size = self.registro_struct.size
+        pack = self.record_struct.pack
+        chunk = []
+        for i in range(n):
+            chunk.append(pack(ids[i], left[i], right[i], height[i], HEAP_HEADER.size + i * payload_size))
+            if len(chunk) == 4096:
+                file.write(b''.join(chunk))
+                chunk.clear()
+        file.write(b''.join(chunk))
+        return root, n
 
     def insert(self, record):
-        offset = self._save_registro(record)
-        record = AVLRecord(record.id, -1, -1, 0, offset)
-        self.pos_root = self._insert(self.pos_root, record)
-        self.save_root()
+        with self._lock:
+            self.pos_root = self._insert(self.pos_root, record)
+            self.save_root()
 
-    def _insert(self, pos: int, record: AVLRecord) -> int:
+    def _insert(self, pos: int, record) -> int:
         if pos == -1:
-            return self.append_record(record)
+            # el payload solo se escribe cuando el id es nuevo
+            offset = self._save_registro(record)
+            return self.append_record(AVLRecord(record.id, -1, -1, 0, offset))
 
         temp = self.get_record(pos)
 
@@ -102,29 +325,35 @@ class AVLFile:
         return self.balance(pos)
 
     def remove(self, id: int):
-        self.pos_root = self._remove(self.pos_root, id)
-        self.save_root()
+        with self._lock:
+            self.pos_root = self._remove(self.pos_root, id)
+            self.save_root()
 
-    def _remove(self, pos: int, id: int) -> int:
+    def _remove(self, pos: int, id: int, free_payload: bool = True) -> int:
         if pos == -1:
             return -1
 
         record = self.get_record(pos)
 
         if id < record.id:
-            record.left = self._remove(record.left, id)
+            record.left = self._remove(record.left, id, free_payload)
         elif id > record.id:
-            record.right = self._remove(record.right, id)
+            record.right = self._remove(record.right, id, free_payload)
         else:
-            if record.left == -1:
-                return record.right
-            elif record.right == -1:
-                return record.left
+            if free_payload:
+                self._free_registro(record.offset)
+
+            if record.left == -1 or record.right == -1:
+                child = record.right if record.left == -1 else record.left
+                self._free_record(pos)
+                return child
 
+            # el sucesor se mueve a este nodo junto con su payload, que no se libera
             min_pos = self.get_min(record.right)
             min_record = self.get_record(min_pos)
             record.id = min_record.id
-            record.right = self._remove(record.right, min_record.id)
+            record.offset = min_record.offset
+            record.right = self._remove(record.right, min_record.id, free_payload=False)
 
         self.update_height(record)
         self.set_record(pos, record)
@@ -193,19 +422,21 @@ class AVLFile:
     def inorder(self, pos: Optional[int] = None, result: Optional[list] = None):
         if result is None:
             result = []
-        if pos is None:
-            pos = self.pos_root
-        if pos == -1:
-            return result
-        record = self.get_record(pos)
-        self.inorder(record.left, result)
-        result.append(record.id)
-        self.inorder(record.right, result)
+        with self._lock:
+            if pos is None:
+                pos = self.pos_root
+            if pos == -1:
+                return result
+            record = self.get_record(pos)
+            self.inorder(record.left, result)
+            result.append(record.id)
+            self.inorder(record.right, result)
         return result
 
 
     def search(self, key: int) -> Optional[dict]:
-        return self._search(self.pos_root, key)
+        with self._lock:
+            return self._search(self.pos_root, key)
 
     def _search(self, pos: int, key: int) -> Optional[dict]:
         if pos == -1:
@@ -219,35 +450,78 @@ class AVLFile:
             return self._search(r.right, key)
 
     def _read_registro(self, offset) -> dict: # para el offset
-        with open(self.filename, "rb") as f:
-            f.seek(offset)
-            data = f.read(self.registro_struct.size)
-            unpacked = self.registro_struct.unpack(data)
-            return {
-                "id": unpacked[0],
-                "fecha": unpacked[1].decode().strip("\x00"),
-                "tipo": unpacked[2].decode().strip("\x00"),
-                "lat": unpacked[3],
-                "lon": unpacked[4],
-                "mag": unpacked[5],
-                "prof": unpacked[6]
-            }
-
-    def range_search(self, min_id: int, max_id: int) -> list[dict]:
-        result = []
-        self._range_search(self.pos_root, min_id, max_id, result)
-        return result
-
-    def _range_search(self, pos: int, min_id: int, max_id: int, result: list):
-        if pos == -1:
-            return
-
-        record = self.get_record(pos)
-        if min_id < record.id:
-            self._range_search(record.left, min_id, max_id, result)
-
-        if min_id <= record.id <= max_id:
-            result.append(self._read_registro(record.offset))
-
-        if record.id < max_id:
-            self._range_search(record.right, min_id, max_id, result)
+        self.heap.seek(offset)
+        return self._decode_registro(self.heap.read(self.registro_struct.size))
+
+    def _decode_registro(self, data, pos: int = 0) -> dict:
+        unpacked = self.registro_struct.unpack_from(data, pos)
+        return {
+            "id": unpacked[0],
+            "fecha": unpacked[1].decode().strip("\x00"),
+            "tipo": unpacked[2].decode().strip("\x00"),
+            "lat": unpacked[3],
+            "lon": unpacked[4],
+            "mag": unpacked[5],
+            "prof": unpacked[6]
+        }
+
+    def range_search(self, min_id: int, max_id: int, limit: Optional[int] = None,
+                     after_key: Optional[int] = None) -> list[dict]:
+        return list(islice(self.iter_range(min_id, max_id, after_key), limit))
+
+    def iter_range(self, min_id: int, max_id: int, after_key: Optional[int] = None,
+                   batch_size: int = RANGE_BATCH) -> Iterator[dict]:
+        """Recorre en orden las claves de [min_id, max_id] con una pila explícita.
+
+        after_key funciona como cursor: se empieza en la primera clave mayor a él.
+        Los payloads se leen en lotes de batch_size agrupados por offset. Cada lote se
+        arma con el lock tomado y se entrega sin él, así que un generador a medio consumir
+        no bloquea a los demás hilos.
+        """
+        lower = min_id if after_key is None else max(min_id, after_key + 1)
+        stack = []
+        pos = None
+        done = False
+        while not done:
+            with self._lock:
+                if pos is None:
+                    pos = self.pos_root
+                batch = []
+                while len(batch) < batch_size:
+                    if pos != -1:
+                        record = self.get_record(pos)
+                        if record.id >= lower:
+                            stack.append(record)
+                            pos = record.left
+                        else:
+                            pos = record.right  # todo el subárbol izquierdo queda fuera del rango
+                        continue
+
+                    if not stack:
+                        done = True
+                        break
+                    record = stack.pop()
+                    if record.id > max_id:
+                        done = True
+                        break
+                    batch.append(record.offset)
+                    pos = record.right
+                rows = self._read_batch(batch)
+            yield from rows
+
+    def _read_batch(self, offsets: list) -> list[dict]:
+        # lee tramos contiguos del heap con una sola llamada y devuelve en el orden pedido
+        size = self.registro_struct.size
+        decoded = {}
+        ordered = sorted(offsets)
+        i = 0
+        while i < len(ordered):
+            j = i + 1
+            while j < len(ordered) and ordered[j] == ordered[j - 1] + size:
+                j += 1
+            self.heap.seek(ordered[i])
+            data = self.heap.read(size * (j - i))
+            for k in range(i, j):
+                decoded[ordered[k]] = self._decode_registro(data, (k - i) * size)
+            i = j
+        return [decoded[offset] for offset in offsets]
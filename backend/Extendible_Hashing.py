@@ -1,111 +1,258 @@
 import os
 import struct
+import threading
 from typing import TypeVar, Generic, List, Optional
 
 TK = TypeVar('TK')
 RecordType = TypeVar('RecordType')
 
-MAX_DEPTH = 6  # Profundidad máxima del directorio
-MAX_FILL = 10  # Capacidad máxima de cada bucket
+MAX_DEPTH = 16  # Profundidad global máxima del directorio
+MAX_FILL = 100  # Capacidad máxima de cada bucket (~4 KiB por página)
+
+MAGIC = b'EXTH'
+INDEX_HEADER = struct.Struct("4siii")  # magic, profundidad global, profundidad máxima, capacidad
+DIR_ENTRY = struct.Struct("i")          # offset del bucket en el archivo de datos
+BUCKET_HEADER = struct.Struct("iii")    # profundidad local, tamaño, siguiente (overflow)
+
+
+class HashRecord:
+    __slots__ = ('id', 'data')
+
+    def __init__(self, data: tuple):
+        self.id = data[0]
+        self.data = data
+
+    def to_tuple(self):
+        return self.data
+
+
+class HashBucket:
+    def __init__(self, local_depth: int, fb: int):
+        self.local_depth = local_depth
+        self.records = []  # tuplas ya desempaquetadas
+        self.next = -1
+        self.fb = fb
+
+    def is_full(self) -> bool:
+        return len(self.records) >= self.fb
 
 
 class ExtendibleHashing(Generic[TK, RecordType]):
-    def __init__(self, filename: str, record_struct: struct.Struct):
-        self.index_filename = f"data/indx_{filename}"
-        self.data_filename = f"data/{filename}"
+    def __init__(self, filename: str, record_struct: struct.Struct,
+                 max_depth: int = MAX_DEPTH, fb: int = MAX_FILL, data_dir: str = "data"):
+        self.index_filename = os.path.join(data_dir, f"indx_{filename}")
+        self.data_filename = os.path.join(data_dir, filename)
         self.record_struct = record_struct
+        self.max_depth = max_depth
+        self.fb = fb
+        self.global_depth = 0
+        self.directory = []  # offsets de buckets, 2^global_depth entradas
+        # un split cambia varias entradas del directorio y buckets a la vez: las operaciones se serializan
+        self._lock = threading.RLock()
+
+        os.makedirs(data_dir, exist_ok=True)
+        if not os.path.exists(self.index_filename) or not self._load_directory():
+            legacy = self._read_legacy_records()
+            self._create_empty()
+            for data in legacy:
+                self.insert(HashRecord(data))
+
+    @property
+    def bucket_size(self) -> int:
+        return BUCKET_HEADER.size + self.fb * self.record_struct.size
+
+    # --- directorio ---
+
+    def _load_directory(self) -> bool:
+        with open(self.index_filename, 'rb') as f:
+            header = f.read(INDEX_HEADER.size)
+            if len(header) < INDEX_HEADER.size:
+                return False
+            magic, global_depth, max_depth, fb = INDEX_HEADER.unpack(header)
+            if magic != MAGIC:
+                return False
+            n = 1 << global_depth
+            raw = f.read(n * DIR_ENTRY.size)
+        self.global_depth, self.max_depth, self.fb = global_depth, max_depth, fb
+        self.directory = list(struct.unpack(f"{n}i", raw))
+        return True
+
+    def _save_directory(self):
+        n = len(self.directory)
+        with open(self.index_filename, 'wb') as f:
+            f.write(INDEX_HEADER.pack(MAGIC, self.global_depth, self.max_depth, self.fb))
+            f.write(struct.pack(f"{n}i", *self.directory))
+
+    def _create_empty(self):
+        self.global_depth = 0
+        with open(self.data_filename, 'wb') as f:
+            self.directory = [self._append_bucket(f, HashBucket(0, self.fb))]
+        self._save_directory()
 
-        # Crear archivo de datos si no existe
+    def _read_legacy_records(self) -> list:
+        # formato anterior: registros planos en el archivo de datos y directorio de 64 entradas
+        records = []
         if not os.path.exists(self.data_filename):
-            with open(self.data_filename, 'wb') as _:
-                pass
+            return records
+        size = self.record_struct.size
+        with open(self.data_filename, 'rb') as f:
+            while len(chunk := f.read(size)) == size:
+                data = self.record_struct.unpack(chunk)
+                if data[0] == 0 and data[1] == b'\x00' * len(data[1]):
+                    continue  # registro borrado
+                records.append(data)
+        return records
+
+    def _double_directory(self):
+        self.directory = self.directory + self.directory
+        self.global_depth += 1
+        self._save_directory()
+
+    # --- buckets ---
+
+    def _read_bucket(self, f, offset: int) -> HashBucket:
+        f.seek(offset)
+        data = f.read(self.bucket_size)
+        local_depth, size, next = BUCKET_HEADER.unpack_from(data, 0)
+        bucket = HashBucket(local_depth, self.fb)
+        bucket.next = next
+        rsize = self.record_struct.size
+        pos = BUCKET_HEADER.size
+        for _ in range(size):
+            bucket.records.append(self.record_struct.unpack_from(data, pos))
+            pos += rsize
+        return bucket
+
+    def _pack_bucket(self, bucket: HashBucket) -> bytes:
+        data = BUCKET_HEADER.pack(bucket.local_depth, len(bucket.records), bucket.next)
+        data += b''.join(self.record_struct.pack(*r) for r in bucket.records)
+        return data.ljust(self.bucket_size, b'\x00')
+
+    def _write_bucket(self, f, offset: int, bucket: HashBucket):
+        f.seek(offset)
+        f.write(self._pack_bucket(bucket))
 
-        # Crear archivo de índice si no existe
-        if not os.path.exists(self.index_filename):
-            with open(self.index_filename, 'wb') as f:
-                for i in range(1 << MAX_DEPTH):
-                    f.write(struct.pack("ii", i, i % 2))
+    def _write_slot(self, f, offset: int, bucket: HashBucket, i: int):
+        # escribe solo la cabecera y la ranura i, sin reempaquetar la página completa
+        f.seek(offset)
+        f.write(BUCKET_HEADER.pack(bucket.local_depth, len(bucket.records), bucket.next))
+        if i < len(bucket.records):
+            f.seek(offset + BUCKET_HEADER.size + i * self.record_struct.size)
+            f.write(self.record_struct.pack(*bucket.records[i]))
+
+    def _append_bucket(self, f, bucket: HashBucket) -> int:
+        offset = f.seek(0, os.SEEK_END)
+        f.write(self._pack_bucket(bucket))
+        return offset
+
+    def _read_chain(self, f, offset: int) -> list:
+        chain = []
+        while offset != -1:
+            bucket = self._read_bucket(f, offset)
+            chain.append((offset, bucket))
+            offset = bucket.next
+        return chain
+
+    def _split(self, f, pos: int, offset: int, bucket: HashBucket):
+        if bucket.local_depth == self.global_depth:
+            self._double_directory()
+
+        bit = 1 << bucket.local_depth
+        low = HashBucket(bucket.local_depth + 1, self.fb)
+        high = HashBucket(bucket.local_depth + 1, self.fb)
+        for data in bucket.records:
+            (high if self.hash_function(data[0]) & bit else low).records.append(data)
+
+        self._write_bucket(f, offset, low)
+        high_offset = self._append_bucket(f, high)
+        f.flush()  # el bucket nuevo debe estar en disco antes de que el directorio apunte a él
+
+        # solo cambian las entradas que comparten los bits bajos y tienen el bit nuevo en 1
+        start = (pos & (bit - 1)) | bit
+        with open(self.index_filename, 'r+b') as idx:
+            for i in range(start, len(self.directory), bit << 1):
+                self.directory[i] = high_offset
+                idx.seek(INDEX_HEADER.size + i * DIR_ENTRY.size)
+                idx.write(DIR_ENTRY.pack(high_offset))
+
+    # --- operaciones ---
 
     def hash_function(self, key: int) -> int:
-        return key % (1 << MAX_DEPTH)
+        return key & 0xFFFFFFFF
 
     def get_bucket_index(self, key: int) -> int:
-        index = self.hash_function(key)
-        with open(self.index_filename, 'rb') as f:
-            f.seek(index * 8 + 4)  # 4 bytes skip hash index
-            bucket_index = struct.unpack("i", f.read(4))[0]
-        return bucket_index
-
-    def insert(self, record):
-        if self.find(record.id) is None:
-            with open(self.data_filename, 'ab') as f:
-                f.write(self.record_struct.pack(*record.to_tuple()))
-            print(f"Registro insertado: {record.id}")
-        else:
-            print(f"El registro con código {record.id} ya existe.")
+        return self.hash_function(key) & ((1 << self.global_depth) - 1)
+
+    def insert(self, record) -> bool:
+        data = tuple(record.to_tuple())
+        key = data[0]
+        with self._lock, open(self.data_filename, 'r+b') as f:
+            while True:
+                pos = self.get_bucket_index(key)
+                chain = self._read_chain(f, self.directory[pos])
+
+                for _, bucket in chain:
+                    if any(r[0] == key for r in bucket.records):
+                        print(f"El registro con código {key} ya existe.")
+                        return False
+
+                for offset, bucket in chain:
+                    if not bucket.is_full():
+                        bucket.records.append(data)
+                        self._write_slot(f, offset, bucket, len(bucket.records) - 1)
+                        return True
+
+                head_offset, head = chain[0]
+                if head.local_depth < self.max_depth:
+                    self._split(f, pos, head_offset, head)
+                    continue
+
+                # profundidad máxima alcanzada: encadenar un bucket de overflow
+                overflow = HashBucket(head.local_depth, self.fb)
+                overflow.records.append(data)
+                last_offset, last = chain[-1]
+                last.next = self._append_bucket(f, overflow)
+                self._write_bucket(f, last_offset, last)
+                return True
 
     def find(self, key: int) -> Optional[RecordType]:
-        with open(self.data_filename, 'rb') as f:
-            while chunk := f.read(self.record_struct.size):
-                data = self.record_struct.unpack(chunk)
-                if data[0] == key:
-                    return type('DynamicRecord', (), {'id': data[0], 'to_tuple': lambda self: data})()
+        with self._lock, open(self.data_filename, 'rb') as f:
+            offset = self.directory[self.get_bucket_index(key)]
+            while offset != -1:
+                bucket = self._read_bucket(f, offset)
+                for data in bucket.records:
+                    if data[0] == key:
+                        return HashRecord(data)
+                offset = bucket.next
         return None
 
-    # def remove(self, key: int) -> bool:
-    #     found = False
-    #     with open(self.data_filename, 'r+b') as f:
-    #         pos = 0
-    #         while chunk := f.read(self.record_struct.size):
-    #             data = self.record_struct.unpack(chunk)
-    #             if data[0] == key:
-    #                 f.seek(pos)
-    #                 f.write(self.record_struct.pack(*([0] * len(data))))
-    #                 found = True
-    #                 print(f"Registro con código {key} eliminado.")
-    #                 break
-    #             pos += self.record_struct.size
-    #     if not found:
-    #         print(f"Registro con código {key} no encontrado.")
-    #     return found
-
     def remove(self, key: int) -> bool:
-        found = False
-        with open(self.data_filename, 'r+b') as f:
-            pos = 0
-            while chunk := f.read(self.record_struct.size):
-                data = self.record_struct.unpack(chunk)
-                if data[0] == key:
-                    f.seek(pos)
-                    blank = (
-                        0,                     # int
-                        b''.ljust(10, b'\x00'),  # 10s
-                        b''.ljust(10, b'\x00'),  # 10s
-                        -1.0, -1.0, -1.0, -1.0  # floats
-                    )
-                    f.write(self.record_struct.pack(*blank))
-                    found = True
-                    print(f"Registro con código {key} eliminado.")
-                    break
-                pos += self.record_struct.size
-        if not found:
-            print(f"Registro con código {key} no encontrado.")
-        return found
+        with self._lock, open(self.data_filename, 'r+b') as f:
+            offset = self.directory[self.get_bucket_index(key)]
+            while offset != -1:
+                bucket = self._read_bucket(f, offset)
+                for i, data in enumerate(bucket.records):
+                    if data[0] == key:
+                        # el último registro ocupa el hueco para mantener la página compacta
+                        bucket.records[i] = bucket.records[-1]
+                        bucket.records.pop()
+                        self._write_slot(f, offset, bucket, i)
+                        return True
+                offset = bucket.next
+        print(f"Registro con código {key} no encontrado.")
+        return False
 
+    def _scan(self):
+        # recorre las páginas en orden físico; cada página es un bucket vivo
+        with open(self.data_filename, 'rb') as f:
+            end = f.seek(0, os.SEEK_END)
+            for offset in range(0, end, self.bucket_size):
+                yield from self._read_bucket(f, offset).records
 
     def find_range(self, lower: int, upper: int) -> List[RecordType]:
-        results = []
-        with open(self.data_filename, 'rb') as f:
-            while chunk := f.read(self.record_struct.size):
-                data = self.record_struct.unpack(chunk)
-                if lower <= data[0] <= upper:
-                    results.append(type('DynamicRecord', (), {'id': data[0], 'to_tuple': lambda self: data})())
-        return results
+        with self._lock:
+            return [HashRecord(data) for data in self._scan() if lower <= data[0] <= upper]
 
     def get_all_records(self) -> List[RecordType]:
-        records = []
-        with open(self.data_filename, 'rb') as f:
-            while chunk := f.read(self.record_struct.size):
-                data = self.record_struct.unpack(chunk)
-                records.append(type('DynamicRecord', (), {'id': data[0], 'to_tuple': lambda self: data})())
-        return records
+        with self._lock:
+            return [HashRecord(data) for data in self._scan()]
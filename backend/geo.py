@@ -0,0 +1,31 @@
+from math import asin, cos, degrees, radians, sin, sqrt
+
+EARTH_RADIUS_KM = 6371.0088  # radio medio de la Tierra
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de gran círculo en km entre dos puntos en grados."""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def bounding_boxes(lat: float, lon: float, km: float) -> list:
+    """Cajas (lon_min, lat_min, lon_max, lat_max) que cubren el círculo de radio `km`.
+
+    La caja se parte en dos si cruza el antimeridiano y abarca todas las longitudes
+    si el círculo contiene un polo.
+    """
+    d = km / EARTH_RADIUS_KM  # radio angular
+    lat_min, lat_max = lat - degrees(d), lat + degrees(d)
+    if lat_min <= -90 or lat_max >= 90:
+        return [(-180.0, max(lat_min, -90.0), 180.0, min(lat_max, 90.0))]
+
+    dlon = degrees(asin(sin(d) / cos(radians(lat))))
+    lon_min, lon_max = lon - dlon, lon + dlon
+    if lon_min < -180:
+        return [(lon_min + 360, lat_min, 180.0, lat_max), (-180.0, lat_min, lon_max, lat_max)]
+    if lon_max > 180:
+        return [(lon_min, lat_min, 180.0, lat_max), (-180.0, lat_min, lon_max - 360, lat_max)]
+    return [(lon_min, lat_min, lon_max, lat_max)]
@@ -0,0 +1,174 @@
+import numpy as np
+
+MAX_ZOOM = 10     # celdas de 360/2^z x 180/2^z grados; z=10 ~ 0.35° x 0.18°
+MAX_CELLS = 4096  # celdas por consulta como máximo al elegir el zoom automáticamente
+COUNT, SUM, MAX, MAX_COUNT = range(4)
+
+
+class GridAggregates:
+    """Cantidad, suma y máximo de magnitud por celda en varios niveles de zoom.
+
+    Las celdas forman un quadtree sobre lon/lat: la celda (x, y) del nivel z se divide en
+    cuatro en el nivel z+1. El máximo se mantiene exacto ante borrados contando cuántos
+    eventos lo alcanzan; si se borra el último, la celda queda pendiente y se recalcula al
+    consultarla a partir de sus cuatro hijos. Solo en max_zoom se usa
+    `recompute(lon_min, lat_min, lon_max, lat_max)`, que devuelve (lat, lon, mag) de los
+    eventos de esa caja.
+    """
+
+    def __init__(self, max_zoom: int = MAX_ZOOM, recompute=None):
+        self.max_zoom = max_zoom
+        self.recompute = recompute
+        self.levels = [{} for _ in range(max_zoom + 1)]  # por zoom: x * 2^z + y -> [cant, suma, máx, cant. del máx]
+        self.stale = set()  # (zoom, celda) con el máximo por recalcular
+
+    @staticmethod
+    def _cell(zoom: int, lat: float, lon: float):
+        n = 1 << zoom
+        x = min(max(int((lon + 180) / 360 * n), 0), n - 1)
+        y = min(max(int((lat + 90) / 180 * n), 0), n - 1)
+        return x, y
+
+    @staticmethod
+    def _cells(zoom: int, lats, lons):
+        # misma cuenta que _cell sobre arreglos; devuelve x * 2^z + y
+        n = 1 << zoom
+        x = np.clip(((lons + 180) / 360 * n).astype(np.int64), 0, n - 1)
+        y = np.clip(((lats + 90) / 180 * n).astype(np.int64), 0, n - 1)
+        return x * n + y
+
+    @staticmethod
+    def _bounds(zoom: int, x: int, y: int):
+        w, h = 360 / (1 << zoom), 180 / (1 << zoom)
+        return x * w - 180, y * h - 90, (x + 1) * w - 180, (y + 1) * h - 90
+
+    def clear(self):
+        for cells in self.levels:
+            cells.clear()
+        self.stale.clear()
+
+    def build(self, lats, lons, mags):
+        """Reemplaza los agregados con los de los arreglos dados, nivel por nivel en NumPy."""
+        self.stale.clear()
+        lats, lons = np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        mags = np.asarray(mags, dtype=np.float32).astype(np.float64)
+        for zoom in range(self.max_zoom + 1):
+            keys, inv, counts = np.unique(self._cells(zoom, lats, lons), return_inverse=True, return_counts=True)
+            sums = np.bincount(inv, weights=mags, minlength=len(keys))
+            maxs = np.full(len(keys), -np.inf)
+            np.maximum.at(maxs, inv, mags)
+            max_counts = np.bincount(inv, weights=mags == maxs[inv], minlength=len(keys)).astype(np.int64)
+            self.levels[zoom] = {
+                key: [count, total, top, top_count]
+                for key, count, total, top, top_count in zip(
+                    keys.tolist(), counts.tolist(), sums.tolist(), maxs.tolist(), max_counts.tolist()
+                )
+            }
+
+    def add(self, lat: float, lon: float, mag: float):
+        mag = float(np.float32(mag))  # misma precisión que el registro guardado
+        for zoom, cells in enumerate(self.levels):
+            x, y = self._cell(zoom, lat, lon)
+            key = x * (1 << zoom) + y
+            cell = cells.get(key)
+            if cell is None:
+                cells[key] = [1, mag, mag, 1]
+                continue
+            cell[COUNT] += 1
+            cell[SUM] += mag
+            if (zoom, key) in self.stale:
+                continue
+            if mag > cell[MAX]:
+                cell[MAX], cell[MAX_COUNT] = mag, 1
+            elif mag == cell[MAX]:
+                cell[MAX_COUNT] += 1
+
+    def remove(self, lat: float, lon: float, mag: float):
+        mag = float(np.float32(mag))
+        for zoom, cells in enumerate(self.levels):
+            x, y = self._cell(zoom, lat, lon)
+            key = x * (1 << zoom) + y
+            cell = cells.get(key)
+            if cell is None:
+                continue
+            cell[COUNT] -= 1
+            if cell[COUNT] == 0:
+                del cells[key]
+                self.stale.discard((zoom, key))
+                continue
+            cell[SUM] -= mag
+            if (zoom, key) not in self.stale and mag == cell[MAX]:
+                cell[MAX_COUNT] -= 1
+                if cell[MAX_COUNT] == 0:
+                    self.stale.add((zoom, key))
+
+    def _refresh(self, zoom: int, key: int, cell: list):
+        x, y = divmod(key, 1 << zoom)
+        if zoom == self.max_zoom:
+            # solo el nivel más fino vuelve a los eventos, con una caja de una sola celda
+            mags = [
+                float(np.float32(mag)) for lat, lon, mag in self.recompute(*self._bounds(zoom, x, y))
+                if self._cell(zoom, lat, lon) == (x, y)  # la caja incluye los bordes de las vecinas
+            ]
+            cell[MAX] = max(mags)
+            cell[MAX_COUNT] = mags.count(cell[MAX])
+        else:
+            # los cuatro hijos suman exactamente los eventos de la celda; se refrescan primero
+            # los que también quedaron pendientes, así que se baja solo por una rama por borrado
+            n = 2 << zoom
+            hijos = self.levels[zoom + 1]
+            cell[MAX], cell[MAX_COUNT] = -np.inf, 0
+            for child_key in ((2 * x + dx) * n + 2 * y + dy for dx in (0, 1) for dy in (0, 1)):
+                child = hijos.get(child_key)
+                if child is None:
+                    continue
+                if (zoom + 1, child_key) in self.stale:
+                    self._refresh(zoom + 1, child_key, child)
+                if child[MAX] > cell[MAX]:
+                    cell[MAX], cell[MAX_COUNT] = child[MAX], child[MAX_COUNT]
+                elif child[MAX] == cell[MAX]:
+                    cell[MAX_COUNT] += child[MAX_COUNT]
+        self.stale.discard((zoom, key))
+
+    def zoom_for(self, lon_min: float, lat_min: float, lon_max: float, lat_max: float) -> int:
+        """Mayor zoom con el que la vista cubre como máximo MAX_CELLS celdas."""
+        for zoom in range(self.max_zoom, 0, -1):
+            x0, y0 = self._cell(zoom, lat_min, lon_min)
+            x1, y1 = self._cell(zoom, lat_max, lon_max)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= MAX_CELLS:
+                return zoom
+        return 0
+
+    def query(self, lon_min: float, lat_min: float, lon_max: float, lat_max: float, zoom: int = None):
+        """Celdas no vacías del zoom pedido que tocan la vista, en tiempo proporcional a la
+        cantidad de celdas de la vista."""
+        if zoom is None:
+            zoom = self.zoom_for(lon_min, lat_min, lon_max, lat_max)
+        zoom = min(max(zoom, 0), self.max_zoom)
+        n = 1 << zoom
+        cells = self.levels[zoom]
+        x0, y0 = self._cell(zoom, lat_min, lon_min)
+        x1, y1 = self._cell(zoom, lat_max, lon_max)
+        results = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                key = x * n + y
+                cell = cells.get(key)
+                if cell is None:
+                    continue
+                if (zoom, key) in self.stale:
+                    self._refresh(zoom, key, cell)
+                c_lon_min, c_lat_min, c_lon_max, c_lat_max = self._bounds(zoom, x, y)
+                results.append({
+                    "zoom": zoom,
+                    "x": x,
+                    "y": y,
+                    "lon_min": c_lon_min,
+                    "lat_min": c_lat_min,
+                    "lon_max": c_lon_max,
+                    "lat_max": c_lat_max,
+                    "cantidad": cell[COUNT],
+                    "mag_max": cell[MAX],
+                    "mag_prom": cell[SUM] / cell[COUNT]
+                })
+        return results
@@ -1,9 +1,9 @@
 from fastapi import FastAPI, Query, UploadFile, File, HTTPException
-from ISAM.isam import Registro,ISAM
-from ISAM.btree import BTree
-from .sql_parser import parse_sql
+from ISAM.isam import Registro,ISAM,MEMORY_BUDGET
+from ISAM.btree import BTree, SecondaryIndex, SECONDARY_COLUMNS, PAGE_SIZE as BTREE_PAGE_SIZE
+from .sql_parser import parse_sql, SQLSyntaxError
 from .rtree import RTreeIndex
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 import pandas as pd
 import os
@@ -17,7 +17,11 @@ import csv
 app = FastAPI()
 isam = ISAM()
 btree = BTree()
-avl = AVLFile("data/avl_index.dat") 
+# índices secundarios sobre el B+ tree primario: columna -> SecondaryIndex
+secundarios = {
+    col: SecondaryIndex(col, btree) for col in SECONDARY_COLUMNS if os.path.exists(SecondaryIndex.path_for(col))
+}
+avl = AVLFile("data/avl_index.dat", "data/avl_data.dat")
 rtree = RTreeIndex()
 record_struct = struct.Struct('i10s10sffff')
 ext_hash = ExtendibleHashing("ext_hash.dat", record_struct)
@@ -30,6 +34,12 @@ tipo_columna = None  # int/float
 
 timing_log = []  # metricas
 
+
+@app.on_event("shutdown")
+def cerrar_indices():
+    # libspatialindex escribe su cabecera al cerrar; sin esto el próximo arranque reconstruye el R-tree
+    rtree.close()
+
 class RegistroRequest(BaseModel):
     id: int
     fecha: str
@@ -51,7 +61,7 @@ def search(key: int):
     response.append({
         "metodo": "ISAM",
         "tiempo": round(t1 - t0, 6),
-        "resultados": [r.__dict__ for r in isam_result]
+        "resultados": [r.to_dict() for r in isam_result]
     })
 
     # B+ Tree
@@ -61,7 +71,7 @@ def search(key: int):
     response.append({
         "metodo": "BTree",
         "tiempo": round(t1 - t0, 6),
-        "resultados": btree_result.__dict__ if btree_result else []
+        "resultados": btree_result.to_dict() if btree_result else []
     })
 
     t0 = time()
@@ -95,7 +105,7 @@ def search(key: int):
     return response
 
 @app.get("/range/{a}/{b}")
-def range_search(a: int, b: int):
+def range_search(a: int, b: int, limit: Optional[int] = Query(None), after_key: Optional[int] = Query(None)):
     response = []
 
     # ISAM
@@ -105,26 +115,28 @@ def range_search(a: int, b: int):
     response.append({
         "metodo": "ISAM",
         "tiempo": round(t1 - t0, 6),
-        "resultados": [r.__dict__ for r in isam_result]
+        "resultados": [r.to_dict() for r in isam_result]
     })
 
     # B+ Tree
     t0 = time()
-    btree_result = btree.range_search(a, b)
+    btree_result = list(btree.range_search(a, b))
     t1 = time()
     response.append({
         "metodo": "BTree",
         "tiempo": round(t1 - t0, 6),
-        "resultados": btree_result
+        "resultados": [r.to_dict() for r in btree_result]
     })
 
     t0 = time()
-    avl_result = avl.range_search(a, b)
+    avl_result = avl.range_search(a, b, limit=limit, after_key=after_key)
     t1 = time()
     response.append({
         "metodo": "AVL",
         "tiempo": round(t1 - t0, 6),
-        "resultados": avl_result
+        "resultados": avl_result,
+        # cursor para pedir la siguiente página con after_key
+        "siguiente": avl_result[-1]["id"] if limit and len(avl_result) == limit else None
     })
     return response
 
@@ -146,10 +158,96 @@ def range_search_area(
         "resultados": rtree_result
     }]
 
+@app.get("/nearest")
+def nearest_search(lat: float = Query(...), lon: float = Query(...), k: int = Query(10, ge=1)):
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango")
+
+    t0 = time()
+    rtree_result = rtree.nearest(lat, lon, k)
+    t1 = time()
+
+    return [{
+        "metodo": "RTree",
+        "tiempo": round(t1 - t0, 6),
+        "resultados": rtree_result
+    }]
+
+@app.get("/radius")
+def radius_search(lat: float = Query(...), lon: float = Query(...), km: float = Query(..., gt=0)):
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango")
+
+    t0 = time()
+    rtree_result = rtree.within_radius(lat, lon, km)
+    t1 = time()
+
+    return [{
+        "metodo": "RTree",
+        "tiempo": round(t1 - t0, 6),
+        "resultados": rtree_result
+    }]
+
+@app.get("/range_time")
+def range_time_search(
+    lon_min: float = Query(...), lat_min: float = Query(...),
+    lon_max: float = Query(...), lat_max: float = Query(...),
+    desde: str = Query(...), hasta: str = Query(...),
+    prof_min: Optional[float] = Query(None), prof_max: Optional[float] = Query(None)
+):
+    if not (-90 <= lat_min <= 90 and -90 <= lat_max <= 90 and -180 <= lon_min <= 180 and -180 <= lon_max <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango")
+
+    t0 = time()
+    rtree_result = rtree.range_time(lon_min, lat_min, lon_max, lat_max, desde, hasta, prof_min, prof_max)
+    t1 = time()
+
+    return [{
+        "metodo": "RTree",
+        "tiempo": round(t1 - t0, 6),
+        "resultados": rtree_result
+    }]
+
+@app.get("/heatmap")
+def heatmap(
+    lon_min: float = Query(...), lat_min: float = Query(...),
+    lon_max: float = Query(...), lat_max: float = Query(...),
+    zoom: Optional[int] = Query(None, ge=0)
+):
+    if not (-90 <= lat_min <= 90 and -90 <= lat_max <= 90 and -180 <= lon_min <= 180 and -180 <= lon_max <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango")
+
+    t0 = time()
+    celdas = rtree.heatmap(lon_min, lat_min, lon_max, lat_max, zoom)
+    t1 = time()
+
+    return [{
+        "metodo": "RTree",
+        "tiempo": round(t1 - t0, 6),
+        "zoom": celdas[0]["zoom"] if celdas else zoom,
+        "resultados": celdas
+    }]
+
+def claves_secundarias(r):
+    # se calculan antes de escribir el registro: un valor inválido (p. ej. una fecha mal
+    # formada) no puede dejar la fila en el primario sin sus entradas secundarias
+    try:
+        return {col: sec.key(r) for col, sec in secundarios.items()}
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, detail=f"Valor inválido para un índice secundario: {e}")
+
+
+def insertar_btree(r, claves):
+    offset = btree.add(r)
+    for col, sec in secundarios.items():
+        sec.add(r, offset, claves[col])
+
+
 @app.post("/insert")
 def insert(req: RegistroRequest):
     response = []
     r = Registro(req.id, req.fecha, req.tipo, req.lat, req.lon, req.mag, req.prof)
+    claves = claves_secundarias(r)
 
     t0 = time()
     isam.add(r)
@@ -161,7 +259,7 @@ def insert(req: RegistroRequest):
     })
 
     t0 = time()
-    btree.add(r)
+    insertar_btree(r, claves)
     t1 = time()
     response.append({
         "metodo": "BTree",
@@ -211,6 +309,16 @@ def insert(req: RegistroRequest):
 
 
 
+def eliminar_btree(id: int):
+    # los secundarios se indexan por los valores del registro: hay que leerlo antes de borrarlo
+    r = btree.search(id)
+    if r is None:
+        return False
+    for sec in secundarios.values():
+        sec.remove(r)
+    return btree.remove(id)
+
+
 @app.delete("/delete/{id}")
 def delete(id: int):
     response = []
@@ -225,7 +333,7 @@ def delete(id: int):
     })
 
     t0 = time()
-    btree.remove(id)
+    eliminar_btree(id)
     t1 = time()
     response.append({
         "metodo": "BTree",
@@ -265,16 +373,32 @@ def delete(id: int):
     return response
 
 
+@app.post("/isam/reorganize")
+def isam_reorganize():
+    t0 = time()
+    isam.reorganize()
+    t1 = time()
+    return {
+        "metodo": "ISAM",
+        "tiempo": round(t1 - t0, 6),
+        "resultado": f"{len(isam.index1_keys)} buckets primarios, cadena promedio {isam.chain_length():.2f}"
+    }
+
+
 @app.post("/sql")
 def run_sql(sql: str = Query(...)):
     global tabla_activa, indice_activo, columna_indice, tipo_columna
 
-    op = parse_sql(sql)
+    try:
+        op = parse_sql(sql)
+    except SQLSyntaxError as e:
+        raise HTTPException(400, detail=f"Error de sintaxis: {e}")
 
     #CREATE TABLE 
     if op[0] == "create":
         tabla_activa = op[1]
         campos = op[2]
+        opciones = op[3]
 
         indexed_fields = [f for f in campos if "index" in f]
         if not indexed_fields:
@@ -288,12 +412,20 @@ def run_sql(sql: str = Query(...)):
         if indice_activo not in ["isam", "btree", "avl", "hash", "rtree", "seq"]:
             raise HTTPException(400, detail=f"Índice no válido: {indice_activo}")
 
+        if indice_activo == "isam" and "page_size" in opciones:
+            isam.reset(page_size=opciones["page_size"])
+        elif indice_activo == "btree" and ("page_size" in opciones or "order" in opciones):
+            btree.reset(t=opciones.get("order"), page_size=opciones.get("page_size", BTREE_PAGE_SIZE))
+            for sec in secundarios.values():
+                sec.build()
+
         return {
             "message": f"Tabla '{tabla_activa}' creada.",
             "estructura": campos,
             "indexado_por": columna_indice,
             "tipo_indice": indice_activo,
-            "tipo_columna": tipo_columna
+            "tipo_columna": tipo_columna,
+            "opciones": opciones
         }
 
     # --- CREATE FROM CSV ---
@@ -302,59 +434,69 @@ def run_sql(sql: str = Query(...)):
         path = op[2]
         indice_activo = op[3]
         columna_indice = op[4]
+        opciones = op[5]
 
         tipo_columna = "float" if indice_activo == "rtree" else "int"  # ejemplo simple
 
         if indice_activo not in ["isam", "btree", "avl", "hash", "rtree", "seq"]:
             raise HTTPException(400, detail=f"Índice no válido: {indice_activo}")
 
-        # Cargar archivo CSV
+        # Cargar archivo CSV (ISAM lo lee por su cuenta con ordenamiento externo)
         registros = []
-        with open(path, newline='') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if indice_activo == "rtree":
-                    try:
-                        lat = float(row["lat"])
-                        lon = float(row["lon"])
-                        mag = float(row["mag"])
-                        prof = float(row["prof"])
-                    except (ValueError, TypeError):
-                        print(f"[WARN] Fila inválida ignorada: {row}")
-                        continue  # saltar esta fila
-
-                    rtree.insert(
-                        record_id=int(row["id"]),
-                        lat=lat,
-                        lon=lon,
-                        record_data={
+        puntos = []  # filas del R-tree: (id, lat, lon, datos)
+        if indice_activo == "rtree":
+            # la tabla espacial persiste entre reinicios: se reemplaza su contenido.
+            # WITH (dimension = 3) agrega la fecha al índice y dimension = 4 también la profundidad
+            try:
+                rtree.reset(dimension=opciones.get("dimension", 2))
+            except ValueError as e:
+                raise HTTPException(400, detail=str(e))
+        if indice_activo != "isam":
+            with open(path, newline='') as f:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    if indice_activo == "rtree":
+                        try:
+                            lat = float(row["lat"])
+                            lon = float(row["lon"])
+                            mag = float(row["mag"])
+                            prof = float(row["prof"])
+                        except (ValueError, TypeError):
+                            print(f"[WARN] Fila inválida ignorada: {row}")
+                            continue  # saltar esta fila
+
+                        puntos.append((int(row["id"]), lat, lon, {
                             "fecha": row["fecha"],
                             "tipo": row["tipo"],
                             "mag": mag,
                             "prof": prof
-                        }
-                    )
-                else:
-                    r = Registro(
-                        int(row["id"]),
-                        row["fecha"],
-                        row["tipo"],
-                        float(row["lat"]),
-                        float(row["lon"]),
-                        float(row["mag"]),
-                        float(row["prof"])
-                    )
-                    registros.append(r)
+                        }))
+                    else:
+                        r = Registro(
+                            int(row["id"]),
+                            row["fecha"],
+                            row["tipo"],
+                            float(row["lat"]),
+                            float(row["lon"]),
+                            float(row["mag"]),
+                            float(row["prof"])
+                        )
+                        registros.append(r)
 
         if indice_activo == "isam":
-            for r in registros:
-                isam.add(r)
+            if "page_size" in opciones:
+                isam.reset(page_size=opciones["page_size"])
+            isam.build_from_csv(path, memory_budget=opciones.get("memory_budget", MEMORY_BUDGET))
         elif indice_activo == "btree":
-            for r in registros:
-                btree.add(r)
+            if "page_size" in opciones or "order" in opciones:
+                btree.reset(t=opciones.get("order"), page_size=opciones.get("page_size", BTREE_PAGE_SIZE))
+            btree.bulk_load(registros)
+            for sec in secundarios.values():
+                sec.build()
+        elif indice_activo == "rtree":
+            rtree.bulk_load(puntos)
         elif indice_activo == "avl":
-            for r in registros:
-                avl.insert(r)
+            avl.bulk_load(registros)
         elif indice_activo == "hash":
             for r in registros:
                 ext_hash.insert(r)
@@ -369,17 +511,31 @@ def run_sql(sql: str = Query(...)):
     if not tabla_activa:
         raise HTTPException(400, detail="Debe ejecutar CREATE TABLE primero.")
 
+    # --- CREATE INDEX (secundario sobre el B+ tree) ---
+    if op[0] == "create_index":
+        columna = op[3]
+        if indice_activo != "btree":
+            raise HTTPException(400, detail="Los índices secundarios requieren una tabla con índice BTree.")
+        if columna not in SECONDARY_COLUMNS:
+            raise HTTPException(400, detail=f"Índice secundario no soportado para '{columna}'")
+        if columna not in secundarios:
+            secundarios[columna] = SecondaryIndex(columna, btree)
+        secundarios[columna].build()
+        return {"message": f"Índice secundario sobre '{columna}' creado.", "nombre": op[1] or f"idx_{columna}"}
+
     # --- SEARCH ---
     if op[0] == "search":
         campo, valor = op[1], op[2]
+        if campo != columna_indice and indice_activo == "btree" and campo in secundarios:
+            return {"result": [r.to_dict() for r in secundarios[campo].range_search(valor, valor)]}
         if campo != columna_indice:
             raise HTTPException(400, detail=f"Consulta solo válida para '{columna_indice}'")
 
         if indice_activo == "isam":
-            return {"result": [r.__dict__ for r in isam.search(int(valor))]}
+            return {"result": [r.to_dict() for r in isam.search(int(valor))]}
         elif indice_activo == "btree":
             r = btree.search(int(valor))
-            return {"result": r.__dict__ if r else []}
+            return {"result": r.to_dict() if r else []}
         elif indice_activo == "avl":
             return {"result": avl.search(int(valor))}
         elif indice_activo == "hash":
@@ -391,13 +547,15 @@ def run_sql(sql: str = Query(...)):
     # --- RANGE ---
     if op[0] == "range":
         campo, a, b = op[1], op[2], op[3]
+        if campo != columna_indice and indice_activo == "btree" and campo in secundarios:
+            return {"result": [r.to_dict() for r in secundarios[campo].range_search(a, b)]}
         if campo != columna_indice:
             raise HTTPException(400, detail=f"Consulta solo válida para '{columna_indice}'")
 
         if indice_activo == "isam":
-            return {"result": [r.__dict__ for r in isam.rangeSearch(int(a), int(b))]}
+            return {"result": [r.to_dict() for r in isam.rangeSearch(int(a), int(b))]}
         elif indice_activo == "btree":
-            return {"result": [r.__dict__ for r in btree.range_search(int(a), int(b))]}
+            return {"result": [r.to_dict() for r in btree.range_search(int(a), int(b))]}
         elif indice_activo == "hash":
             return {"result": [r.to_tuple() for r in ext_hash.find_range(int(a), int(b))]}
         elif indice_activo == "avl":
@@ -410,6 +568,26 @@ def run_sql(sql: str = Query(...)):
             raise HTTPException(400, detail="Consulta espacial solo permitida con índice RTree.")
         return {"result": rtree.rangeSearch(lon_min, lat_min, lon_max, lat_max)}
 
+    # --- RANGO ESPACIO-TEMPORAL PARA RTREE ---
+    if op[0] == "range3d":
+        if indice_activo != "rtree":
+            raise HTTPException(400, detail="Consulta espacial solo permitida con índice RTree.")
+        return {"result": rtree.range_time(*op[1:])}
+
+    # --- K VECINOS MÁS CERCANOS PARA RTREE ---
+    if op[0] == "nearest":
+        lat, lon, k = op[1:]
+        if indice_activo != "rtree":
+            raise HTTPException(400, detail="Consulta espacial solo permitida con índice RTree.")
+        return {"result": rtree.nearest(lat, lon, k)}
+
+    # --- RADIO ALREDEDOR DE UN PUNTO PARA RTREE ---
+    if op[0] == "within_radius":
+        lat, lon, km = op[1:]
+        if indice_activo != "rtree":
+            raise HTTPException(400, detail="Consulta espacial solo permitida con índice RTree.")
+        return {"result": rtree.within_radius(lat, lon, km)}
+
     # --- INSERT ---
     if op[0] == "insert":
         campos = op[1]
@@ -425,7 +603,7 @@ def run_sql(sql: str = Query(...)):
         if indice_activo == "isam":
             isam.add(r)
         elif indice_activo == "btree":
-            btree.add(r)
+            insertar_btree(r, claves_secundarias(r))
         elif indice_activo == "avl":
             avl.insert(r)
         elif indice_activo == "hash":
@@ -452,7 +630,7 @@ def run_sql(sql: str = Query(...)):
         if indice_activo == "isam":
             isam.remove(int(valor))
         elif indice_activo == "btree":
-            btree.remove(int(valor))
+            eliminar_btree(int(valor))
         elif indice_activo == "avl":
             avl.remove(int(valor))
         elif indice_activo == "hash":
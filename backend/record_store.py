@@ -0,0 +1,225 @@
+import os
+import struct
+import threading
+from itertools import compress
+from typing import Iterable, List, Optional
+
+from ISAM.isam import pread
+
+# vivo, id, lat, lon, fecha, tipo, mag, prof; lat/lon en double para poder borrar del R-tree
+# con las mismas coordenadas con las que se insertó
+RECORD = struct.Struct('=?idd10s10sff')
+SCAN = struct.Struct(f'=?idd{RECORD.size - 21}x')  # solo vivo, id, lat y lon
+SCAN_BATCH = 4096  # registros por lectura al recorrer el archivo
+
+
+class RecordStore:
+    """Registros de ancho fijo indexados por id, con actualización en el lugar.
+
+    En memoria solo se mantiene el mapa id -> offset y la lista de ranuras libres;
+    ambos se reconstruyen con una lectura secuencial al abrir el archivo, que también
+    calcula `bounds` (lon_min, lat_min, lon_max, lat_max) de los registros vivos.
+    Todos los accesos comparten un handle, así que cada posicionamiento y su lectura o
+    escritura van juntos bajo _lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = {}  # id -> offset en el archivo
+        self.free = []     # offsets de registros borrados, reutilizables
+        self.bounds = None
+        self.reads = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        open(path, 'ab').close()
+        self._lock = threading.RLock()
+        self.file = open(path, 'r+b')
+        self._scan()
+
+    def _scan(self):
+        size = RECORD.size
+        end = self.file.seek(0, os.SEEK_END)
+        if end % size:
+            self.file.truncate(end - end % size)  # escritura incompleta al final
+        lons, lats = [], []
+        for base, rows in self._iter_chunks():
+            live, ids, chunk_lats, chunk_lons = zip(*rows)
+            positions = range(base, base + len(ids) * size, size)
+            if not all(live):
+                self.free.extend(compress(positions, (not ok for ok in live)))
+                ids, positions = compress(ids, live), compress(positions, live)
+                chunk_lats, chunk_lons = list(compress(chunk_lats, live)), list(compress(chunk_lons, live))
+            self.offsets.update(zip(ids, positions))
+            if chunk_lats:
+                lats += (min(chunk_lats), max(chunk_lats))
+                lons += (min(chunk_lons), max(chunk_lons))
+        self.bounds = (min(lons), min(lats), max(lons), max(lats)) if lats else None
+
+    def _iter_chunks(self, layout: struct.Struct = SCAN):
+        # (offset del bloque, filas) leyendo SCAN_BATCH registros por vez; con SCAN cada fila
+        # es (vivo, id, lat, lon) y con RECORD el registro completo
+        base = 0
+        while True:
+            with self._lock:
+                self.file.seek(base)
+                chunk = self.file.read(RECORD.size * SCAN_BATCH)
+            if not chunk:
+                return
+            yield base, list(layout.iter_unpack(chunk))
+            base += len(chunk)
+
+    def points(self):
+        """Genera (id, lat, lon) de los registros vivos en orden físico."""
+        for _, rows in self._iter_chunks():
+            for live, record_id, lat, lon in rows:
+                if live:
+                    yield record_id, lat, lon
+
+    def records(self):
+        """Genera los registros vivos decodificados en orden físico."""
+        for _, rows in self._iter_chunks(RECORD):
+            for fields in rows:
+                if fields[0]:
+                    yield self._decode(fields)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, record_id: int):
+        return record_id in self.offsets
+
+    @staticmethod
+    def _pack(record_id: int, lat: float, lon: float, data: dict) -> bytes:
+        return RECORD.pack(
+            True, record_id, lat, lon,
+            str(data.get("fecha", "")).encode('utf-8')[:10],
+            str(data.get("tipo", "")).encode('utf-8')[:10],
+            data.get("mag", 0.0),
+            data.get("prof", 0.0)
+        )
+
+    @staticmethod
+    def _unpack(data, pos: int = 0) -> dict:
+        return RecordStore._decode(RECORD.unpack_from(data, pos))
+
+    @staticmethod
+    def _decode(fields: tuple) -> dict:
+        _, record_id, lat, lon, fecha, tipo, mag, prof = fields
+        return {
+            "id": record_id,
+            "lat": lat,
+            "lon": lon,
+            "fecha": fecha.decode('utf-8').strip('\x00'),
+            "tipo": tipo.decode('utf-8').strip('\x00'),
+            "mag": mag,
+            "prof": prof
+        }
+
+    def put(self, record_id: int, lat: float, lon: float, data: dict):
+        # un id existente se sobrescribe; uno nuevo ocupa una ranura libre o va al final
+        packed = self._pack(record_id, lat, lon, data)
+        with self._lock:
+            offset = self.offsets.get(record_id)
+            if offset is None:
+                offset = self.free.pop() if self.free else self.file.seek(0, os.SEEK_END)
+                self.offsets[record_id] = offset
+            self.file.seek(offset)
+            self.file.write(packed)
+            self.file.flush()
+
+    def put_many(self, rows: Iterable[tuple]):
+        """Escribe (id, lat, lon, datos) en bloque con un solo flush; los ids nuevos van al
+        final del archivo sin usar las ranuras libres y los repetidos se sobrescriben."""
+        with self._lock:
+            self._put_many(rows)
+
+    def _put_many(self, rows: Iterable[tuple]):
+        size = RECORD.size
+        base = self.file.seek(0, os.SEEK_END)  # inicio de lo que aún está en el buffer
+        pending = []
+        for record_id, lat, lon, data in rows:
+            packed = self._pack(record_id, lat, lon, data)
+            offset = self.offsets.get(record_id)
+            if offset is None:
+                self.offsets[record_id] = base + len(pending) * size
+                pending.append(packed)
+            elif offset >= base:
+                pending[(offset - base) // size] = packed
+            else:
+                self.file.seek(offset)
+                self.file.write(packed)
+            if len(pending) == SCAN_BATCH:
+                self.file.seek(base)
+                self.file.write(b''.join(pending))
+                base += len(pending) * size
+                pending.clear()
+        self.file.seek(base)
+        self.file.write(b''.join(pending))
+        self.file.flush()
+
+    def get(self, record_id: int) -> Optional[dict]:
+        with self._lock:
+            offset = self.offsets.get(record_id)
+            if offset is None:
+                return None
+            self.file.seek(offset)
+            self.reads += 1
+            data = self.file.read(RECORD.size)
+        return self._unpack(data)
+
+    def _read_runs(self, offsets: List[int]):
+        # (offset inicial, bytes) por cada tramo contiguo de `offsets` ordenados
+        size = RECORD.size
+        i = 0
+        while i < len(offsets):
+            j = i + 1
+            while j < len(offsets) and offsets[j] == offsets[j - 1] + size:
+                j += 1
+            self.reads += 1
+            yield offsets[i], pread(self.file, size * (j - i), offsets[i], self._lock)
+            i = j
+
+    def get_many(self, ids: Iterable[int]) -> List[dict]:
+        """Lee los registros de `ids` (los desconocidos se omiten) en tramos contiguos."""
+        with self._lock:
+            wanted = [self.offsets[i] for i in ids if i in self.offsets]
+            runs = list(self._read_runs(sorted(wanted)))
+        size = RECORD.size
+        decoded = {}
+        for start, data in runs:
+            for pos in range(0, len(data), size):
+                decoded[start + pos] = self._unpack(data, pos)
+        return [decoded[offset] for offset in wanted]
+
+    def read_raw(self, ids: Iterable[int]) -> bytes:
+        """Bytes de los registros vivos de `ids`, sin decodificar y en orden físico."""
+        with self._lock:
+            offsets = sorted({self.offsets[i] for i in ids if i in self.offsets})
+            return b''.join(data for _, data in self._read_runs(offsets))
+
+    def delete(self, record_id: int) -> Optional[dict]:
+        """Marca el registro como libre y lo devuelve (None si no existía)."""
+        with self._lock:
+            record = self.get(record_id)
+            if record is None:
+                return None
+            offset = self.offsets.pop(record_id)
+            self.file.seek(offset)
+            self.file.write(b'\x00')
+            self.file.flush()
+            self.free.append(offset)
+            return record
+
+    def clear(self):
+        with self._lock:
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.flush()
+            self.offsets.clear()
+            self.free.clear()
+            self.bounds = None
+
+    def close(self):
+        with self._lock:
+            if not self.file.closed:
+                self.file.close()
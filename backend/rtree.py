@@ -1,56 +1,272 @@
 from rtree import index
-import json
+from rtree.exceptions import RTreeError
+import numpy as np
 import os
+import threading
+from math import inf
+from ISAM.isam import fecha_epoch
+from .record_store import RecordStore, RECORD
+from .geo import EARTH_RADIUS_KM, bounding_boxes, haversine_km
+from .heatmap import GridAggregates
+
+# 2: (lon, lat); 3: + fecha en segundos epoch; 4: + profundidad
+DIMENSIONS = (2, 3, 4)
+BOUNDS_TOLERANCE = 1e-9
+NEAREST_SLACK_KM = 1e-6  # margen para no perder por redondeo un punto justo en el borde
+
+# mismo diseño empaquetado que RECORD (49 bytes), para leer los candidatos sin
+# decodificarlos fila por fila
+RECORD_DTYPE = np.dtype([
+    ("vivo", "?"), ("id", "=i4"), ("lat", "=f8"), ("lon", "=f8"),
+    ("fecha", "S10"), ("tipo", "S10"), ("mag", "=f4"), ("prof", "=f4")
+])
+
+
+def haversine_np(lat: float, lon: float, lats, lons):
+    """Distancias en km desde (lat, lon) a cada punto de los arreglos `lats`, `lons`."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def refine_radius(raw: bytes, lat: float, lon: float, km: float):
+    """Filtra registros empaquetados a los que están a `km` o menos; devuelve (filas, distancias)
+    ordenadas por distancia."""
+    rows = np.frombuffer(raw, dtype=RECORD_DTYPE)
+    dist = haversine_np(lat, lon, rows["lat"], rows["lon"])
+    keep = np.flatnonzero(dist <= km)
+    order = keep[np.argsort(dist[keep], kind="stable")]
+    return rows[order], dist[order]
+
 
 class RTreeIndex:
-    def __init__(self, name="data/rtree_index"):
+    def __init__(self, name="data/rtree_index", dimension=None):
+        """`dimension` None reabre el índice con la que tenga guardada (2 si no existe)."""
         self.name = name
-        self._delete_existing_index_files()
-        self.data_file = f"{name}.json"
+        self.data_file = f"{name}.rec"
+        self.data = RecordStore(self.data_file)
+        self.dimension = self._check_dimension(dimension or 2)
+
+        # el índice en disco se reabre tal cual; solo se reconstruye desde los registros si está dañado
+        try:
+            self.idx = self._open_index()
+            guardada = len(self.idx.bounds) // 2  # libspatialindex guarda la dimensión en su cabecera
+            if dimension is None and guardada != self.dimension:
+                self.idx.close()
+                self.dimension = self._check_dimension(guardada)
+                self.idx = self._open_index()
+            consistente = guardada == self.dimension and self._is_consistent()
+        except RTreeError as e:
+            print(f"[WARN] No se pudo abrir {self.name}.idx/.dat: {e}")
+            self.idx, consistente = None, False
+        if not consistente:
+            print(f"[INFO] Reconstruyendo el R-tree {self.name} desde {self.data_file}")
+            self._rebuild()
+
+        # agregados por celda para el heatmap; se arman desde los registros en una pasada recién
+        # con el primer pedido, así reabrir la tabla no recorre todo el archivo de registros
+        self._grid = None
+        self._grid_lock = threading.Lock()
+
+    @staticmethod
+    def _check_dimension(dimension: int) -> int:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimensión de R-tree no soportada: {dimension}")
+        return dimension
+
+    def _properties(self):
         p = index.Property()
-        p.dimension = 2
+        p.dimension = self.dimension
         p.storage = index.RT_Disk
         p.dat_extension = 'dat'
         p.idx_extension = 'idx'
-        self.idx = index.Index(name, properties=p, interleaved=True)
+        p.overwrite = False
+        return p
 
-        if os.path.exists(self.data_file):
-            with open(self.data_file) as f:
-                self.data = json.load(f)
-        else:
-            self.data = {}
+    def _open_index(self, stream=None):
+        if stream is None:
+            return index.Index(self.name, properties=self._properties(), interleaved=True)
+        # carga por stream: libspatialindex empaqueta los nodos con STR en una sola pasada
+        return index.Index(self.name, stream, properties=self._properties(), interleaved=True)
+
+    @staticmethod
+    def _epoch(fecha) -> float:
+        # misma fecha truncada que guarda el registro; sin fecha válida se ubica en el epoch 0
+        try:
+            return float(fecha_epoch(str(fecha)[:10]))
+        except ValueError:
+            return 0.0
+
+    def _point(self, lat: float, lon: float, fecha="", prof: float = 0.0):
+        # prof con la precisión float32 del registro, para poder borrar con las mismas coordenadas
+        coords = (lon, lat)
+        if self.dimension > 2:
+            coords += (self._epoch(fecha),)
+        if self.dimension > 3:
+            coords += (float(np.float32(prof)),)
+        return coords + coords  # (mínimos..., máximos...)
+
+    def _box(self, caja, *rangos):
+        # caja (lon_min, lat_min, lon_max, lat_max) más los rangos (min, max) de tiempo y
+        # profundidad; las dimensiones sin rango quedan sin límite
+        rangos = (list(rangos) + [(-inf, inf)] * 2)[:self.dimension - 2]
+        return (caja[0], caja[1], *(lo for lo, _ in rangos), caja[2], caja[3], *(hi for _, hi in rangos))
+
+    def _is_consistent(self):
+        # misma cantidad de puntos y mismos límites lon/lat que los registros vivos
+        bounds = self.data.bounds
+        idx_bounds = self.idx.bounds
+        d = self.dimension
+        idx_bounds = (idx_bounds[0], idx_bounds[1], idx_bounds[d], idx_bounds[d + 1])
+        if bounds is None:
+            return idx_bounds[0] > idx_bounds[2]  # índice vacío
+        if any(abs(a - b) > BOUNDS_TOLERANCE for a, b in zip(idx_bounds, bounds)):
+            return False
+        return self.idx.count(self._box(bounds)) == len(self.data)
 
-    def _delete_existing_index_files(self):
-        """Elimina archivos corruptos si ya existen"""
-        for ext in [".dat", ".idx",".json"]:
+    def _delete_index_files(self):
+        for ext in [".dat", ".idx"]:
             filepath = f"{self.name}{ext}"
             if os.path.exists(filepath):
-                print(f"[INFO] Eliminando archivo corrupto: {filepath}")
                 os.remove(filepath)
 
+    def _rebuild(self):
+        if self.idx is not None:
+            self.idx.close()
+        self._delete_index_files()
+        if len(self.data) == 0:
+            self.idx = self._open_index()  # el stream vacío no se acepta
+            return
+        if self.dimension == 2:
+            stream = ((record_id, (lon, lat, lon, lat), None) for record_id, lat, lon in self.data.points())
+        else:
+            stream = (
+                (r["id"], self._point(r["lat"], r["lon"], r["fecha"], r["prof"]), None)
+                for r in self.data.records()
+            )
+        self.idx = self._open_index(stream)
+
+    @property
+    def grid(self) -> GridAggregates:
+        with self._grid_lock:
+            if self._grid is None:
+                grid = GridAggregates(recompute=self._cell_events)
+                rows = np.fromfile(self.data_file, dtype=RECORD_DTYPE)
+                rows = rows[rows["vivo"]]
+                grid.build(rows["lat"], rows["lon"], rows["mag"])
+                self._grid = grid
+            return self._grid
+
+    def _cell_events(self, lon_min, lat_min, lon_max, lat_max):
+        return [(r["lat"], r["lon"], r["mag"]) for r in self.rangeSearch(lon_min, lat_min, lon_max, lat_max)]
+
+    def bulk_load(self, rows):
+        """Carga (id, lat, lon, datos) en bloque: los registros se escriben en una pasada y
+        el índice y el heatmap se reconstruyen a partir de todos los registros vivos."""
+        self.data.put_many(rows)
+        self._rebuild()
+        self._grid = None
+
+    def reset(self, dimension=None):
+        """Vacía la tabla espacial (índice y registros), opcionalmente cambiando la dimensión."""
+        if dimension is not None:
+            dimension = self._check_dimension(dimension)
+        self.data.clear()
+        self.idx.close()
+        self.dimension = dimension or self.dimension
+        self._grid = None
+        self._delete_index_files()
+        self.idx = self._open_index()
+
+    def close(self):
+        self.idx.close()
+        self.data.close()
+
     def insert(self, record_id: int, lat: float, lon: float, record_data: dict):
-        self.idx.insert(record_id, (lon, lat, lon, lat))  # (x_min, y_min, x_max, y_max)
-        self.data[str(record_id)] = {
-            "lat": lat,
-            "lon": lon,
-            **record_data
-        }
-        with open(self.data_file, "w") as f:
-            json.dump(self.data, f, indent=2)
+        previo = self.data.get(record_id)
+        if previo is not None:
+            # reinsertar un id lo mueve: se quita la entrada espacial anterior
+            self.idx.delete(record_id, self._point(previo["lat"], previo["lon"], previo["fecha"], previo["prof"]))
+            if self._grid is not None:
+                self._grid.remove(previo["lat"], previo["lon"], previo["mag"])
+        self.idx.insert(record_id, self._point(lat, lon, record_data.get("fecha", ""), record_data.get("prof", 0.0)))
+        self.data.put(record_id, lat, lon, record_data)
+        if self._grid is not None:  # sin armar todavía: lo verá al leer los registros
+            self._grid.add(lat, lon, record_data.get("mag", 0.0))
 
     def search_by_id(self, record_id: int):
-        return self.data.get(str(record_id), None)
+        return self.data.get(record_id)
 
     def rangeSearch(self, lon_min: float, lat_min: float, lon_max: float, lat_max: float):
-        results = self.idx.intersection((lon_min, lat_min, lon_max, lat_max))
-        return [self.data[str(i)] for i in results if str(i) in self.data]
+        results = self.idx.intersection(self._box((lon_min, lat_min, lon_max, lat_max)))
+        return self.data.get_many(results)
+
+    def range_time(self, lon_min: float, lat_min: float, lon_max: float, lat_max: float,
+                   desde: str, hasta: str, prof_min: float = None, prof_max: float = None):
+        """Eventos de la caja con fecha entre `desde` y `hasta` ('YYYY-MM-DD', inclusive) y,
+        opcionalmente, profundidad entre `prof_min` y `prof_max`.
+
+        Las dimensiones que guarda el índice se resuelven en el R-tree; las demás se filtran
+        sobre los registros leídos.
+        """
+        t = (self._epoch(desde), self._epoch(hasta))
+        prof = (-inf if prof_min is None else prof_min, inf if prof_max is None else prof_max)
+        ids = self.idx.intersection(self._box((lon_min, lat_min, lon_max, lat_max), t, prof))
+        records = self.data.get_many(ids)
+        if self.dimension < 3:
+            records = [r for r in records if t[0] <= self._epoch(r["fecha"]) <= t[1]]
+        if self.dimension < 4 and (prof_min is not None or prof_max is not None):
+            records = [r for r in records if prof[0] <= r["prof"] <= prof[1]]
+        return records
+
+    def nearest(self, lat: float, lon: float, k: int = 1):
+        """Los k eventos más cercanos por distancia de gran círculo, con `distancia_km`."""
+        if k <= 0:
+            return []
+        # el recorrido best-first del R-tree da k candidatos en el plano lon/lat; la mayor de
+        # sus distancias reales acota el círculo donde están los k vecinos verdaderos
+        candidatos = self.idx.nearest(self._box((lon, lat, lon, lat)), k, objects=True)
+        radio = sorted(haversine_km(lat, lon, c.bbox[1], c.bbox[0]) for c in candidatos)[:k]
+        if not radio:
+            return []
+
+        distancias = {}
+        for caja in bounding_boxes(lat, lon, radio[-1] + NEAREST_SLACK_KM):
+            for item in self.idx.intersection(self._box(caja), objects=True):
+                distancias[item.id] = haversine_km(lat, lon, item.bbox[1], item.bbox[0])
+        vecinos = sorted(distancias, key=lambda i: (distancias[i], i))[:k]
+
+        records = self.data.get_many(vecinos)
+        for record in records:
+            record["distancia_km"] = distancias[record["id"]]
+        return records
+
+    def within_radius(self, lat: float, lon: float, km: float):
+        """Eventos a `km` o menos de (lat, lon) por distancia de gran círculo, del más cercano
+        al más lejano y con `distancia_km`."""
+        candidatos = []
+        for caja in bounding_boxes(lat, lon, km):
+            candidatos.extend(self.idx.intersection(self._box(caja)))
+        rows, dist = refine_radius(self.data.read_raw(candidatos), lat, lon, km)
+        raw = rows.tobytes()
+        results = []
+        for i, d in enumerate(dist.tolist()):
+            record = RecordStore._unpack(raw, i * RECORD.size)
+            record["distancia_km"] = d
+            results.append(record)
+        return results
+
+    def heatmap(self, lon_min: float, lat_min: float, lon_max: float, lat_max: float, zoom: int = None):
+        """Cantidad y magnitud máxima/promedio por celda de la vista (ver GridAggregates.query).
+
+        El primer pedido arma los agregados desde los registros."""
+        return self.grid.query(lon_min, lat_min, lon_max, lat_max, zoom)
 
     def remove(self, record_id: int):
-        if str(record_id) not in self.data:
+        record = self.data.delete(record_id)
+        if record is None:
             return
-        lat = self.data[str(record_id)]["lat"]
-        lon = self.data[str(record_id)]["lon"]
-        self.idx.delete(record_id, (lat, lon, lat, lon))
-        del self.data[str(record_id)]
-        with open(self.data_file, "w") as f:
-            json.dump(self.data, f, indent=2)
+        self.idx.delete(record_id, self._point(record["lat"], record["lon"], record["fecha"], record["prof"]))
+        if self._grid is not None:
+            self._grid.remove(record["lat"], record["lon"], record["mag"])
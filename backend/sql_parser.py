@@ -1,86 +1,688 @@
+import os
 import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional, Union
 
-def parse_sql(sql: str):
-    sql = sql.strip().rstrip(';')
-
-    # --- NUEVO: RANGO ESPACIAL 2D PARA RTREE ---
-    match = re.search(
-        r'is_in_range2d\s*\(\s*lat_min\s*=>\s*([-\d\.]+)\s*,\s*lat_max\s*=>\s*([-\d\.]+)\s*,\s*lon_min\s*=>\s*([-\d\.]+)\s*,\s*lon_max\s*=>\s*([-\d\.]+)\s*\)',
-        sql,
-        re.IGNORECASE
-    )
-    if match:
-        lat_min = float(match.group(1))
-        lat_max = float(match.group(2))
-        lon_min = float(match.group(3))
-        lon_max = float(match.group(4))
-        return ("range2d", lon_min, lat_min, lon_max, lat_max)
-
-    # --- NUEVO: CREATE TABLE FROM "archivo.csv" USING index("columna") ---
-    match = re.match(
-        r'create table\s+(\w+)\s+from\s+"(.+?)"\s+using\s+(\w+)\("(\w+)"\)',
-        sql,
-        re.IGNORECASE
-    )
-    if match:
-        table_name = match.group(1)
-        csv_path = match.group(2)
-        index_type = match.group(3).lower()
-        indexed_column = match.group(4).lower()
-        return ("create_from_csv", table_name, csv_path, index_type, indexed_column)
-
-    # --- CREATE TABLE tradicional ---
-    if sql.lower().startswith("create table"):
-        match = re.match(r'create table\s+(\w+)\s*\((.+)\)', sql, re.IGNORECASE | re.DOTALL)
-        if match:
-            table_name = match.group(1)
-            fields_block = match.group(2)
-
-            fields_raw = [f.strip() for f in fields_block.split(',')]
-            fields = []
-
-            for field in fields_raw:
-                f_match = re.match(
-                    r'(\w+)\s+(\w+|\w+\[\w+\])(?:\s+PRIMARY\s+KEY)?(?:\s+INDEX\s+(\w+))?',
-                    field,
-                    re.IGNORECASE
-                )
-                if f_match:
-                    field_dict = {
-                        "name": f_match.group(1),
-                        "type": f_match.group(2).upper()
-                    }
-                    if "PRIMARY KEY" in field.upper():
-                        field_dict["primary"] = True
-                    if f_match.group(3):
-                        field_dict["index"] = f_match.group(3).upper()
-                    fields.append(field_dict)
-
-            return ("create", table_name, fields)
-
-    # --- RANGE QUERY ---
-    if "between" in sql.lower():
-        match = re.search(r'where\s+(\w+)\s+between\s+([\d\.-]+)\s+and\s+([\d\.-]+)', sql, re.IGNORECASE)
-        if match:
-            return ("range", match.group(1), float(match.group(2)), float(match.group(3)))
-
-    # --- SELECT WHERE = ---
-    if sql.lower().startswith("select"):
-        match = re.search(r'where\s+(\w+)\s*=\s*([\d\.-]+)', sql, re.IGNORECASE)
-        if match:
-            return ("search", match.group(1), float(match.group(2)))
-
-    # --- INSERT INTO ---
-    if sql.lower().startswith("insert into"):
-        match = re.search(r'values\s*\((.+)\)', sql, re.IGNORECASE)
-        if match:
-            campos = [x.strip().strip("'").strip('"') for x in match.group(1).split(',')]
-            return ("insert", campos)
-
-    # --- DELETE ---
-    if sql.lower().startswith("delete"):
-        match = re.search(r'where\s+(\w+)\s*=\s*([\d\.-]+)', sql, re.IGNORECASE)
-        if match:
-            return ("delete", match.group(1), float(match.group(2)))
-
-    return ("unknown",)
+CACHE_SIZE = 256  # sentencias preparadas en el cache LRU
+SHAPE_PREFIX = 16  # caracteres iniciales con los que se buscan las formas textuales del cache
+
+
+class SQLSyntaxError(ValueError):
+    """Error de sintaxis con la posición (0-based) en la sentencia original."""
+
+    def __init__(self, message: str, sql: str, pos: int):
+        self.pos = pos
+        self.line = sql.count('\n', 0, pos) + 1
+        self.column = pos - (sql.rfind('\n', 0, pos) + 1) + 1
+        super().__init__(f"{message} (línea {self.line}, columna {self.column})")
+
+
+# --- AST ---
+
+@dataclass
+class Param:
+    index: int  # posición del literal en la sentencia; se reemplaza por su valor al enlazar
+
+
+Literal = Union[int, float, str, Param]
+
+
+@dataclass
+class ColumnDef:
+    name: str
+    type: str
+    primary: bool = False
+    index: Optional[str] = None
+
+
+@dataclass
+class CreateTable:
+    table: str
+    columns: List[ColumnDef]
+    options: Dict[str, Literal] = field(default_factory=dict)
+
+
+@dataclass
+class CreateFromCsv:
+    table: str
+    path: str
+    index: str
+    column: str
+    options: Dict[str, Literal] = field(default_factory=dict)
+
+
+@dataclass
+class CreateIndex:
+    name: Optional[str]
+    table: str
+    column: str
+
+
+@dataclass
+class Compare:
+    column: str
+    value: Literal
+
+
+@dataclass
+class Between:
+    column: str
+    low: Literal
+    high: Literal
+
+
+@dataclass
+class SpatialCall:
+    function: str
+    args: Dict[str, Literal]
+
+
+@dataclass
+class Select:
+    table: str
+    columns: List[str]
+    where: Union[Compare, Between, SpatialCall]
+
+
+@dataclass
+class Insert:
+    table: str
+    columns: List[str]
+    values: List[Literal]
+
+
+@dataclass
+class Delete:
+    table: str
+    where: Compare
+
+
+Statement = Union[CreateTable, CreateFromCsv, CreateIndex, Select, Insert, Delete]
+
+# predicados espaciales: función -> (argumentos obligatorios, opcionales, argumentos de texto)
+SPATIAL_FUNCTIONS = {
+    "is_in_range2d": (("lat_min", "lat_max", "lon_min", "lon_max"), (), ()),
+    "is_in_range3d": (("lat_min", "lat_max", "lon_min", "lon_max", "desde", "hasta"),
+                      ("prof_min", "prof_max"), ("desde", "hasta")),
+    "nearest": (("lat", "lon", "k"), (), ()),
+    "within_radius": (("lat", "lon", "km"), (), ()),
+}
+
+
+# --- lexer ---
+
+class Token:
+    __slots__ = ('kind', 'text', 'pos', 'param')
+
+    def __init__(self, kind: str, text: str, pos: int, param: int = -1):
+        self.kind = kind    # number, string, date, quoted, ident, arrow, symbol, eof
+        self.text = text
+        self.pos = pos
+        self.param = param  # índice del literal (number/string/date) o -1
+
+
+# fecha sin comillas ('YYYY-MM-DD' o ISO 8601 con hora), como la aceptaba el parser anterior en VALUES
+DATE = r"\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:\d{2})?)?(?![\w.])"
+NUMBER = r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+STRING = r"'(?:[^']|'')*'"
+
+TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<date>""" + DATE + r""")
+  | (?P<number>""" + NUMBER + r""")
+  | (?P<string>""" + STRING + r""")
+  | (?P<quoted>"[^"]*")
+  | (?P<ident>[A-Za-z_]\w*)
+  | (?P<arrow>=>)
+  | (?P<symbol>[(),;=*\[\]])
+""", re.VERBOSE)
+
+# literales (cadenas, fechas sin comillas y números) y nombres entre comillas dobles; un número pegado a una
+# palabra (t1, is_in_range2d) es parte del identificador y no un literal
+LITERALS = re.compile(
+    r"""(?=['"\d.-])(?:(""" + STRING + r""")|("[^"]*")|(?<![\w.])(""" + DATE + r""")"""
+    r"""|(?<![\w.])(""" + NUMBER + r"""))"""
+)
+
+
+def _literal(kind: str, text: str):
+    if kind == "number":
+        return int(text) if text.lstrip('-').isdigit() else float(text)
+    if kind == "string":
+        return text[1:-1].replace("''", "'")
+    return text
+
+
+def tokenize(sql: str) -> List[Token]:
+    tokens = []
+    params = 0
+    pos = 0
+    while pos < len(sql):
+        match = TOKEN.match(sql, pos)
+        if match is None:
+            if sql[pos] in "'\"":
+                raise SQLSyntaxError("Cadena sin cerrar", sql, pos)
+            raise SQLSyntaxError(f"Carácter inesperado {sql[pos]!r}", sql, pos)
+        kind = match.lastgroup
+        if kind != "ws":
+            if kind in ("number", "string", "date"):
+                tokens.append(Token(kind, match.group(), pos, params))
+                params += 1
+            else:
+                tokens.append(Token(kind, match.group(), pos))
+        pos = match.end()
+    tokens.append(Token("eof", "", len(sql)))
+    return tokens
+
+
+def normalize(sql: str):
+    """(clave, valores de los literales) de la sentencia, sin tokenizar ni parsear; la clave
+    es la sentencia con los espacios colapsados, cada número reemplazado por ? y cada cadena
+    o fecha sin comillas por '?'."""
+    parts = LITERALS.split(sql.strip().rstrip(';'))
+    params = []
+    for i in range(0, len(parts) - 1, 5):
+        parts[i] = " ".join(parts[i].split())
+        if parts[i + 1] is not None:
+            params.append(parts[i + 1][1:-1].replace("''", "'"))
+            parts[i + 1] = " '?' "
+        elif parts[i + 3] is not None:
+            params.append(parts[i + 3])
+            parts[i + 3] = " '?' "
+        elif parts[i + 4] is not None:
+            params.append(_literal("number", parts[i + 4]))
+            parts[i + 4] = " ? "
+    parts[-1] = " ".join(parts[-1].split())
+    return "".join(filter(None, parts)), params
+
+
+class Shape:
+    """Texto exacto de una sentencia preparada con un grupo por literal.
+
+    Cada grupo toma lo mismo que el lexer (la regex del literal dentro de un lookahead y una
+    referencia, sin backtracking, y un número no puede empezar una fecha), así que una
+    sentencia que calza tokeniza igual que la original y usa su mismo plan sin normalizarla.
+    """
+    __slots__ = ('key', 'prefix', 'kinds', 'texts')
+
+    SLOTS = {"date": DATE, "number": "(?!" + DATE + ")" + NUMBER, "string": STRING}
+
+    def __init__(self, key: str, sql: str, tokens: List[Token]):
+        self.key = key
+        self.prefix = sql[:SHAPE_PREFIX]
+        self.kinds = []
+        self.texts = []  # texto entre literales
+        end = 0
+        for token in tokens:
+            if token.param >= 0:
+                self.kinds.append(token.kind)
+                self.texts.append(sql[end:token.pos])
+                end = token.pos + len(token.text)
+        self.texts.append(sql[end:])
+
+    def source(self, skip: int, first: int) -> str:
+        # regex de la forma sin sus primeros `skip` caracteres, con grupos numerados desde `first`
+        parts = [re.escape(self.texts[0][skip:])]
+        for i, kind in enumerate(self.kinds):
+            parts.append(f"(?=({self.SLOTS[kind]}))\\{first + i}")
+            parts.append(re.escape(self.texts[i + 1]))
+        return "".join(parts)
+
+    @staticmethod
+    def combine(shapes) -> tuple:
+        """(fullmatch, dueños) de una regex que prueba todas las formas en una llamada, desde
+        SHAPE_PREFIX; el texto que comparten antes del primer literal se compara una sola vez.
+        Cada alternativa termina en un grupo vacío y dueños lleva su número a (forma, primer grupo)."""
+        common = os.path.commonprefix([shape.texts[0] for shape in shapes])
+        sources, owners = [], {}
+        group = 1
+        for shape in shapes:
+            sources.append(shape.source(len(common), group) + "()")
+            owners[group + len(shape.kinds)] = (shape, group - 1)
+            group += len(shape.kinds) + 1
+        return re.compile(re.escape(common[SHAPE_PREFIX:]) + "(?:" + "|".join(sources) + ")").fullmatch, owners
+
+
+# --- parser ---
+
+class Parser:
+    """Descenso recursivo sobre los tokens de una sentencia; los literales quedan como Param."""
+
+    def __init__(self, sql: str, tokens: List[Token]):
+        self.sql = sql
+        self.tokens = tokens
+        self.i = 0
+
+    # utilidades
+
+    @property
+    def current(self) -> Token:
+        return self.tokens[self.i]
+
+    def error(self, expected: str, token: Token = None):
+        token = token or self.current
+        found = "el final de la sentencia" if token.kind == "eof" else repr(token.text)
+        raise SQLSyntaxError(f"Se esperaba {expected} pero se encontró {found}", self.sql, token.pos)
+
+    def advance(self) -> Token:
+        token = self.current
+        self.i += 1
+        return token
+
+    def at_keyword(self, *words) -> bool:
+        token = self.current
+        return token.kind == "ident" and token.text.upper() in words
+
+    def accept_keyword(self, word: str) -> bool:
+        if self.at_keyword(word):
+            self.i += 1
+            return True
+        return False
+
+    def keyword(self, word: str):
+        if not self.accept_keyword(word):
+            self.error(word)
+
+    def at_symbol(self, symbol: str) -> bool:
+        return self.current.kind == "symbol" and self.current.text == symbol
+
+    def accept_symbol(self, symbol: str) -> bool:
+        if self.at_symbol(symbol):
+            self.i += 1
+            return True
+        return False
+
+    def symbol(self, symbol: str):
+        if not self.accept_symbol(symbol):
+            self.error(f"'{symbol}'")
+
+    def ident(self, what: str = "un identificador") -> str:
+        if self.current.kind != "ident":
+            self.error(what)
+        return self.advance().text
+
+    def name(self, what: str) -> str:
+        # identificador simple o entre comillas dobles
+        if self.current.kind == "quoted":
+            return self.advance().text[1:-1]
+        return self.ident(what)
+
+    def literal(self, kinds=("number", "string", "date"), what: str = "un valor") -> Param:
+        if self.current.kind not in kinds:
+            self.error(what)
+        return Param(self.advance().param)
+
+    # sentencias
+
+    def statement(self) -> Statement:
+        if self.accept_keyword("CREATE"):
+            stmt = self.create()
+        elif self.accept_keyword("SELECT"):
+            stmt = self.select()
+        elif self.accept_keyword("INSERT"):
+            stmt = self.insert()
+        elif self.accept_keyword("DELETE"):
+            stmt = self.delete()
+        else:
+            self.error("CREATE, SELECT, INSERT o DELETE")
+        self.accept_symbol(";")
+        if self.current.kind != "eof":
+            self.error("el final de la sentencia")
+        return stmt
+
+    def create(self) -> Statement:
+        if self.accept_keyword("INDEX"):
+            return self.create_index()
+        self.keyword("TABLE")
+        table = self.ident("el nombre de la tabla")
+        if self.accept_keyword("FROM"):
+            # CREATE TABLE t FROM "archivo.csv" USING indice("columna") [WITH (...)]
+            if self.current.kind != "quoted":
+                self.error('la ruta del CSV entre comillas dobles')
+            path = self.advance().text[1:-1]
+            self.keyword("USING")
+            index = self.ident("el tipo de índice")
+            self.symbol("(")
+            column = self.name("la columna indexada")
+            self.symbol(")")
+            return CreateFromCsv(table, path, index, column, self.options())
+
+        # CREATE TABLE t (col tipo [PRIMARY KEY] [INDEX tipo], ...) [WITH (...)]
+        self.symbol("(")
+        columns = [self.column_def()]
+        while self.accept_symbol(","):
+            columns.append(self.column_def())
+        self.symbol(")")
+        return CreateTable(table, columns, self.options())
+
+    def column_def(self) -> ColumnDef:
+        name = self.ident("el nombre de la columna")
+        type_name = self.ident("el tipo de la columna")
+        if self.accept_symbol("["):  # ARRAY[FLOAT]
+            type_name += f"[{self.ident('el tipo de los elementos')}]"
+            self.symbol("]")
+        elif self.accept_symbol("("):  # VARCHAR(20)
+            if self.current.kind != "number":
+                self.error("el tamaño del tipo")
+            type_name += f"({self.advance().text})"
+            self.symbol(")")
+        column = ColumnDef(name, type_name)
+        if self.accept_keyword("PRIMARY"):
+            self.keyword("KEY")
+            column.primary = True
+        if self.accept_keyword("INDEX"):
+            column.index = self.ident("el tipo de índice")
+        return column
+
+    def options(self) -> Dict[str, Param]:
+        # WITH (page_size = 16384, memory_budget = 67108864, order = 64); paréntesis opcionales
+        options = {}
+        if not self.accept_keyword("WITH"):
+            return options
+        parens = self.accept_symbol("(")
+        while True:
+            key = self.ident("el nombre de la opción").lower()
+            self.symbol("=")
+            if not self.current.text.lstrip('-').isdigit():
+                self.error("un entero")
+            options[key] = self.literal(("number",), "un entero")
+            if not self.accept_symbol(","):
+                break
+        if parens:
+            self.symbol(")")
+        return options
+
+    def create_index(self) -> CreateIndex:
+        # CREATE INDEX [nombre] ON tabla [USING btree] (columna)
+        name = None
+        if not self.at_keyword("ON"):
+            name = self.ident("el nombre del índice o ON")
+        self.keyword("ON")
+        table = self.ident("el nombre de la tabla")
+        if self.accept_keyword("USING"):
+            token = self.current
+            if self.ident("el tipo de índice").lower() != "btree":
+                raise SQLSyntaxError("Solo se soportan índices secundarios btree", self.sql, token.pos)
+        self.symbol("(")
+        column = self.name("la columna")
+        self.symbol(")")
+        return CreateIndex(name, table, column)
+
+    def select(self) -> Select:
+        if self.accept_symbol("*"):
+            columns = ["*"]
+        else:
+            columns = [self.ident("'*' o una columna")]
+            while self.accept_symbol(","):
+                columns.append(self.ident("una columna"))
+        self.keyword("FROM")
+        table = self.ident("el nombre de la tabla")
+        self.keyword("WHERE")
+        return Select(table, columns, self.predicate())
+
+    def predicate(self):
+        token = self.current
+        column = self.ident("una columna o función espacial")
+        if self.accept_symbol("("):
+            return self.spatial_call(column.lower(), token)
+        if self.accept_keyword("BETWEEN"):
+            low = self.literal()
+            self.keyword("AND")
+            return Between(column, low, self.literal())
+        self.symbol("=")
+        return Compare(column, self.literal())
+
+    def spatial_call(self, function: str, token: Token) -> SpatialCall:
+        if function not in SPATIAL_FUNCTIONS:
+            raise SQLSyntaxError(f"Función espacial desconocida {token.text!r}", self.sql, token.pos)
+        required, optional, texts = SPATIAL_FUNCTIONS[function]
+        args = {}
+        if not self.at_symbol(")"):
+            while True:
+                arg_token = self.current
+                arg = self.ident("el nombre de un argumento").lower()
+                if arg not in required and arg not in optional:
+                    raise SQLSyntaxError(f"Argumento desconocido {arg!r} para {function}", self.sql, arg_token.pos)
+                if arg in args:
+                    raise SQLSyntaxError(f"Argumento repetido {arg!r}", self.sql, arg_token.pos)
+                if self.current.kind != "arrow":
+                    self.error("'=>'")
+                self.advance()
+                if arg in texts:
+                    args[arg] = self.literal(("string", "date"), "una fecha")
+                else:
+                    args[arg] = self.literal(("number",), "un número")
+                if not self.accept_symbol(","):
+                    break
+        faltan = [arg for arg in required if arg not in args]
+        if faltan:
+            raise SQLSyntaxError(f"Faltan argumentos para {function}: {', '.join(faltan)}", self.sql, self.current.pos)
+        self.symbol(")")
+        return SpatialCall(function, args)
+
+    def insert(self) -> Insert:
+        self.keyword("INTO")
+        table = self.ident("el nombre de la tabla")
+        columns = []
+        if self.accept_symbol("("):
+            columns.append(self.ident("una columna"))
+            while self.accept_symbol(","):
+                columns.append(self.ident("una columna"))
+            self.symbol(")")
+        self.keyword("VALUES")
+        self.symbol("(")
+        values = [self.value()]
+        while self.accept_symbol(","):
+            values.append(self.value())
+        self.symbol(")")
+        return Insert(table, columns, values)
+
+    def value(self) -> Literal:
+        # en VALUES también se aceptan palabras y fechas sin comillas (p. ej. Earthquake, 2025-05-28)
+        if self.current.kind in ("ident", "quoted"):
+            return self.name("un valor")
+        return self.literal()
+
+    def delete(self) -> Delete:
+        self.keyword("FROM")
+        table = self.ident("el nombre de la tabla")
+        self.keyword("WHERE")
+        column = self.ident("una columna")
+        self.symbol("=")
+        return Delete(table, Compare(column, self.literal()))
+
+
+# --- cache de sentencias preparadas ---
+
+def bind(node, params: list):
+    """Copia del AST con cada Param reemplazado por el valor del literal."""
+    cls = type(node)
+    if cls is Param:
+        return params[node.index]
+    if cls is list:
+        return [bind(item, params) for item in node]
+    if cls is dict:
+        return {key: bind(value, params) for key, value in node.items()}
+    names = _FIELDS.get(cls)
+    if names is None:
+        return node
+    return cls(*[bind(getattr(node, name), params) for name in names])
+
+
+_FIELDS = {
+    cls: [f.name for f in fields(cls)]
+    for cls in (ColumnDef, CreateTable, CreateFromCsv, CreateIndex, Compare, Between, SpatialCall, Select, Insert, Delete)
+}
+
+
+class StatementCache:
+    """LRU de planes (AST con parámetros y su operación) por sentencia normalizada.
+
+    Cada plan guarda también la Shape de la sentencia que lo creó: una sentencia con el
+    mismo texto salvo por sus literales se resuelve con esa sola regex, sin normalize.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()  # clave normalizada -> AST con Param
+        self.shapes = {}  # primeros SHAPE_PREFIX caracteres -> tupla de Shape
+        self.matchers = {}  # primeros SHAPE_PREFIX caracteres -> Shape.combine de esas formas
+        self.hits = 0
+        self.misses = 0
+        self._shape_of = {}  # clave normalizada -> su Shape
+        self._lock = threading.Lock()  # los endpoints corren en el threadpool de FastAPI
+
+    def match(self, sql: str):
+        """(plan, valores de los literales) si la sentencia calza con una Shape guardada."""
+        matcher = self.matchers.get(sql[:SHAPE_PREFIX])
+        if matcher is None:
+            return None
+        fullmatch, owners = matcher
+        m = fullmatch(sql, SHAPE_PREFIX)
+        if m is None:
+            return None
+        shape, first = owners[m.lastindex]
+        with self._lock:
+            template = self.entries.get(shape.key)
+            if template is None:
+                return None  # la sacó otro hilo; sigue por normalize
+            self.hits += 1
+            self.entries.move_to_end(shape.key)
+        return template, list(map(_literal, shape.kinds, m.groups()[first:m.lastindex - 1]))
+
+    def get(self, key: str):
+        with self._lock:
+            template = self.entries.get(key)
+            if template is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return template
+
+    def put(self, key: str, template, shape: Optional[Shape] = None):
+        with self._lock:
+            self.entries[key] = template
+            self.entries.move_to_end(key)
+            # una forma con un literal dentro del prefijo no se puede buscar por él
+            if shape is not None and key not in self._shape_of and len(shape.texts[0]) >= SHAPE_PREFIX:
+                self._shape_of[key] = shape
+                self._set_shapes(shape.prefix, self.shapes.get(shape.prefix, ()) + (shape,))
+            while len(self.entries) > self.size:
+                old_key, _ = self.entries.popitem(last=False)
+                old = self._shape_of.pop(old_key, None)
+                if old is not None:
+                    self._set_shapes(old.prefix, tuple(other for other in self.shapes[old.prefix] if other is not old))
+
+    def _set_shapes(self, prefix: str, shapes: tuple):
+        # el matcher se reemplaza entero: match lo usa sin el lock
+        if shapes:
+            self.shapes[prefix] = shapes
+            self.matchers[prefix] = Shape.combine(shapes)
+        else:
+            del self.shapes[prefix]
+            del self.matchers[prefix]
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.shapes = {}
+            self.matchers = {}
+            self._shape_of.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entradas": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+statement_cache = StatementCache()
+
+
+def prepare(sql: str, cache: Optional[StatementCache] = statement_cache):
+    """(AST con Param, valores de los literales); las sentencias repetidas salvo por sus
+    literales salen del cache sin tokenizar ni parsear."""
+    if cache is not None:
+        hit = cache.match(sql)
+        if hit is not None:
+            return hit
+        # el DDL no se guarda porque su validez depende del literal (WITH entero, VARCHAR(n)) y
+        # no solo de la forma; tampoco se normaliza
+        if sql.lstrip()[:6].upper() == "CREATE":
+            cache = None
+    if cache is not None:
+        key, params = normalize(sql)
+        template = cache.get(key)
+        if template is not None:
+            return template, params
+
+    tokens = tokenize(sql)
+    template = Parser(sql, tokens).statement()
+    literals = [_literal(t.kind, t.text) for t in tokens if t.param >= 0]
+    # solo se guarda si el normalizador vio los mismos literales que el lexer
+    if cache is not None and literals == params and not isinstance(template, (CreateTable, CreateFromCsv, CreateIndex)):
+        cache.put(key, template, Shape(key, sql, tokens))
+    return template, literals
+
+
+def parse(sql: str, cache: Optional[StatementCache] = statement_cache) -> Statement:
+    """AST tipado de la sentencia, con los valores de los literales."""
+    return bind(*prepare(sql, cache))
+
+
+# --- operaciones para el backend ---
+
+def _number_or_text(value, params: list = ()):
+    if type(value) is Param:
+        value = params[value.index]
+    return value if type(value) is str else float(value)
+
+
+def to_op(stmt: Statement, params: list = ()) -> tuple:
+    """Tupla de operación que consume backend/main.py a partir del AST; los Param del AST
+    sin enlazar se toman de `params`."""
+    # comparación por tipo exacto y las sentencias frecuentes primero: es el camino de cada hit
+    cls = type(stmt)
+    if cls is Select:
+        where = stmt.where
+        cls = type(where)
+        if cls is Compare:
+            return ("search", where.column, _number_or_text(where.value, params))
+        if cls is Between:
+            return ("range", where.column, _number_or_text(where.low, params), _number_or_text(where.high, params))
+
+        args = {key: _number_or_text(value, params) for key, value in where.args.items()}
+        if where.function == "is_in_range2d":
+            return ("range2d", args["lon_min"], args["lat_min"], args["lon_max"], args["lat_max"])
+        if where.function == "is_in_range3d":
+            return ("range3d", args["lon_min"], args["lat_min"], args["lon_max"], args["lat_max"],
+                    args["desde"], args["hasta"], args.get("prof_min"), args.get("prof_max"))
+        if where.function == "nearest":
+            return ("nearest", args["lat"], args["lon"], int(args["k"]))
+        return ("within_radius", args["lat"], args["lon"], args["km"])
+    if cls is Insert:
+        return ("insert", [str(params[v.index] if type(v) is Param else v) for v in stmt.values])
+    if cls is Delete:
+        return ("delete", stmt.where.column, _number_or_text(stmt.where.value, params))
+
+    stmt = bind(stmt, params)  # DDL: poco frecuente, se enlaza completo
+    if cls is CreateTable:
+        campos = []
+        for column in stmt.columns:
+            campo = {"name": column.name, "type": column.type.upper()}
+            if column.primary:
+                campo["primary"] = True
+            if column.index:
+                campo["index"] = column.index.upper()
+            campos.append(campo)
+        return ("create", stmt.table, campos, stmt.options)
+    if cls is CreateFromCsv:
+        return ("create_from_csv", stmt.table, stmt.path, stmt.index.lower(), stmt.column.lower(), stmt.options)
+    return ("create_index", stmt.name, stmt.table, stmt.column.lower())
+
+
+def parse_sql(sql: str) -> tuple:
+    # el plan guardado se convierte directo en la operación, sin copiar el AST
+    return to_op(*prepare(sql))
@@ -0,0 +1,53 @@
+"""Inserciones por segundo de BTree.add a medida que crece el árbol.
+
+Mide cada décimo de la carga por separado: con persistencia incremental el ritmo
+debe mantenerse plano. Se compara el modo autocommit (un flush por add) con el
+modo batch (un solo flush al final).
+
+Uso: python -m benchmarks.bench_btree_insert [n1 n2 ...]
+"""
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from ISAM.btree import BTree
+from tests.helpers import registro
+
+TRAMOS = 10
+
+
+def medir(n, modo, tmp):
+    btree = BTree(os.path.join(tmp, f"idx_{modo}_{n}.dat"), os.path.join(tmp, f"data_{modo}_{n}.dat"))
+    ids = list(range(n))
+    random.Random(0).shuffle(ids)
+    paso = n // TRAMOS
+    ritmos = []
+    if modo == "batch":
+        btree.begin()
+    for tramo in range(TRAMOS):
+        t0 = perf_counter()
+        for i in ids[tramo * paso:(tramo + 1) * paso]:
+            btree.add(registro(i))
+        ritmos.append(paso / (perf_counter() - t0))
+    if modo == "batch":
+        btree.commit()
+    escrituras = btree.stats()["page_writes"]
+    btree.close()
+    return ritmos, escrituras
+
+
+def main():
+    tamanos = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in tamanos:
+            for modo in ("autocommit", "batch"):
+                ritmos, escrituras = medir(n, modo, tmp)
+                print(f"{n:>9} {modo:>10}  inserts/s por décimo: "
+                      + " ".join(f"{r:,.0f}" for r in ritmos)
+                      + f"  | páginas escritas: {escrituras:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Latencia de BTree.search y altura del árbol según el orden de los nodos.
+
+Uso: python -m benchmarks.bench_btree_order [filas]
+"""
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from ISAM.btree import BTree
+from tests.helpers import registro
+
+CONFIGS = [("t=3", {"t": 3}), ("t=8", {"t": 8}), ("t=32", {"t": 32}), ("1 KiB", {"page_size": 1024}),
+           ("4 KiB", {"page_size": 4096}), ("16 KiB", {"page_size": 16384})]
+BUSQUEDAS = 20000
+
+
+def medir(n, kwargs, tmp):
+    nombre = "_".join(f"{k}{v}" for k, v in kwargs.items())
+    btree = BTree(os.path.join(tmp, f"idx_{nombre}.dat"), os.path.join(tmp, f"data_{nombre}.dat"), **kwargs)
+    btree.bulk_load((registro(i) for i in range(n)),
+                    presorted=True)
+    rnd = random.Random(0)
+    claves = [rnd.randrange(n) for _ in range(BUSQUEDAS)]
+
+    t0 = perf_counter()
+    for key in claves:
+        btree.search(key)
+    latencia = (perf_counter() - t0) / BUSQUEDAS * 1e6
+
+    resultado = btree.t, btree.height(), btree.num_pages, latencia
+    btree.close()
+    return resultado
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"{n} claves")
+    print(f"{'config':>8} {'t':>5} {'altura':>7} {'páginas':>9} {'search µs':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, kwargs in CONFIGS:
+            t, altura, paginas, latencia = medir(n, kwargs, tmp)
+            print(f"{nombre:>8} {t:>5} {altura:>7} {paginas:>9,} {latencia:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Llamadas de lectura al archivo de datos por fila en BTree.range_search.
+
+Compara la lectura fila por fila (un seek + read por registro, como antes) con la
+lectura por lotes de offsets ordenados y fusionados en tramos contiguos, sobre un
+árbol cargado en bloque (datos contiguos) y otro con inserciones aleatorias.
+
+Uso: python -m benchmarks.bench_btree_range [filas]
+"""
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from ISAM.btree import BTree
+from tests.helpers import registro
+
+RANGOS = 20
+ANCHO_RANGO = 50_000
+
+
+def fila_por_fila(btree, start, end):
+    node = btree._find_leaf(start)
+    while True:
+        for k, offset in zip(node.keys, node.offsets):
+            if k > end:
+                return
+            if k >= start:
+                yield btree._read_data(offset)
+        if node.next == -1:
+            return
+        node = btree._read_node(node.next)
+
+
+def medir(btree, n, recorrer):
+    rnd = random.Random(0)
+    lecturas, filas = btree.data_reads, 0
+    t0 = perf_counter()
+    for _ in range(RANGOS):
+        a = rnd.randrange(max(n - ANCHO_RANGO, 1))
+        filas += sum(1 for _ in recorrer(btree, a, a + ANCHO_RANGO - 1))
+    return (btree.data_reads - lecturas) / filas, filas / (perf_counter() - t0)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    registros = (registro(i) for i in range(n))
+    print(f"{n} claves, rangos de {ANCHO_RANGO} filas")
+    print(f"{'árbol':>10} {'lectura':>12} {'llamadas/fila':>14} {'filas/s':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        bulk = BTree(os.path.join(tmp, "bulk.idx"), os.path.join(tmp, "bulk.dat"))
+        bulk.bulk_load(registros, presorted=True)
+
+        ids = list(range(n))
+        random.Random(1).shuffle(ids)
+        aleatorio = BTree(os.path.join(tmp, "rand.idx"), os.path.join(tmp, "rand.dat"))
+        with aleatorio.batch():
+            for i in ids:
+                aleatorio.add(registro(i))
+
+        for nombre, btree in (("bulk", bulk), ("aleatorio", aleatorio)):
+            for modo, recorrer in (("fila a fila", fila_por_fila), ("por lotes", BTree.range_search)):
+                llamadas, ritmo = medir(btree, n, recorrer)
+                print(f"{nombre:>10} {modo:>12} {llamadas:>14.4f} {ritmo:>12,.0f}")
+            btree.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Filas por segundo de ISAM.search y ISAM.rangeSearch según el tamaño de página.
+
+Uso: python -m benchmarks.bench_isam_page_size [filas]
+"""
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from ISAM.isam import ISAM
+from tests.helpers import registro
+
+CONFIGS = [("fb=3", {"fb": 3}), ("4 KiB", {"page_size": 4096}), ("16 KiB", {"page_size": 16384})]
+BUSQUEDAS = 2000
+RANGOS = 50
+ANCHO_RANGO = 5000
+
+
+def medir(n, kwargs, tmp):
+    isam = ISAM(os.path.join(tmp, f"bench_{kwargs}.dat"), reorg_threshold=None, **kwargs)
+    isam.build_index([registro(i) for i in range(n)])
+    rnd = random.Random(0)
+
+    t0 = perf_counter()
+    filas = sum(len(isam.search(rnd.randrange(n))) for _ in range(BUSQUEDAS))
+    t_search = perf_counter() - t0
+
+    t0 = perf_counter()
+    filas_rango = 0
+    for _ in range(RANGOS):
+        a = rnd.randrange(n)
+        filas_rango += len(isam.rangeSearch(a, a + ANCHO_RANGO - 1))
+    t_range = perf_counter() - t0
+
+    isam.close()
+    return isam.fb, filas / t_search, filas_rango / t_range
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"{n} filas")
+    print(f"{'página':>8} {'fb':>5} {'search filas/s':>16} {'rangeSearch filas/s':>20}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre, kwargs in CONFIGS:
+            fb, search, rango = medir(n, kwargs, tmp)
+            print(f"{nombre:>8} {fb:>5} {search:>16,.0f} {rango:>20,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Carga del R-tree inserción por inserción frente a la carga en bloque por stream.
+
+Mide el tiempo de carga y el de consultas rangeSearch con cajas aleatorias sobre
+ambos índices; el índice cargado en bloque tiene nodos empaquetados con menos solapamiento.
+
+Uso: python -m benchmarks.bench_rtree_load [puntos]
+"""
+import os
+import random
+import sys
+import tempfile
+from time import perf_counter
+
+from backend.rtree import RTreeIndex
+from tests.helpers import DATOS
+
+CONSULTAS = 200
+LADO = 2.0  # grados por lado de cada caja de consulta
+
+
+def puntos(n):
+    rnd = random.Random(0)
+    return [(i, rnd.uniform(-60, 60), rnd.uniform(-180, 180), DATOS) for i in range(n)]
+
+
+def consultas(rtree):
+    rnd = random.Random(1)
+    filas = 0
+    t0 = perf_counter()
+    for _ in range(CONSULTAS):
+        lon, lat = rnd.uniform(-180, 180 - LADO), rnd.uniform(-60, 60 - LADO)
+        filas += len(rtree.rangeSearch(lon, lat, lon + LADO, lat + LADO))
+    return filas, (perf_counter() - t0) / CONSULTAS
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    filas = puntos(n)
+    print(f"{n} puntos, {CONSULTAS} cajas de {LADO}°x{LADO}°")
+    print(f"{'carga':>10} {'segundos':>10} {'filas':>8} {'ms/consulta':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        uno_a_uno = RTreeIndex(os.path.join(tmp, "insert"))
+        t0 = perf_counter()
+        for record_id, lat, lon, datos in filas:
+            uno_a_uno.insert(record_id, lat, lon, datos)
+        carga_insert = perf_counter() - t0
+
+        bloque = RTreeIndex(os.path.join(tmp, "bulk"))
+        t0 = perf_counter()
+        bloque.bulk_load(filas)
+        carga_bulk = perf_counter() - t0
+
+        for nombre, rtree, carga in (("insert", uno_a_uno, carga_insert), ("bulk", bloque, carga_bulk)):
+            encontradas, por_consulta = consultas(rtree)
+            print(f"{nombre:>10} {carga:>10.2f} {encontradas:>8} {por_consulta * 1000:>12.3f}")
+            rtree.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Refinamiento de within_radius: NumPy sobre registros empaquetados frente a Python fila a fila.
+
+Los candidatos se generan alrededor del centro y unos dos tercios quedan dentro del radio; el
+tiempo por candidato del refinamiento vectorizado debe mantenerse constante al crecer n.
+
+Uso: python -m benchmarks.bench_rtree_radius
+"""
+import random
+from time import perf_counter
+
+from backend.geo import haversine_km
+from backend.record_store import RECORD, RecordStore
+from backend.rtree import refine_radius
+from tests.helpers import DATOS
+
+LAT, LON, KM = -12.05, -77.04, 500.0
+TAMANOS = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def candidatos(n):
+    rnd = random.Random(0)
+    return b''.join(
+        RecordStore._pack(i, LAT + rnd.uniform(-5, 5), LON + rnd.uniform(-5, 5), DATOS) for i in range(n)
+    )
+
+
+def fila_a_fila(raw):
+    dentro = []
+    for _, record_id, lat, lon, *_ in RECORD.iter_unpack(raw):
+        d = haversine_km(LAT, LON, lat, lon)
+        if d <= KM:
+            dentro.append((d, record_id))
+    dentro.sort()
+    return dentro
+
+
+def main():
+    print(f"{'candidatos':>10} {'dentro':>8} {'numpy ms':>10} {'ns/cand':>8} {'python ms':>10} {'ns/cand':>8}")
+    for n in TAMANOS:
+        raw = candidatos(n)
+        t0 = perf_counter()
+        rows, _ = refine_radius(raw, LAT, LON, KM)
+        t_np = perf_counter() - t0
+        t0 = perf_counter()
+        esperado = fila_a_fila(raw)
+        t_py = perf_counter() - t0
+        if len(esperado) != len(rows):
+            raise SystemExit("resultados distintos")
+        print(f"{n:>10} {len(rows):>8} {t_np * 1000:>10.2f} {t_np / n * 1e9:>8.0f} "
+              f"{t_py * 1000:>10.2f} {t_py / n * 1e9:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Throughput de parse_sql: lexer + descenso recursivo frente al cache de sentencias preparadas.
+
+Las sentencias repiten la forma de las que manda el frontend cambiando solo los literales,
+así que con el cache cada una se reconoce con la regex de su forma, sin normalizarla, y el plan
+guardado se convierte directo en la operación.
+
+Uso: python -m benchmarks.bench_sql_parse [sentencias]
+"""
+import random
+import sys
+from time import perf_counter
+
+from backend.sql_parser import StatementCache, prepare, to_op
+
+PLANTILLAS = [
+    "SELECT * FROM sismos WHERE id = {i}",
+    "SELECT * FROM sismos WHERE id BETWEEN {i} AND {j}",
+    "SELECT * FROM sismos WHERE fecha BETWEEN '2025-05-{d:02d}' AND '2025-06-{d:02d}'",
+    "SELECT * FROM sismos WHERE is_in_range2d(lat_min => -{d}, lat_max => 0, lon_min => -80, lon_max => -60)",
+    "SELECT * FROM sismos WHERE nearest(lat => -12.{i}, lon => -77.{j}, k => {d})",
+    "INSERT INTO sismos VALUES ({i}, '2025-05-{d:02d}', 'Earthquake', -15.{j}, -75.{i}, 4.5, 30.0)",
+    "DELETE FROM sismos WHERE id = {i}",
+]
+
+
+def sentencias(n):
+    rnd = random.Random(0)
+    return [
+        rnd.choice(PLANTILLAS).format(i=rnd.randrange(10 ** 6), j=rnd.randrange(10 ** 6), d=rnd.randint(1, 28))
+        for _ in range(n)
+    ]
+
+
+def medir(sqls, cache):
+    t0 = perf_counter()
+    for sql in sqls:
+        to_op(*prepare(sql, cache))  # lo mismo que parse_sql con un cache propio
+    return len(sqls) / (perf_counter() - t0)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    sqls = sentencias(n)
+    cache = StatementCache()
+    print(f"{n} sentencias de {len(PLANTILLAS)} formas")
+    print(f"{'modo':>12} {'sentencias/s':>14}")
+    print(f"{'sin cache':>12} {medir(sqls, None):>14,.0f}")
+    print(f"{'con cache':>12} {medir(sqls, cache):>14,.0f}")
+    print(f"{'':>12} {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+"""Datos y fixtures compartidos por los tests y los benchmarks."""
+import tempfile
+import unittest
+
+from ISAM.isam import Registro
+
+# campos fijos de los registros de prueba; solo cambia el id
+FECHA, TIPO, LAT, LON, MAG, PROF = "2025-05-28", "INVALID", -15.0, -75.0, 4.0, 30.0
+DATOS = {"fecha": FECHA, "tipo": TIPO, "mag": MAG, "prof": PROF}  # payload del R-tree
+
+
+def registro(i):
+    return Registro(i, FECHA, TIPO, LAT, LON, MAG, PROF)
+
+
+class TempDirTestCase(unittest.TestCase):
+    """Directorio temporal en self.tmp, borrado después del tearDown de cada test."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
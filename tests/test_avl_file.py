@@ -0,0 +1,128 @@
+import os
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.AVL_file import AVLFile
+from tests.helpers import TempDirTestCase, registro
+
+
+class TestAVLFile(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, "avl.dat")
+        self.avl = AVLFile(self.path, cache_size=32)
+
+    def tearDown(self):
+        self.avl.close()
+
+    def test_insert_remove_and_reopen(self):
+        ids = list(range(500))
+        random.Random(7).shuffle(ids)
+        for i in ids:
+            self.avl.insert(registro(i))
+        for i in ids[:200]:
+            self.avl.remove(i)
+        self.avl.close()
+
+        self.avl = AVLFile(self.path)
+        self.assertEqual(self.avl.inorder(), sorted(ids[200:]))
+        self.assertEqual(self.avl.search(ids[300])["id"], ids[300])
+        self.assertIsNone(self.avl.search(ids[0]))
+
+    def test_deleted_slots_are_reused(self):
+        for i in range(300):
+            self.avl.insert(registro(i))
+        self.avl.flush()
+        sizes = (os.path.getsize(self.avl.filename), os.path.getsize(self.avl.data_filename))
+
+        for ronda in range(5):
+            for i in range(300):
+                self.avl.remove(i + ronda * 300)
+            for i in range(300):
+                self.avl.insert(registro(i + (ronda + 1) * 300))
+
+        self.assertEqual((os.path.getsize(self.avl.filename), os.path.getsize(self.avl.data_filename)), sizes)
+        self.assertEqual(self.avl.get_num_records(), 300)
+        for i in range(1500, 1800):
+            self.assertEqual(self.avl.search(i)["id"], i)
+
+    def test_bulk_load_is_balanced(self):
+        ids = list(range(0, 2000, 2))
+        random.Random(3).shuffle(ids)
+        self.avl.bulk_load([registro(i) for i in ids])
+
+        def altura(pos):
+            if pos == -1:
+                return -1
+            r = self.avl.get_record(pos)
+            hl, hr = altura(r.left), altura(r.right)
+            self.assertLessEqual(abs(hl - hr), 1)
+            self.assertEqual(r.height, max(hl, hr) + 1)
+            return r.height
+
+        self.assertEqual(altura(self.avl.pos_root), 9)
+        self.assertEqual(self.avl.inorder(), sorted(ids))
+
+        # el árbol cargado sigue aceptando inserciones normales
+        self.avl.insert(registro(7))
+        self.assertEqual(self.avl.search(7)["id"], 7)
+        self.assertEqual(self.avl.search(1998)["id"], 1998)
+
+    def test_bulk_load_rejects_unsorted_stream(self):
+        self.avl.bulk_load([registro(i) for i in range(100)])
+        with self.assertRaises(ValueError):
+            self.avl.bulk_load(iter([registro(5), registro(2)]), presorted=True)
+        # el árbol anterior sigue intacto, también al reabrir
+        self.assertEqual(self.avl.search(42)["id"], 42)
+        self.assertEqual(self.avl.inorder(), list(range(100)))
+        self.avl.close()
+        self.avl = AVLFile(self.path)
+        self.assertEqual(self.avl.inorder(), list(range(100)))
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["avl.dat", "avl_heap.dat"])
+
+    def test_range_pagination(self):
+        ids = list(range(0, 1000, 3))
+        random.Random(5).shuffle(ids)
+        for i in ids:
+            self.avl.insert(registro(i))
+
+        esperado = [i for i in range(0, 1000, 3) if 100 <= i <= 700]
+        self.assertEqual([r["id"] for r in self.avl.range_search(100, 700)], esperado)
+
+        paginas, cursor = [], None
+        while True:
+            pagina = self.avl.range_search(100, 700, limit=50, after_key=cursor)
+            paginas.extend(r["id"] for r in pagina)
+            if len(pagina) < 50:
+                break
+            cursor = pagina[-1]["id"]
+        self.assertEqual(paginas, esperado)
+
+    def test_cache_counters(self):
+        for i in range(100):
+            self.avl.insert(registro(i))
+        stats = self.avl.stats()
+        self.assertEqual(stats["flushes"], 100)
+        self.assertGreater(stats["cache_hits"], stats["cache_misses"])
+        self.assertEqual(len(self.avl.dirty), 0)
+        self.assertLessEqual(len(self.avl.cache), 32)
+
+    def test_concurrent_inserts_and_searches(self):
+        self.avl.bulk_load([registro(i) for i in range(0, 2000, 2)])
+
+        def tarea(i):
+            if i % 2:
+                self.avl.insert(registro(i))
+                return None
+            return self.avl.search(i)["id"]
+
+        with ThreadPoolExecutor(8) as pool:
+            encontrados = list(pool.map(tarea, range(2000)))
+        self.assertEqual(encontrados[::2], list(range(0, 2000, 2)))
+        self.assertEqual(self.avl.inorder(), list(range(2000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+import os
+import random
+import struct
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from ISAM.isam import Registro
+from ISAM.btree import BTree, SecondaryIndex
+from tests.helpers import TempDirTestCase, registro
+
+
+class TestBTree(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.idx = os.path.join(self.tmp.name, "bptree_index.dat")
+        self.data = os.path.join(self.tmp.name, "bptree_data.dat")
+        self.btree = BTree(self.idx, self.data, t=3)
+
+    def tearDown(self):
+        self.btree.close()
+
+    def test_insert_search_and_reopen(self):
+        ids = list(range(2000))
+        random.Random(5).shuffle(ids)
+        for i in ids:
+            self.btree.add(registro(i))
+        self.btree.close()
+
+        self.btree = BTree(self.idx, self.data)
+        self.assertEqual(self.btree.reads, 0)
+        self.assertEqual(self.btree.search(1234).id, 1234)
+        self.assertEqual(self.btree.reads, self.btree.height())
+        self.assertIsNone(self.btree.search(5000))
+        self.assertEqual([r.id for r in self.btree.range_search(100, 199)], list(range(100, 200)))
+
+    def test_batch_defers_page_writes(self):
+        antes = self.btree.stats()
+        with self.btree.batch():
+            for i in range(1000):
+                self.btree.add(registro(i))
+            self.assertEqual(self.btree.stats()["flushes"], antes["flushes"])
+        stats = self.btree.stats()
+        self.assertEqual(stats["flushes"], antes["flushes"] + 1)
+        self.assertEqual(len(self.btree.dirty), 0)
+        # el único flush escribe cada página de nodo una sola vez
+        self.assertEqual(stats["page_writes"] - antes["page_writes"], stats["pages"] - 1)
+
+        self.btree.close()
+        self.btree = BTree(self.idx, self.data)
+        self.assertEqual([r.id for r in self.btree.range_search(0, 999)], list(range(1000)))
+
+    def test_add_writes_only_dirty_pages(self):
+        for i in range(1000):
+            self.btree.add(registro(i))
+        antes = self.btree.writes
+        self.btree.add(registro(5000))
+        self.assertLessEqual(self.btree.writes - antes, 3)
+
+    def test_bulk_load(self):
+        ids = list(range(0, 4000, 2))
+        random.Random(3).shuffle(ids)
+        self.btree.bulk_load([registro(i) for i in ids], fill=0.8)
+        self.assertEqual([r.id for r in self.btree.range_search(0, 4000)], list(range(0, 4000, 2)))
+
+        # hojas al 80 % (4 de 5 claves) y ninguna por debajo del mínimo
+        leaf = self.btree._find_leaf(-1)
+        ocupacion = []
+        while True:
+            ocupacion.append(len(leaf.keys))
+            if leaf.next == -1:
+                break
+            leaf = self.btree._read_node(leaf.next)
+        self.assertEqual(ocupacion.count(4), len(ocupacion))
+
+        # quedan huecos: insertar entre claves cargadas no parte hojas
+        paginas = self.btree.num_pages
+        self.btree.add(registro(1))
+        self.assertEqual(self.btree.num_pages, paginas)
+        self.btree.close()
+
+        self.btree = BTree(self.idx, self.data)
+        self.assertEqual(self.btree.search(1).id, 1)
+        self.assertEqual(self.btree.search(3998).id, 3998)
+        self.assertIsNone(self.btree.search(3))
+
+    def test_bulk_load_rejects_unsorted_stream(self):
+        self.btree.bulk_load([registro(i) for i in range(100)])
+        with self.assertRaises(ValueError):
+            self.btree.bulk_load(iter([registro(5), registro(2)]), presorted=True)
+        # el árbol anterior sigue intacto, también al reabrir
+        self.assertEqual(self.btree.search(42).id, 42)
+        self.btree.close()
+        self.btree = BTree(self.idx, self.data)
+        self.assertEqual([r.id for r in self.btree.range_search(0, 99)], list(range(100)))
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["bptree_data.dat", "bptree_index.dat"])
+
+    def test_concurrent_adds_and_searches(self):
+        self.btree.bulk_load([registro(i) for i in range(0, 4000, 2)])
+
+        def tarea(i):
+            if i % 2:
+                self.btree.add(registro(i))
+                return None
+            if i % 200 == 0:
+                return [r.id for r in self.btree.range_search(i, i + 98, batch_size=8) if r.id % 2 == 0]
+            return self.btree.search(i).id
+
+        with ThreadPoolExecutor(8) as pool:
+            encontrados = list(pool.map(tarea, range(4000)))
+        for i, encontrado in zip(range(0, 4000, 2), encontrados[::2]):
+            self.assertEqual(encontrado, list(range(i, i + 99, 2)) if i % 200 == 0 else i)
+        self.assertEqual([r.id for r in self.btree.range_search(0, 3999)], list(range(4000)))
+
+    def test_range_search_coalesces_reads(self):
+        self.btree.bulk_load([registro(i) for i in range(5000)])
+        antes = self.btree.data_reads
+        rango = self.btree.range_search(1000, 3999)
+        self.assertEqual(self.btree.data_reads, antes)  # generador: todavía no leyó nada
+        self.assertEqual([r.id for r in rango], list(range(1000, 4000)))
+        # registros contiguos en el archivo: un tramo por lote de hojas
+        self.assertLessEqual(self.btree.data_reads - antes, 3000 // 1024 + 2)
+
+        # con offsets dispersos el resultado sigue en orden de clave
+        for i in range(5000, 5300):
+            self.btree.remove(i - 5000)
+            self.btree.add(registro(i))
+        self.assertEqual([r.id for r in self.btree.range_search(200, 5299)], list(range(300, 5300)))
+
+    def test_order_from_page_size(self):
+        self.btree.close()
+        os.remove(self.idx)
+        self.btree = BTree(self.idx, self.data, page_size=4096)
+        self.assertEqual(self.btree.t, 255)
+        self.assertEqual(self.btree.page_size, 4096)
+        self.btree.bulk_load([registro(i) for i in range(20000)])
+        self.assertEqual(self.btree.height(), 2)
+        self.assertEqual(os.path.getsize(self.idx) % 4096, 0)
+
+        # el orden guardado manda al reabrir
+        self.btree.close()
+        self.btree = BTree(self.idx, self.data, t=3)
+        self.assertEqual((self.btree.t, self.btree.page_size), (255, 4096))
+        self.assertEqual(self.btree.search(12345).id, 12345)
+
+        self.btree.reset(t=4)
+        self.assertEqual((self.btree.t, self.btree.max_keys), (4, 7))
+        self.assertIsNone(self.btree.search(12345))
+
+    def test_remove(self):
+        for i in range(100):
+            self.btree.add(registro(i))
+        self.assertTrue(self.btree.remove(50))
+        self.assertFalse(self.btree.remove(50))
+        self.assertIsNone(self.btree.search(50))
+        self.assertEqual(len(list(self.btree.range_search(0, 99))), 99)
+
+    def hojas(self):
+        leaf, ocupacion = self.btree._find_leaf(-1), []
+        while True:
+            ocupacion.append(len(leaf.keys))
+            if leaf.next == -1:
+                return ocupacion
+            leaf = self.btree._read_node(leaf.next)
+
+    def test_remove_rebalances_and_reuses_space(self):
+        ids = list(range(3000))
+        random.Random(9).shuffle(ids)
+        for i in ids:
+            self.btree.add(registro(i))
+        paginas, tamano = self.btree.num_pages, os.path.getsize(self.data)
+
+        for i in ids[:2700]:
+            self.assertTrue(self.btree.remove(i))
+        vivos = sorted(ids[2700:])
+        self.assertEqual([r.id for r in self.btree.range_search(-1, 3000)], vivos)
+        # ninguna hoja queda por debajo del mínimo ni vacía en la cadena
+        self.assertGreaterEqual(min(self.hojas()), self.btree.t - 1)
+        self.assertLessEqual(len(self.hojas()), len(vivos) // (self.btree.t - 1))
+
+        for i in ids[:2700]:
+            self.btree.add(registro(i))
+        self.assertEqual(os.path.getsize(self.data), tamano)
+        self.assertLessEqual(self.btree.num_pages, paginas)
+        self.btree.close()
+
+        self.btree = BTree(self.idx, self.data)
+        for i in ids[:3000:2]:
+            self.assertTrue(self.btree.remove(i))
+        self.assertEqual([r.id for r in self.btree.range_search(-1, 3000)], sorted(ids[1:3000:2]))
+
+    def test_remove_collapses_root(self):
+        for i in range(100):
+            self.btree.add(registro(i))
+        self.assertGreater(self.btree.height(), 1)
+        for i in range(100):
+            self.btree.remove(i)
+        self.assertEqual(self.btree.height(), 1)
+        self.assertEqual(list(self.btree.range_search(-1, 100)), [])
+
+    def test_legacy_index_is_migrated(self):
+        self.btree.close()
+        with open(self.data, "wb") as f:
+            for i in (3, 9):
+                f.write(registro(i).empaquetar())
+        with open(self.idx, "wb") as f:
+            f.write(struct.pack("iiii", 3, 0, 9, Registro.SIZE))
+
+        self.btree = BTree(self.idx, self.data)
+        self.assertEqual(self.btree.search(9).id, 9)
+        self.assertEqual([r.id for r in self.btree.range_search(0, 10)], [3, 9])
+
+
+class TestSecondaryIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.primary = BTree(os.path.join(self.tmp.name, "idx.dat"), os.path.join(self.tmp.name, "data.dat"))
+        rnd = random.Random(4)
+        self.registros = [
+            Registro(i, f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", "INVALID",
+                     -15.0, -75.0, round(rnd.uniform(2, 9), 1), round(rnd.uniform(0, 600), 1))
+            for i in range(2000)
+        ]
+        self.primary.bulk_load(self.registros)
+        self.indices = {
+            col: SecondaryIndex(col, self.primary, os.path.join(self.tmp.name, f"{col}.dat"))
+            for col in ("mag", "prof", "fecha")
+        }
+        for sec in self.indices.values():
+            sec.build()
+
+    def tearDown(self):
+        for sec in self.indices.values():
+            sec.close()
+        self.primary.close()
+
+    def test_range_by_value(self):
+        ids = [r.id for r in self.indices["mag"].range_search(6, 9)]
+        self.assertEqual(sorted(ids), [r.id for r in self.registros if 6 <= r.mag <= 9])
+        mags = [r.mag for r in self.indices["mag"].range_search(6, 9)]
+        self.assertEqual(mags, sorted(mags))
+
+        ids = sorted(r.id for r in self.indices["prof"].range_search(0, 10))
+        self.assertEqual(ids, [r.id for r in self.registros if r.prof <= 10])
+
+        ids = sorted(r.id for r in self.indices["fecha"].range_search("2025-03-01", "2025-03-31"))
+        self.assertEqual(ids, [r.id for r in self.registros if "2025-03-01" <= r.fecha <= "2025-03-31"])
+
+    def test_maintained_on_insert_and_delete(self):
+        nuevo = Registro(5000, "2025-05-28T10:45:12.000Z", "INVALID", -15.0, -75.0, 9.5, 3.0)
+        offset = self.primary.add(nuevo)
+        for sec in self.indices.values():
+            sec.add(nuevo, offset)
+        self.assertEqual([r.id for r in self.indices["mag"].range_search(9.5, 9.5)], [5000])
+
+        viejo = self.registros[10]
+        for sec in self.indices.values():
+            self.assertTrue(sec.remove(viejo))
+        self.primary.remove(viejo.id)
+        self.assertNotIn(viejo.id, [r.id for r in self.indices["prof"].range_search(viejo.prof, viejo.prof)])
+
+        # reabrir conserva las entradas
+        self.indices["fecha"].close()
+        self.indices["fecha"] = SecondaryIndex("fecha", self.primary, os.path.join(self.tmp.name, "fecha.dat"))
+        self.assertIn(5000, [r.id for r in self.indices["fecha"].range_search("2025-05-28", "2025-05-28")])
+
+    def test_key_uses_stored_precision(self):
+        # 3.005 en float64 da 300 centésimas y su float32 guardado (3.0050001...) da 301
+        nuevo = Registro(6000, "2025-05-28", "INVALID", -15.0, -75.0, 3.005, 10.035)
+        offset = self.primary.add(nuevo)
+        for sec in self.indices.values():
+            sec.add(nuevo, offset)
+        guardado = self.primary.search(6000)
+        for sec in self.indices.values():
+            self.assertTrue(sec.remove(guardado))
+
+
+if __name__ == '__main__':
+    unittest.main()
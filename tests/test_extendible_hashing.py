@@ -0,0 +1,75 @@
+import os
+import struct
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.Extendible_Hashing import ExtendibleHashing
+from tests.helpers import TempDirTestCase, registro
+
+record_struct = struct.Struct('i10s10sffff')
+
+
+class TestExtendibleHashing(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hash = ExtendibleHashing("hash.dat", record_struct, max_depth=3, fb=4, data_dir=self.tmp.name)
+
+    def test_insert_and_find(self):
+        for i in range(50):
+            self.assertTrue(self.hash.insert(registro(i)))
+        self.assertFalse(self.hash.insert(registro(10)))  # duplicado
+        for i in range(50):
+            self.assertEqual(self.hash.find(i).id, i)
+        self.assertIsNone(self.hash.find(99))
+        # con max_depth=3 el directorio se detiene en 8 entradas y el resto va a overflow
+        self.assertEqual(self.hash.global_depth, 3)
+
+    def test_split_updates_directory(self):
+        for i in range(5):
+            self.hash.insert(registro(i))
+        self.assertEqual(self.hash.global_depth, 1)
+        self.assertNotEqual(self.hash.directory[0], self.hash.directory[1])
+
+    def test_remove_and_reopen(self):
+        for i in range(30):
+            self.hash.insert(registro(i))
+        for i in range(0, 30, 3):
+            self.assertTrue(self.hash.remove(i))
+        self.assertFalse(self.hash.remove(0))
+
+        reopened = ExtendibleHashing("hash.dat", record_struct, data_dir=self.tmp.name)
+        self.assertEqual((reopened.max_depth, reopened.fb), (3, 4))
+        ids = sorted(r.id for r in reopened.get_all_records())
+        self.assertEqual(ids, [i for i in range(30) if i % 3])
+        self.assertEqual(sorted(r.id for r in reopened.find_range(4, 8)), [4, 5, 7, 8])
+
+    def test_concurrent_inserts_and_finds(self):
+        tabla = ExtendibleHashing("concurrente.dat", record_struct, max_depth=10, fb=4, data_dir=self.tmp.name)
+        for i in range(0, 2000, 2):
+            tabla.insert(registro(i))
+
+        def tarea(i):
+            if i % 2:
+                return tabla.insert(registro(i))
+            return tabla.find(i).id == i
+
+        with ThreadPoolExecutor(8) as pool:
+            self.assertTrue(all(pool.map(tarea, range(2000))))
+        self.assertEqual(sorted(r.id for r in tabla.get_all_records()), list(range(2000)))
+
+    def test_legacy_file_is_migrated(self):
+        with open(os.path.join(self.tmp.name, "old.dat"), "wb") as f:
+            for i in (7, 3):
+                f.write(record_struct.pack(*registro(i).to_tuple()))
+        with open(os.path.join(self.tmp.name, "indx_old.dat"), "wb") as f:
+            for i in range(64):
+                f.write(struct.pack("ii", i, i % 2))
+
+        migrated = ExtendibleHashing("old.dat", record_struct, data_dir=self.tmp.name)
+        self.assertEqual(migrated.find(7).id, 7)
+        self.assertEqual(migrated.find(3).id, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
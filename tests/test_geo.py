@@ -0,0 +1,47 @@
+import random
+import unittest
+
+from backend.geo import bounding_boxes, haversine_km
+
+
+def dentro(cajas, lat, lon):
+    return any(x0 <= lon <= x1 and y0 <= lat <= y1 for x0, y0, x1, y1 in cajas)
+
+
+class TestGeo(unittest.TestCase):
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine_km(0, 0, 0, 1), 111.195, places=2)
+        # Lima - Cusco, ~575 km
+        self.assertAlmostEqual(haversine_km(-12.0464, -77.0428, -13.5319, -71.9675), 575, delta=5)
+        self.assertAlmostEqual(haversine_km(10, 179.5, 10, -179.5), haversine_km(10, 0, 10, 1))
+
+    def test_boxes_split_at_antimeridian(self):
+        cajas = bounding_boxes(-15.0, 179.0, 300)
+        self.assertEqual(len(cajas), 2)
+        self.assertTrue(dentro(cajas, -15.0, -178.5))
+        self.assertFalse(dentro(cajas, -15.0, 0.0))
+
+    def test_boxes_cover_pole(self):
+        cajas = bounding_boxes(89.0, 10.0, 500)
+        self.assertEqual(len(cajas), 1)
+        x0, _, x1, y1 = cajas[0]
+        self.assertEqual((x0, x1, y1), (-180.0, 180.0, 90.0))
+
+    def test_boxes_contain_every_point_in_radius(self):
+        rnd = random.Random(0)
+        revisados = 0
+        for _ in range(5000):
+            lat, lon = rnd.uniform(-89, 89), rnd.uniform(-180, 180)
+            km = rnd.uniform(1, 3000)
+            cajas = bounding_boxes(lat, lon, km)
+            plat = max(-90.0, min(90.0, lat + rnd.uniform(-30, 30)))
+            plon = (lon + rnd.uniform(-60, 60) + 180) % 360 - 180
+            if haversine_km(lat, lon, plat, plon) <= km:
+                revisados += 1
+                self.assertTrue(dentro(cajas, plat, plon), (lat, lon, km, plat, plon))
+        self.assertGreater(revisados, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import random
+import unittest
+
+from backend.heatmap import GridAggregates
+
+
+class TestGridAggregates(unittest.TestCase):
+
+    def setUp(self):
+        rnd = random.Random(0)
+        self.eventos = [(rnd.uniform(-20, 0), rnd.uniform(-80, -60), round(rnd.uniform(3, 7), 1)) for _ in range(3000)]
+        self.grid = GridAggregates(max_zoom=6, recompute=self.en_caja)
+
+    def en_caja(self, lon_min, lat_min, lon_max, lat_max):
+        return [e for e in self.eventos if lon_min <= e[1] <= lon_max and lat_min <= e[0] <= lat_max]
+
+    def fuerza_bruta(self, zoom):
+        celdas = {}
+        for lat, lon, mag in self.eventos:
+            celdas.setdefault(GridAggregates._cell(zoom, lat, lon), []).append(mag)
+        return celdas
+
+    def comparar(self, zoom):
+        resultado = self.grid.query(-180, -90, 180, 90, zoom)
+        esperado = self.fuerza_bruta(zoom)
+        self.assertEqual({(c["x"], c["y"]) for c in resultado}, set(esperado))
+        for c in resultado:
+            mags = esperado[(c["x"], c["y"])]
+            self.assertEqual(c["cantidad"], len(mags))
+            self.assertAlmostEqual(c["mag_max"], max(mags), places=5)
+            self.assertAlmostEqual(c["mag_prom"], sum(mags) / len(mags), places=4)
+
+    def test_bulk_build_matches_incremental(self):
+        lats, lons, mags = zip(*self.eventos)
+        self.grid.build(lats, lons, mags)
+        incremental = GridAggregates(max_zoom=6)
+        for e in self.eventos:
+            incremental.add(*e)
+        for zoom in range(7):
+            self.assertEqual(self.grid.levels[zoom].keys(), incremental.levels[zoom].keys())
+            self.comparar(zoom)
+
+    def test_remove_keeps_exact_max(self):
+        for e in self.eventos:
+            self.grid.add(*e)
+        # borrar los eventos más fuertes obliga a recalcular el máximo de sus celdas
+        for e in sorted(self.eventos, key=lambda e: -e[2])[:500]:
+            self.grid.remove(*e)
+            self.eventos.remove(e)
+        self.assertTrue(self.grid.stale)
+        for zoom in range(7):
+            self.comparar(zoom)
+        self.assertFalse(self.grid.stale)
+
+    def test_refresh_reads_only_finest_cells(self):
+        lats, lons, mags = zip(*self.eventos)
+        self.grid.build(lats, lons, mags)
+        cajas = []
+        self.grid.recompute = lambda *caja: cajas.append(caja) or self.en_caja(*caja)
+        mas_fuerte = max(self.eventos, key=lambda e: e[2])
+        for e in [e for e in self.eventos if e[2] == mas_fuerte[2]]:
+            self.grid.remove(*e)
+            self.eventos.remove(e)
+
+        # la vista mundial baja por los hijos y solo consulta eventos en celdas de max_zoom
+        self.comparar(0)
+        self.assertTrue(cajas)
+        for lon_min, lat_min, lon_max, lat_max in cajas:
+            self.assertAlmostEqual(lon_max - lon_min, 360 / 2 ** 6)
+            self.assertAlmostEqual(lat_max - lat_min, 180 / 2 ** 6)
+
+    def test_zoom_for_limits_cells(self):
+        self.assertEqual(self.grid.zoom_for(-180, -90, 180, 90), 6)
+        self.assertEqual(GridAggregates().zoom_for(-180, -90, 180, 90), 6)
+        self.assertEqual(GridAggregates().zoom_for(-80, -20, -60, 0), 9)  # 29 x 58 celdas en z=9
+
+
+if __name__ == '__main__':
+    unittest.main()
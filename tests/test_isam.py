@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from ISAM.isam import ISAM, Registro, Bucket, IDX_FB, LEGACY_BUCKET_SIZE, LEGACY_HEADER, RUN_ROW_COST
+from tests.helpers import TempDirTestCase, registro
+
+
+class TestISAM(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, "isam.dat")
+        self.isam = ISAM(self.path, fb=3)
+        ids = list(range(0, 3000, 2))
+        random.Random(11).shuffle(ids)
+        self.isam.build_index([registro(i) for i in ids])
+
+    def test_index_levels_are_paged(self):
+        self.assertEqual(len(self.isam.index1_keys), 500)
+        self.assertEqual(len(self.isam.index2_keys), (500 + IDX_FB - 1) // IDX_FB)
+        reabierto = ISAM(self.path, fb=3)
+        self.assertEqual(reabierto.index1_keys, self.isam.index1_keys)
+        self.assertEqual(reabierto.index1_offsets, self.isam.index1_offsets)
+        self.assertEqual(reabierto.index2_keys, self.isam.index2_keys)
+
+    def test_search(self):
+        for key in (0, 2, 1500, 2998):
+            self.assertEqual([r.id for r in self.isam.search(key)], [key])
+        for key in (-1, 3, 3000):
+            self.assertEqual(self.isam.search(key), [])
+
+    def test_range_search_with_overflow(self):
+        for i in range(1, 200, 2):
+            self.isam.add(registro(i))
+        self.isam.add(registro(-5))
+        ids = sorted(r.id for r in self.isam.rangeSearch(-10, 100))
+        self.assertEqual(ids, [-5] + list(range(0, 101)))
+
+    def test_reorganize_packs_overflow_chains(self):
+        self.isam.reorg_threshold = None
+        for i in range(1, 600, 2):
+            self.isam.add(registro(i))
+        self.isam.remove(10)
+        self.assertGreater(self.isam.chain_length(), 1.0)
+
+        self.isam.reorganize()
+        self.assertEqual(self.isam.chain_length(), 1.0)
+        esperado = [i for i in range(0, 3000) if i != 10 and (i % 2 == 0 or i < 600)]
+        self.assertEqual([r.id for r in self.isam.rangeSearch(0, 3000)], esperado)
+        self.assertEqual([r.id for r in ISAM(self.path, fb=3).rangeSearch(0, 3000)], esperado)
+
+    def test_scan_keeps_its_version_during_reorganize(self):
+        self.isam.reorg_threshold = None
+        scan = self.isam._scan(1000, 1400)
+        self.assertEqual(next(scan).id, 1000)
+        self.isam.reorganize()
+        for i in range(1, 3000, 2):
+            self.isam.add(registro(i))
+        # el recorrido sigue sobre el archivo y el índice con los que empezó
+        self.assertEqual([r.id for r in scan], list(range(1002, 1401, 2)))
+        self.assertEqual(len(self.isam.rangeSearch(1000, 1400)), 401)
+
+    def test_concurrent_searches(self):
+        claves = list(range(0, 3000, 2)) * 4
+        with ThreadPoolExecutor(8) as pool:
+            resultados = list(pool.map(lambda k: [r.id for r in self.isam.search(k)], claves))
+        self.assertEqual(resultados, [[k] for k in claves])
+
+    def test_reads_without_pread(self):
+        # en Windows no hay os.pread ni os.preadv: se posiciona y lee con el lock de escritura
+        class SinPread:
+            def __getattr__(self, name):
+                if name in ("pread", "preadv"):
+                    raise AttributeError(name)
+                return getattr(os, name)
+
+        with mock.patch("ISAM.isam.os", SinPread()):
+            def tarea(i):
+                if i % 2:
+                    self.isam.add(registro(i))
+                    return i
+                return self.isam.search(i)[0].id
+
+            with ThreadPoolExecutor(8) as pool:
+                self.assertEqual(list(pool.map(tarea, range(1000))), list(range(1000)))
+            self.assertEqual(sorted(r.id for r in self.isam.rangeSearch(0, 999)), list(range(1000)))
+
+    def test_reorganize_runs_automatically(self):
+        self.isam.reorg_threshold = 1.5
+        for i in range(1, 1500, 2):
+            self.isam.add(registro(i))
+        self.assertLessEqual(self.isam.chain_length(), 1.5)
+        self.assertEqual(len(self.isam.rangeSearch(0, 1500)), 1501)
+
+    def test_page_size_is_stored_with_the_table(self):
+        path = os.path.join(self.tmp.name, "paginas.dat")
+        isam = ISAM(path, page_size=16384)
+        isam.build_index([registro(i) for i in range(1000)])
+        self.assertEqual(isam.fb, (16384 - 12) // Registro.SIZE)
+        self.assertEqual(os.path.getsize(path) % 16384, 0)
+        isam.close()
+
+        reabierto = ISAM(path)  # el tamaño por defecto no pisa el guardado
+        self.assertEqual((reabierto.fb, reabierto.bucket_size), (isam.fb, 16384))
+        self.assertEqual(len(reabierto.rangeSearch(100, 899)), 800)
+
+        reabierto.reset(page_size=4096)
+        self.assertEqual(reabierto.search(5), [])
+        reabierto.add(registro(5))
+        self.assertEqual([r.id for r in reabierto.search(5)], [5])
+
+    def test_bucket_reads_keys_without_decoding(self):
+        bucket = Bucket(4)
+        for i in (7, 3, 9):
+            bucket.insert(registro(i))
+        self.assertEqual([bucket.key(i) for i in range(bucket.size)], [7, 3, 9])
+        self.assertEqual([r.to_dict()["id"] for r in bucket.buscar(3, 7)], [7, 3])
+
+        bucket.delete(0)
+        copia = Bucket(4, bytearray(bucket.empaquetar()))
+        self.assertEqual([r.id for r in copia.registros], [9, 3])
+        self.assertFalse(hasattr(copia.registros[0], "__dict__"))
+
+    def test_remove(self):
+        self.assertTrue(self.isam.remove(1000))
+        self.assertEqual(self.isam.search(1000), [])
+        self.assertFalse(self.isam.remove(1000))
+
+    def _legacy_table(self, cadenas):
+        # buckets del formato anterior: cabecera 'ii' (usados, siguiente), fb=3 y huecos de remove
+        path = os.path.join(self.tmp.name, "legacy", "registros_isam.dat")
+        os.makedirs(os.path.dirname(path))
+        index1, offset = [], 0
+        with open(path, "wb") as f:
+            for cadena in cadenas:
+                index1.append((cadena[0][0], offset))
+                for n, ids in enumerate(cadena):
+                    offset += LEGACY_BUCKET_SIZE
+                    siguiente = offset if n + 1 < len(cadena) else -1
+                    slots = [registro(i).empaquetar() if i is not None else Bucket.REGISTRO_VACIO for i in ids]
+                    f.write(LEGACY_HEADER.pack(len(ids), siguiente) + b"".join(slots).ljust(3 * Registro.SIZE, b"\x00"))
+        return path, index1
+
+    def test_legacy_buckets_without_index_are_rebuilt(self):
+        path, _ = self._legacy_table([[[0, 1, 2], [3, None]], [[10, 11, 12]], [[20]]])
+        tamano = os.path.getsize(path)
+        isam = ISAM(path)
+        self.assertEqual([r.id for r in isam.rangeSearch(-100, 100)], [0, 1, 2, 3, 10, 11, 12, 20])
+        self.assertEqual(isam.bucket_size, 4096)
+        self.assertEqual([r.id for r in ISAM(path).rangeSearch(-100, 100)], [0, 1, 2, 3, 10, 11, 12, 20])
+
+        # un archivo que no es del formato anterior no se vacía
+        roto = os.path.join(self.tmp.name, "roto.dat")
+        with open(roto, "wb") as f:
+            f.write(b"\x07" * (tamano + 1))
+        self.assertRaises(ValueError, ISAM, roto)
+        self.assertEqual(os.path.getsize(roto), tamano + 1)
+
+    def test_legacy_json_index_is_migrated(self):
+        path, index1 = self._legacy_table([[[0, 1, 2], [4, 3, 5], [6]], [[10, None, 12]]])
+        with open(os.path.join(os.path.dirname(path), "isam_index.json"), "w") as f:
+            json.dump({"index1": index1, "index2": [[index1[0][0], 0]]}, f)
+        isam = ISAM(path)
+        self.assertEqual([r.id for r in isam.rangeSearch(-100, 100)], [0, 1, 2, 3, 4, 5, 6, 10, 12])
+        self.assertEqual(isam.chain_length(), 1.0)
+
+    def test_build_from_csv_with_external_sort(self):
+        csv_path = os.path.join(self.tmp.name, "sismos.csv")
+        ids = list(range(5000))
+        random.Random(13).shuffle(ids)
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(Registro.__slots__)
+            for i in ids:
+                writer.writerow(registro(i).to_dict().values())
+
+        # presupuesto para 700 filas: fuerza 8 corridas en disco
+        self.isam.build_from_csv(csv_path, memory_budget=700 * RUN_ROW_COST)
+        self.assertEqual([r.id for r in self.isam.rangeSearch(-1, 5000)], list(range(5000)))
+        self.assertEqual(self.isam.chain_length(), 1.0)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["isam.dat", "isam.idx", "sismos.csv"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
-from backend.sql_parser import parse_sql
+import unittest
+
+from backend.sql_parser import (
+    SQLSyntaxError, Select, SpatialCall, StatementCache, parse, parse_sql, prepare, statement_cache, to_op
+)
 
 #parse_sql("INSERT INTO customer VALUES (45)")
 # → ("insert", 45)
@@ -16,14 +20,104 @@ from backend.sql_parser import parse_sql
 # → ("create_from_file", "customer", "empleados.csv", "hash", "DNI")
 
 
-sql = """
-CREATE TABLE images (
-    id INT PRIMARY KEY INDEX BTree,
-    name TEXT,
-    creationDate STRING,
-    features ARRAY[FLOAT] INDEX RTree
-);
-"""
+class TestParser(unittest.TestCase):
+
+    def test_operations(self):
+        sql = """
+        CREATE TABLE images (
+            id INT PRIMARY KEY INDEX BTree,
+            name TEXT,
+            creationDate STRING,
+            features ARRAY[FLOAT] INDEX RTree
+        );
+        """
+        parse_result = parse_sql(sql)
+        self.assertEqual(parse_result[0], "create")
+        self.assertEqual(parse_result[2][3], {"name": "features", "type": "ARRAY[FLOAT]", "index": "RTREE"})
+        self.assertEqual(parse_sql("SELECT * FROM customer WHERE DNI BETWEEN 10 AND 50"), ("range", "DNI", 10.0, 50.0))
+        self.assertEqual(parse_sql("DELETE FROM customer WHERE DNI = 13;"), ("delete", "DNI", 13.0))
+        self.assertEqual(
+            parse_sql('CREATE TABLE s FROM "data/s.csv" USING rtree("lat") WITH (dimension = 3)'),
+            ("create_from_csv", "s", "data/s.csv", "rtree", "lat", {"dimension": 3})
+        )
+        self.assertEqual(
+            parse_sql("SELECT * FROM s WHERE nearest(k => 5, lon => -77.0, lat => -12.0)"),
+            ("nearest", -12.0, -77.0, 5)
+        )
+
+    def test_keywords_inside_strings(self):
+        self.assertEqual(
+            parse_sql("SELECT * FROM s WHERE tipo = 'between where values'"),
+            ("search", "tipo", "between where values")
+        )
+        op = parse_sql("INSERT INTO s VALUES (1, '2025-05-28', 'it''s, where', -15.0, -75.0, 4.5, 30)")
+        self.assertEqual(op, ("insert", ["1", "2025-05-28", "it's, where", "-15.0", "-75.0", "4.5", "30"]))
+
+    def test_unquoted_insert_values(self):
+        op = parse_sql("INSERT INTO s VALUES (1, 2025-05-28, Earthquake, -15.0, -75.0, 4.5, 30)")
+        self.assertEqual(op, ("insert", ["1", "2025-05-28", "Earthquake", "-15.0", "-75.0", "4.5", "30"]))
+        op = parse_sql("INSERT INTO s VALUES (2, 2025-05-28T10:45:12.000Z, Earthquake, -15.0, -75.0, 4.5, 30)")
+        self.assertEqual(op[1][1], "2025-05-28T10:45:12.000Z")
+
+    def test_options_must_be_integers(self):
+        for valor in ("4.5", "1e3", "'4096'"):
+            sql = f'CREATE TABLE s FROM "s.csv" USING isam("id") WITH (page_size = {valor})'
+            with self.assertRaises(SQLSyntaxError) as ctx:
+                parse_sql(sql)
+            self.assertEqual(ctx.exception.pos, sql.index(valor))
+        # el DDL no sale del cache: la misma forma con un entero sigue siendo válida
+        self.assertEqual(parse_sql('CREATE TABLE s FROM "s.csv" USING isam("id") WITH (page_size = 4)')[-1],
+                         {"page_size": 4})
+
+    def test_typed_ast(self):
+        stmt = parse("SELECT * FROM s WHERE within_radius(lat => -12.05, lon => -77.04, km => 50)")
+        self.assertIsInstance(stmt, Select)
+        self.assertEqual(stmt.where, SpatialCall("within_radius", {"lat": -12.05, "lon": -77.04, "km": 50}))
+
+    def test_errors_report_position(self):
+        casos = [
+            ("SELECT * FROM s WHERE id =", 26),
+            ("SELECT * FROM s\nWHERE nearest(lat => 1, k => 2)", 46),
+            ("INSERT INTO s VALUES (1, 'abc", 25),
+            ("UPDATE s SET x = 1", 0),
+        ]
+        for sql, pos in casos:
+            with self.assertRaises(SQLSyntaxError) as ctx:
+                parse(sql)
+            self.assertEqual(ctx.exception.pos, pos, sql)
+            if "\n" in sql:
+                self.assertIn("Faltan argumentos para nearest: lon (línea 2, columna 31)", str(ctx.exception))
+
+    def test_cache_reuses_plan_with_new_literals(self):
+        cache = StatementCache(size=2)
+        a = parse("SELECT * FROM s WHERE id = 1", cache)
+        b = parse("SELECT  *  FROM s WHERE id = 2;", cache)
+        self.assertEqual((a.where.value, b.where.value), (1, 2))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # mismo texto con literales de otro tipo: otra entrada
+        self.assertEqual(parse("SELECT * FROM s WHERE id = '2'", cache).where.value, "2")
+        parse("DELETE FROM s WHERE id = 3", cache)
+        self.assertEqual(len(cache.entries), 2)
+        self.assertEqual(cache.misses, 3)
+        self.assertIsNone(cache.get("SELECT * FROM s WHERE id = ?"))  # la menos usada salió
+        self.assertGreaterEqual(statement_cache.size, 2)
+
+    def test_shape_matches_like_the_lexer(self):
+        cache = StatementCache()
+        parse("SELECT * FROM s WHERE id BETWEEN 1 AND 2", cache)
+        parse("INSERT INTO s VALUES (1, '2025-05-28', 'a', -15.0, -75.0, 4.5, 30)", cache)
+        casos = [
+            "SELECT * FROM s WHERE id BETWEEN -7 AND 2.5e3",
+            "SELECT * FROM s WHERE id BETWEEN 2025-05-28 AND 9",  # fecha en un hueco de número
+            "SELECT * FROM s WHERE id BETWEEN 1 AND 2;",
+            "INSERT INTO s VALUES (2, '2025-06-01', 'it''s', -1.5, -7.25, 6, 10.0)",
+        ]
+        # la fecha y el ; no calzan con la forma guardada y pasan por normalize
+        self.assertEqual([cache.match(sql) is not None for sql in casos], [True, False, False, True])
+        for sql in casos:
+            self.assertEqual(to_op(*prepare(sql, cache)), to_op(*prepare(sql, None)), sql)
+
 
-parse_result = parse_sql(sql)
-print(parse_result)
+if __name__ == '__main__':
+    unittest.main()
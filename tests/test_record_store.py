@@ -0,0 +1,108 @@
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.record_store import RecordStore, RECORD
+from tests.helpers import TempDirTestCase
+
+
+def datos(i):
+    return {"fecha": "2025-05-28", "tipo": "INVALID", "mag": 4.5, "prof": float(i)}
+
+
+class TestRecordStore(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.tmp.name, "rtree_index.rec")
+        self.store = RecordStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_put_get_and_overwrite(self):
+        self.store.put(7, -14.97, -75.68, datos(7))
+        self.assertEqual(self.store.get(7)["lat"], -14.97)  # double: sin pérdida de precisión
+        self.assertEqual(self.store.get(7)["prof"], 7.0)
+        self.store.put(7, -10.0, -70.0, datos(8))
+        self.assertEqual(self.store.get(7)["lon"], -70.0)
+        self.assertEqual(os.path.getsize(self.path), RECORD.size)
+        self.assertIsNone(self.store.get(8))
+
+    def test_delete_reuses_slot_and_reopen(self):
+        for i in range(100):
+            self.store.put(i, float(i), float(-i), datos(i))
+        self.assertEqual(self.store.delete(40)["lon"], -40.0)
+        self.assertIsNone(self.store.delete(40))
+        self.store.put(500, 1.0, 2.0, datos(500))
+        self.assertEqual(os.path.getsize(self.path), 100 * RECORD.size)
+        self.store.close()
+
+        self.store = RecordStore(self.path)
+        self.assertEqual(len(self.store), 100)
+        self.assertNotIn(40, self.store)
+        self.assertEqual(self.store.get(500)["lat"], 1.0)
+
+    def test_concurrent_puts_and_gets(self):
+        self.store.put_many((i, float(i), float(-i), datos(i)) for i in range(0, 4000, 2))
+
+        def tarea(i):
+            if i % 2:
+                self.store.put(i, float(i), float(-i), datos(i))
+                return i
+            return self.store.get(i)["id"]
+
+        with ThreadPoolExecutor(8) as pool:
+            self.assertEqual(list(pool.map(tarea, range(4000))), list(range(4000)))
+        self.assertEqual(os.path.getsize(self.path), 4000 * RECORD.size)
+        self.assertEqual([r["prof"] for r in self.store.get_many(range(4000))], [float(i) for i in range(4000)])
+
+    def test_get_many_reads_in_batches(self):
+        for i in range(1000):
+            self.store.put(i, float(i), 0.0, datos(i))
+        self.store.reads = 0
+        ids = [999, 3, 500, 4, 5, 12345]
+        self.assertEqual([r["id"] for r in self.store.get_many(ids)], [999, 3, 500, 4, 5])
+        self.assertEqual(self.store.reads, 3)  # 3-5 contiguos, 500 y 999 sueltos
+
+        self.store.reads = 0
+        self.assertEqual(len(self.store.get_many(range(100, 900))), 800)
+        self.assertEqual(self.store.reads, 1)
+
+    def test_put_many_appends_and_overwrites(self):
+        self.store.put(1, 0.0, 0.0, datos(1))
+        filas = [(i, float(i), float(-i), datos(i)) for i in range(1, 10_000)]
+        filas.append((9500, -1.0, -2.0, datos(0)))  # id repetido dentro del mismo bloque
+        filas.append((20, -3.0, -4.0, datos(0)))    # id ya escrito en un bloque anterior
+        self.store.put_many(filas)
+        self.assertEqual(os.path.getsize(self.path), 9999 * RECORD.size)
+        self.assertEqual(self.store.get(1)["lat"], 1.0)
+        self.assertEqual(self.store.get(9500)["lon"], -2.0)
+        self.assertEqual(self.store.get(20)["lat"], -3.0)
+        self.store.close()
+
+        self.store = RecordStore(self.path)
+        self.assertEqual(len(self.store), 9999)
+        self.assertEqual(self.store.get(9999)["lon"], -9999.0)
+
+    def test_bounds_and_points_after_reopen(self):
+        self.store.put(1, -14.5, -75.5, datos(1))
+        self.store.put(2, -5.0, -80.0, datos(2))
+        self.store.put(3, -20.0, -70.0, datos(3))
+        self.store.delete(3)
+        self.store.close()
+
+        with open(self.path, "ab") as f:
+            f.write(b"\x01\x02")  # escritura interrumpida
+        self.store = RecordStore(self.path)
+        self.assertEqual(self.store.bounds, (-80.0, -14.5, -75.5, -5.0))
+        self.assertEqual(sorted(self.store.points()), [(1, -14.5, -75.5), (2, -5.0, -80.0)])
+        self.assertEqual(os.path.getsize(self.path), 3 * RECORD.size)
+
+        self.store.clear()
+        self.assertIsNone(self.store.bounds)
+        self.assertEqual(list(self.store.points()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import random
+import unittest
+
+from backend.geo import haversine_km
+from backend.rtree import RTreeIndex
+from tests.helpers import DATOS, TempDirTestCase
+
+
+class TestRTreeIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.name = os.path.join(self.tmp.name, "rtree_index")
+        self.rtree = RTreeIndex(self.name)
+        rnd = random.Random(0)
+        self.puntos = {i: (rnd.uniform(-80, 80), rnd.uniform(-180, 180)) for i in range(5000)}
+        self.rtree.bulk_load((i, lat, lon, DATOS) for i, (lat, lon) in self.puntos.items())
+
+    def tearDown(self):
+        self.rtree.close()
+
+    def cercanos(self, lat, lon):
+        return sorted(self.puntos, key=lambda i: (haversine_km(lat, lon, *self.puntos[i]), i))
+
+    def test_bulk_load_and_reopen(self):
+        self.rtree.insert(9000, -15.0, 179.9, DATOS)
+        self.rtree.remove(7)
+        self.rtree.close()
+
+        self.rtree = RTreeIndex(self.name)
+        self.assertEqual(len(self.rtree.data), 5000)
+        self.assertIsNone(self.rtree.search_by_id(7))
+        ids = {r["id"] for r in self.rtree.rangeSearch(179.0, -16.0, 180.0, -14.0)}
+        self.assertIn(9000, ids)
+
+    def test_heatmap_grid_is_built_on_first_request(self):
+        self.rtree.close()
+        self.rtree = RTreeIndex(self.name)
+        self.assertIsNone(self.rtree._grid)  # reabrir no recorre los registros
+        self.rtree.insert(9000, -15.0, -75.0, dict(DATOS, mag=8.0))
+        self.rtree.remove(7)
+
+        def total():
+            return sum(c["cantidad"] for c in self.rtree.heatmap(-180, -90, 180, 90, 0))
+
+        self.assertEqual(total(), 5000)
+        self.rtree.insert(9001, -15.0, -75.0, DATOS)  # con los agregados ya armados se actualizan
+        self.assertEqual(total(), 5001)
+        self.assertEqual(max(c["mag_max"] for c in self.rtree.heatmap(-76, -16, -74, -14, 10)), 8.0)
+
+    def test_nearest_uses_great_circle_distance(self):
+        for lat, lon in ((-12.05, -77.04), (-15.0, -179.9), (85.0, 10.0)):
+            resultado = self.rtree.nearest(lat, lon, 10)
+            self.assertEqual([r["id"] for r in resultado], self.cercanos(lat, lon)[:10])
+            self.assertEqual(resultado, sorted(resultado, key=lambda r: r["distancia_km"]))
+
+    def test_within_radius_crosses_antimeridian(self):
+        for lat, lon, km in ((-15.0, -179.9, 800), (89.0, 0.0, 1500), (-12.05, -77.04, 600)):
+            esperado = [i for i in self.cercanos(lat, lon) if haversine_km(lat, lon, *self.puntos[i]) <= km]
+            resultado = self.rtree.within_radius(lat, lon, km)
+            self.assertEqual([r["id"] for r in resultado], esperado)
+            self.assertTrue(resultado)
+
+    def test_time_and_depth_dimensions(self):
+        rnd = random.Random(1)
+        filas = []
+        for i in range(2000):
+            datos = dict(DATOS, fecha=f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                         prof=rnd.uniform(0, 300))
+            filas.append((i, rnd.uniform(-20, 0), rnd.uniform(-80, -60), datos))
+        esperado = {i for i, lat, lon, d in filas
+                    if -75 <= lon <= -65 and -15 <= lat <= -5
+                    and "2025-05-01" <= d["fecha"] <= "2025-05-31" and 10 <= d["prof"] <= 100}
+
+        self.rtree.reset(dimension=4)
+        self.rtree.bulk_load(filas)
+        self.rtree.remove(0)
+        self.rtree.close()
+        self.rtree = RTreeIndex(self.name)  # la dimensión se recupera del índice guardado
+        self.assertEqual(self.rtree.dimension, 4)
+        resultado = self.rtree.range_time(-75, -15, -65, -5, "2025-05-01", "2025-05-31", 10, 100)
+        self.assertEqual({r["id"] for r in resultado}, esperado - {0})
+        self.rtree.close()
+
+        self.rtree = RTreeIndex(self.name, dimension=2)  # en 2-D la fecha se filtra en memoria
+        resultado = self.rtree.range_time(-75, -15, -65, -5, "2025-05-01", "2025-05-31", 10, 100)
+        self.assertEqual({r["id"] for r in resultado}, esperado - {0})
+
+
+if __name__ == '__main__':
+    unittest.main()